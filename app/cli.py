@@ -0,0 +1,87 @@
+"""
+Batch extraction of PDFs already on disk, without the API: extracts every
+document with all cores, checkpoints each one so an interrupted run picks up
+where it stopped (run the same command again), and writes the merged tables
+as Parquet part files in the output directory (see app.services.batch).
+
+    python -m app.cli reports/ archive.zip "scans/**/*.pdf" --output out/
+    python -m app.cli --manifest backfill.txt --output out/ --processes 8
+"""
+import os
+import sys
+import argparse
+import logging
+
+from app.logconfig import configure_logging, shutdown_logging
+from app.services.batch import PARTITION_ROWS, batch_settings, expand_inputs, run_batch, write_partitions
+from app.services.exporter import ExportOptions
+from app.services.profiles import AUTO, PROFILES
+from app.services.tableengine import parse_page_ranges
+from app.models import OutputFormat
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="PDF files, directories, glob patterns or zip archives")
+    parser.add_argument("--manifest", action="append", default=[], help="file listing one input per line (repeatable)")
+    parser.add_argument("--output", required=True, help="directory the Parquet part files are written to")
+    parser.add_argument("--checkpoint", help="directory holding progress and per-document results (default: OUTPUT/.checkpoint)")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--partition-rows", type=int, default=PARTITION_ROWS, help="rows per Parquet part file")
+    parser.add_argument("--standard-headers", nargs="+", help="header used when a PDF has no recognizable header row")
+    parser.add_argument("--pages", help='page ranges searched in every PDF, e.g. "1-3,8,10-"')
+    parser.add_argument("--max-tables", type=int, help="stop searching a PDF after this many tables")
+    parser.add_argument("--max-rows", type=int, help="stop searching a PDF after this many rows")
+    parser.add_argument("--profile", choices=[AUTO, *PROFILES],
+                        help='table-settings profile; "auto" tunes one per directory (see WEB_SCRAPER_PROFILE_PATTERNS)')
+    parser.add_argument("--compression", help="Parquet codec (snappy by default)")
+    parser.add_argument("--compression-level", type=int, help="level of the Parquet codec")
+    parser.add_argument("--row-group-size", type=int, help="most rows per Parquet row group")
+    args = parser.parse_args(argv)
+
+    if not args.inputs and not args.manifest:
+        parser.error("give at least one input or --manifest")
+    if args.partition_rows < 1:
+        parser.error("--partition-rows must be at least 1")
+    try:
+        if args.pages:
+            parse_page_ranges(args.pages)
+        export_options(args).check(OutputFormat.PARQUET)
+    except ValueError as error:
+        parser.error(str(error))
+    return args
+
+
+def export_options(args) -> ExportOptions:
+    return ExportOptions(compression=args.compression, compression_level=args.compression_level, row_group_size=args.row_group_size)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_logging()
+    try:
+        try:
+            documents = expand_inputs(args.inputs, args.manifest)
+        except OSError as error:
+            logger.error("%s", error)
+            return 2
+        settings = batch_settings(args.standard_headers, args.pages, args.max_tables, args.max_rows, args.profile)
+        checkpoint = args.checkpoint or os.path.join(args.output, ".checkpoint")
+        extracted = run_batch(documents, checkpoint, settings, args.processes)
+        if not extracted:
+            logger.warning("No valid tables were extracted from any PDF")
+            return 1
+        paths = write_partitions(extracted, checkpoint, args.output, settings, args.partition_rows, export_options(args))
+        logger.info("Wrote %d part file(s) from %d document(s) to %s", len(paths), len(extracted), args.output)
+        return 0
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; run the same command again to resume")
+        return 130
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Logging for the application's "app" loggers. Records are put on a queue by
+the thread that logs them and written to stderr by a single listener thread,
+so download and parse workers never wait on each other for the console.
+"""
+import sys
+import queue
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from app.settings import LOG_LEVEL
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Routes the "app" loggers through a queue to stderr; calling it again only updates the level."""
+    global _listener
+    logger = logging.getLogger("app")
+    logger.setLevel(level)
+    with _listener_lock:
+        if _listener is not None:
+            return
+        records = queue.SimpleQueue()
+        console = logging.StreamHandler(sys.stderr)
+        console.setFormatter(logging.Formatter(LOG_FORMAT))
+        _listener = QueueListener(records, console, respect_handler_level=True)
+        _listener.start()
+        logger.addHandler(QueueHandler(records))
+        logger.propagate = False
+
+
+def shutdown_logging():
+    """Writes out the queued records and stops the listener thread (called on application shutdown)."""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        logger = logging.getLogger("app")
+        for handler in [h for h in logger.handlers if isinstance(h, QueueHandler)]:
+            logger.removeHandler(handler)
+        logger.propagate = True
+        _listener.stop()
+        _listener = None
@@ -1,7 +1,34 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routes import files
+from fastapi.responses import PlainTextResponse
+from app.logconfig import configure_logging, shutdown_logging
+from app.routes import files, jobs
+from app.services.downloads import get_inflight_budget
+from app.services.fetcher import close_async_fetcher
+from app.services.metrics import REGISTRY, INFLIGHT_BYTES
+from app.services.tableengine import shutdown_process_pool
+from app.services.sandbox import shutdown_sandbox_pool
+from app.services.jobs import shutdown_job_manager
 
-app = FastAPI(title="Web Scraper API", description="API to scrape webpages for PDF files and extract tables from them.")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    yield
+    # Release the shared connection pool and parse workers on shutdown
+    await close_async_fetcher()
+    shutdown_job_manager()
+    shutdown_process_pool()
+    shutdown_sandbox_pool()
+    shutdown_logging()
+
+app = FastAPI(title="Web Scraper API", description="API to scrape webpages for PDF files and extract tables from them.", lifespan=lifespan)
 
 # Include routers
-app.include_router(files.router, prefix="/files", tags=["Files"])
\ No newline at end of file
+app.include_router(files.router, prefix="/files", tags=["Files"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Monitoring"])
+async def metrics():
+    """Stage timings, download volumes, document/table/row counts, cache hits and queue depths in the Prometheus text format."""
+    INFLIGHT_BYTES.set(get_inflight_budget().in_use)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,4 +1,4 @@
 # app/models/__init__.py
-from .datatypes import FileType, DataType, OutputFormat
+from .datatypes import FileType, DataType, OutputFormat, ExtractionEngine, JobStatus, IncrementalOutput
 
-__all__ = ['FileType', 'DataType', 'OutputFormat']
\ No newline at end of file
+__all__ = ['FileType', 'DataType', 'OutputFormat', 'ExtractionEngine', 'JobStatus', 'IncrementalOutput']
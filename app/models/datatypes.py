@@ -10,5 +10,24 @@ class DataType(Enum):
 
 class OutputFormat(Enum):
     CSV = "csv"    
+    CSV_GZIP = "csv.gz"  # CSV compressed with gzip
+    CSV_ZSTD = "csv.zst" # CSV compressed with Zstandard
+    NDJSON = "ndjson"    # One JSON object per row
     PARQUET = "parquet"
-    # Add more output formats here
\ No newline at end of file
+    ARROW = "arrow"      # Arrow IPC file (Feather v2)
+    # Add more output formats here
+
+class ExtractionEngine(Enum):
+    AUTO = "auto"           # Pick processes for long PDFs, threads otherwise
+    THREADS = "threads"     # Parse every page inside the worker thread handling the URL
+    PROCESSES = "processes" # Split pages into ranges and parse them across a process pool
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class IncrementalOutput(Enum):
+    DELTA = "delta"   # Rows of the new and changed documents only
+    MERGED = "merged" # Rows of every listed document, unchanged ones read back from the previous runs
@@ -1,10 +1,20 @@
+import time
 from fastapi import APIRouter
 from app.services.webscraper import WebScraper
-from pydantic import BaseModel
-from app.models import FileType, DataType, OutputFormat
-from fastapi import Request
+from pydantic import BaseModel, field_validator, model_validator
+import re
+from app.models import FileType, DataType, OutputFormat, ExtractionEngine, IncrementalOutput
+from fastapi import Request, Header
 from app.services.pdfextractor import PDFExtractor
-from fastapi.responses import StreamingResponse
+from app.services.cache import get_document_cache
+from app.services.exporter import ExportOptions, TextCompressor, negotiate_encoding, compress_text
+from app.services.incremental import get_incremental_state, source_key
+from app.services.metrics import StageTimings
+from app.services.tableengine import parse_page_ranges
+from app.services.sandbox import ABORT_REASONS, ParseLimits
+from app.services.profiles import AUTO, PROFILES, check_table_settings, get_profile_store
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
 
@@ -13,52 +23,240 @@ class DiscoverRequest(BaseModel):
     type: FileType = FileType.PDF    
     data_type: DataType = DataType.Tables
     css_selector: str = None # User has option to provide a CSS selector to filter to a specific section of the page
+    crawl_depth: int = 0 # Also follow links to other pages up to this many clicks away from url (0 = only url)
+    max_pages: int = 50 # Most pages a crawl will fetch, url included
+    same_domain: bool = True # Only follow links to pages on the domain of url
+    follow_pattern: str = None # Regular expression the URL of a page must match to be followed
+
+    @field_validator("follow_pattern")
+    @classmethod
+    def check_pattern(cls, value):
+        if value is not None:
+            try:
+                re.compile(value)
+            except re.error as e:
+                raise ValueError(f"Invalid follow_pattern: {e}")
+        return value
 
 class ExtractRequest(BaseModel):
     document_urls: list[str] = None
     data_type: DataType = DataType.Tables
-    output_format: str = OutputFormat.CSV    
+    output_format: OutputFormat = OutputFormat.CSV
+    engine: ExtractionEngine = ExtractionEngine.AUTO # threads, processes, or auto (processes for long PDFs)
+    stream: bool = False # Send rows to the client as each PDF finishes instead of after the last one
+    use_cache: bool = True # Revalidate previously downloaded PDFs and reuse their extracted tables
+    pages: str = None # Page ranges searched for tables in every PDF, e.g. "1-3,8,10-" (default: all pages)
+    max_tables: int = None # Stop searching a PDF once this many tables were found
+    max_rows: int = None # Stop searching a PDF once its tables hold this many rows
+    compression: str = None # Codec of parquet (snappy, gzip, zstd, brotli, lz4, none) or arrow (lz4, zstd, none) output
+    compression_level: int = None # Level of that codec or of csv.gz/csv.zst output (default: the codec's own)
+    row_group_size: int = None # Most rows per parquet row group
+    dictionary: bool = True # Dictionary-encode parquet columns
+    typed: bool = False # Infer integer, decimal, date and categorical columns instead of returning text
+    decimal_separator: str = "auto" # Decimal separator of typed numbers: ".", "," or "auto"
+    parse_timeout: float = None # Seconds parsing one PDF may take; its unfinished pages are then aborted (X-Pages-Aborted)
+    page_timeout: float = None # Seconds parsing one page may take before it is aborted
+    table_settings: dict = None # pdfplumber table settings, e.g. {"vertical_strategy": "text"}
+    profile: str = None # Built-in table-settings profile, or "auto" to tune and remember one per source
+
+    @field_validator("pages")
+    @classmethod
+    def check_pages(cls, value):
+        if value is not None:
+            parse_page_ranges(value)
+        return value
+
+    @field_validator("max_tables", "max_rows")
+    @classmethod
+    def check_limit(cls, value):
+        if value is not None and value < 1:
+            raise ValueError("Limits must be at least 1")
+        return value
+
+    @field_validator("parse_timeout", "page_timeout")
+    @classmethod
+    def check_timeout(cls, value):
+        if value is not None and value <= 0:
+            raise ValueError("Timeouts must be positive")
+        return value
+
+    @field_validator("table_settings")
+    @classmethod
+    def check_table_settings(cls, value):
+        if value is not None:
+            check_table_settings(value)
+        return value
+
+    @field_validator("profile")
+    @classmethod
+    def check_profile(cls, value):
+        if value is not None and value != AUTO and value not in PROFILES:
+            raise ValueError(f"profile must be one of {', '.join([AUTO, *PROFILES])}")
+        return value
+
+    @field_validator("decimal_separator")
+    @classmethod
+    def check_decimal_separator(cls, value):
+        if value not in ("auto", ".", ","):
+            raise ValueError('decimal_separator must be ".", "," or "auto"')
+        return value
+
+    @model_validator(mode="after")
+    def check_export_options(self):
+        _export_options(self).check(self.output_format)
+        if self.typed and self.stream:
+            raise ValueError("Typed output needs the whole table to infer column types and can't be streamed")
+        if self.table_settings is not None and self.profile is not None:
+            raise ValueError("Give either table_settings or profile, not both")
+        return self
+
+def _export_options(request: ExtractRequest) -> ExportOptions:
+    return ExportOptions(
+        compression=request.compression,
+        compression_level=request.compression_level,
+        row_group_size=request.row_group_size,
+        dictionary=request.dictionary,
+    )
 
 class CollectRequest(BaseModel):
     discover: DiscoverRequest    
     extract: ExtractRequest
+    incremental: IncrementalOutput = None # "delta" or "merged": only fetch and parse documents that are new or changed since the last run
+
+def _build_extractor(request: ExtractRequest) -> PDFExtractor:
+    """Creates the extractor configured by the request options."""
+    return PDFExtractor(
+        engine=request.engine,
+        cache=get_document_cache() if request.use_cache else None,
+        pages=request.pages,
+        max_tables=request.max_tables,
+        max_rows=request.max_rows,
+        export_options=_export_options(request),
+        typed=request.typed,
+        decimal_separator=request.decimal_separator,
+        # A request can only lower the server's limits
+        limits=ParseLimits().tightened(document_timeout=request.parse_timeout, page_timeout=request.page_timeout),
+        table_settings=request.table_settings,
+        profile=request.profile,
+    )
+
+async def _extraction_response(extractor: PDFExtractor, urls: list, request: ExtractRequest, accept_encoding: str = None):
+    """Runs the extraction in streaming or buffered mode and wraps it in a StreamingResponse."""
+    if request.stream:
+        body, media_type, headers = await extractor.stream_async(urls, request.output_format)
+    else:
+        body, media_type, headers = await extractor.extract_async(urls, request.output_format)
+    return await _response(body, media_type, headers, negotiate_encoding(accept_encoding, request.output_format))
+
+async def _response(body, media_type: str, headers: dict, encoding: str = None) -> StreamingResponse:
+    """
+    StreamingResponse for an output buffer or async byte iterator, compressed with
+    the Content-Encoding 'encoding' ("gzip" or "zstd") when given.
+    """
+    if encoding is None:
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+    headers = dict(headers, **{"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+    if hasattr(body, "getvalue"):
+        compressed = await run_in_threadpool(compress_text, body.getvalue(), encoding)
+        return StreamingResponse(iter([compressed]), media_type=media_type, headers=headers)
+
+    async def encoded():
+        # Each chunk is compressed and sent as soon as it is ready
+        compressor = TextCompressor(encoding)
+        async for chunk in body:
+            yield await run_in_threadpool(compressor.compress, chunk)
+        yield compressor.finish()
+    return StreamingResponse(encoded(), media_type=media_type, headers=headers)
+
+def _timing_headers(started: float, *workers) -> dict:
+    """
+    Server-Timing header with the time each stage took for this request, summed over
+    the scraper/extractor 'workers' (parallel work can exceed the wall-clock total),
+    and X-Pages-* headers counting the PDF pages the extractor searched and skipped.
+    Streamed responses don't get them: their headers are sent before the PDFs are
+    processed, so the times and counts would be incomplete.
+    """
+    timings = StageTimings()
+    for worker in workers:
+        timings.merge(worker.timings)
+    headers = {"Server-Timing": timings.server_timing(total=time.perf_counter() - started)}
+    # PDF pages searched for tables and skipped (outside 'pages', no ruling lines, limit reached, aborted)
+    for worker in workers:
+        if isinstance(worker, PDFExtractor):
+            counts = worker.page_counts.totals()
+            headers["X-Pages-Searched"] = str(counts.get("searched", 0))
+            for reason in ("range", "no_ruling", "limit", *ABORT_REASONS):
+                headers[f"X-Pages-Skipped-{reason.replace('_', '-').title()}"] = str(counts.get(reason, 0))
+    return headers
+
+def _collect_incremental(extractor: PDFExtractor, urls: list, request: CollectRequest, progress=None):
+    """Runs an incremental extraction against the state kept for this discover request."""
+    key = source_key(request.discover.model_dump(mode="json"), extractor.cache_variant())
+    return extractor.extract_incremental(
+        urls,
+        request.extract.output_format,
+        get_incremental_state(),
+        key,
+        merged=request.incremental == IncrementalOutput.MERGED,
+        progress=progress,
+    )
 
 @router.post("/discover")
-async def post(request: DiscoverRequest):
+async def post(request: DiscoverRequest, timings: bool = False):
     """Discover PDF files on a webpage and return the URLs."""
+    started = time.perf_counter()
     scraper = WebScraper(request)
-    urls = scraper.scrape()
+    urls = await scraper.scrape_async()
+    if timings:
+        return JSONResponse({"document_urls": urls}, headers=_timing_headers(started, scraper))
     return {"document_urls": urls}    
 
 @router.post("/extract")
-async def post(request: ExtractRequest):
+async def post(request: ExtractRequest, timings: bool = False, accept_encoding: str = Header(default=None)):
     """Extract tables from PDF files given a list of URLs."""
+    started = time.perf_counter()
     if request.document_urls is None:
         return {"error": "No document URLs provided."}
     if request.data_type == DataType.Tables: # Additional types can be added here
-        extractor = PDFExtractor()
+        extractor = _build_extractor(request)
     else:
         return {"error": "Data type not supported."}
     try:
-        buffer, media_type, headers = extractor.extract(request.document_urls, request.output_format)
-        return StreamingResponse(buffer, media_type=media_type, headers=headers)    
+        response = await _extraction_response(extractor, request.document_urls, request, accept_encoding)
     except Exception as e:
         return {"error": str(e)}
+    if timings and not request.stream:
+        # A streamed response's headers go out before its PDFs are processed; see _timing_headers
+        response.headers.update(_timing_headers(started, extractor))
+    return response
     
+@router.get("/profiles")
+async def get():
+    """Table-settings profiles tuned so far, per source (domain or URL pattern), and the built-in ones."""
+    tuned = await run_in_threadpool(get_profile_store().profiles)
+    return {"tuned": tuned, "builtin": PROFILES}
+
 @router.post("/collect")
-async def post(request: CollectRequest):
+async def post(request: CollectRequest, timings: bool = False, accept_encoding: str = Header(default=None)):
     """Discover PDF files on a webpage and extract tables from them."""
+    started = time.perf_counter()
     scraper = WebScraper(request.discover)
-    urls = scraper.scrape()
+    urls = await scraper.scrape_async()
 
     if request.extract.data_type == DataType.Tables: # Additional types can be added here
-        extractor = PDFExtractor()
+        extractor = _build_extractor(request.extract)
     else:
         return {"error": "Data type not supported."}
     try:
-        buffer, media_type, headers = extractor.extract(urls, request.extract.output_format)
-        return StreamingResponse(buffer, media_type=media_type, headers=headers)    
+        if request.incremental is not None:
+            body, media_type, headers = await run_in_threadpool(_collect_incremental, extractor, urls, request)
+            response = await _response(body, media_type, headers, negotiate_encoding(accept_encoding, request.extract.output_format))
+        else:
+            response = await _extraction_response(extractor, urls, request.extract, accept_encoding)
     except Exception as e:
         return {"error": str(e)}
+    if timings and not (request.extract.stream and request.incremental is None):
+        response.headers.update(_timing_headers(started, scraper, extractor))
+    return response
 
     
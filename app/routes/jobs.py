@@ -0,0 +1,77 @@
+import os
+from fastapi import APIRouter
+from fastapi.responses import FileResponse, JSONResponse
+from app.models import DataType, JobStatus
+from app.routes.files import ExtractRequest, CollectRequest, _build_extractor, _collect_incremental
+from app.services.webscraper import WebScraper
+from app.services.jobs import get_job_manager, JobQueueFullError
+from app.services.distributed import run_extraction
+from app.services.singleflight import dedupe_urls
+
+router = APIRouter()
+
+def _status(job: dict) -> dict:
+    """The public view of a job record."""
+    status = {key: value for key, value in job.items() if key not in ("request", "headers", "media_type")}
+    if job["status"] == JobStatus.SUCCEEDED.value:
+        status["result_url"] = f"/jobs/{job['id']}/result"
+    return status
+
+def _submit(kind: str, request, task):
+    try:
+        job = get_job_manager().submit(kind, request.model_dump(mode="json"), task)
+    except JobQueueFullError as e:
+        return JSONResponse(status_code=429, content={"error": str(e)})
+    return JSONResponse(status_code=202, content=_status(job))
+
+@router.post("/extract")
+async def post(request: ExtractRequest):
+    """Queue an extraction of tables from PDF files given a list of URLs; returns the job ID."""
+    if request.document_urls is None:
+        return {"error": "No document URLs provided."}
+    if request.data_type != DataType.Tables: # Additional types can be added here
+        return {"error": "Data type not supported."}
+
+    def task(context):
+        urls = dedupe_urls(request.document_urls)
+        context.set_documents(urls)
+        return run_extraction(_build_extractor(request), urls, request.output_format, progress=context.document_done)
+
+    return _submit("extract", request, task)
+
+@router.post("/collect")
+async def post(request: CollectRequest):
+    """Queue discovery of PDF files on a webpage and extraction of their tables; returns the job ID."""
+    if request.extract.data_type != DataType.Tables: # Additional types can be added here
+        return {"error": "Data type not supported."}
+
+    def task(context):
+        urls = dedupe_urls(WebScraper(request.discover).scrape())
+        context.set_documents(urls)
+        extractor = _build_extractor(request.extract)
+        if request.incremental is not None:
+            return _collect_incremental(extractor, urls, request, progress=context.document_done)
+        return run_extraction(extractor, urls, request.extract.output_format, progress=context.document_done)
+
+    return _submit("collect", request, task)
+
+@router.get("/{job_id}")
+async def get(job_id: str):
+    """Status of a job, with the progress of each document."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found or expired."})
+    return _status(job)
+
+@router.get("/{job_id}/result")
+async def get(job_id: str):
+    """Download the output of a finished job."""
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found or expired."})
+    if job["status"] == JobStatus.FAILED.value:
+        return JSONResponse(status_code=409, content={"error": job["error"]})
+    if job["status"] != JobStatus.SUCCEEDED.value or not os.path.exists(manager.result_path(job_id)):
+        return JSONResponse(status_code=409, content={"error": f"Job is {job['status']}; the result is not ready."})
+    return FileResponse(manager.result_path(job_id), media_type=job["media_type"], headers=job["headers"])
@@ -0,0 +1,321 @@
+"""
+Offline bulk extraction of PDFs already on disk (python -m app.cli), without
+the API. Documents are local paths or members of zip archives
+("archive.zip!member.pdf"); they are extracted one per worker process, each
+result checkpointed as an Arrow IPC file (see cache.serialize_table) so an
+interrupted run resumes where it stopped. The results are then merged like
+PDFExtractor.extract merges them (global header vote, column unification,
+blank and repeated-header row cleanup) and written as a directory of Parquet
+part files that read back as one dataset.
+"""
+import os
+import io
+import glob
+import json
+import uuid
+import hashlib
+import logging
+import zipfile
+import multiprocessing
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.logconfig import configure_logging
+from app.models import ExtractionEngine
+from app.services.cache import serialize_table, read_table, read_schema, settings_variant
+from app.services.exporter import ExportOptions
+from app.services.pdfextractor import ExtractionError, PDFExtractor
+from app.services.sandbox import ParseLimits
+
+logger = logging.getLogger(__name__)
+
+# Separates an archive from the member it holds in a document name
+ARCHIVE_SEPARATOR = "!"
+
+# Rows per Parquet part file written by write_partitions
+PARTITION_ROWS = 1_000_000
+
+# Documents between two progress log lines
+PROGRESS_EVERY = 100
+
+
+def expand_inputs(inputs: list, manifests: list = ()) -> list:
+    """
+    The documents named by 'inputs' (PDF files, directories searched recursively,
+    glob patterns or zip archives) and by the lines of 'manifests' (one input per
+    line, relative to the manifest; blank lines and "#" comments ignored), in
+    order and without repeats. Raises FileNotFoundError for an input that names nothing.
+    """
+    entries = list(inputs)
+    for manifest in manifests:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    entries.append(os.path.join(base, line))
+
+    documents = []
+    seen = set()
+    for entry in entries:
+        for document in _expand(entry):
+            if document not in seen:
+                seen.add(document)
+                documents.append(document)
+    return documents
+
+
+def _expand(entry: str) -> list:
+    if glob.has_magic(entry):
+        paths = sorted(glob.glob(entry, recursive=True))
+        return [document for path in paths for document in _expand(path)]
+    if os.path.isdir(entry):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(entry)
+            for name in names
+            if name.lower().endswith((".pdf", ".zip"))
+        )
+    if os.path.isfile(entry):
+        if zipfile.is_zipfile(entry) and not entry.lower().endswith(".pdf"):
+            with zipfile.ZipFile(entry) as archive:
+                names = [info.filename for info in archive.infolist() if info.filename.lower().endswith(".pdf") and not info.is_dir()]
+            return [f"{entry}{ARCHIVE_SEPARATOR}{name}" for name in names]
+        return [entry]
+    if ARCHIVE_SEPARATOR in entry:
+        return [entry]  # an archive member listed in a manifest
+    raise FileNotFoundError(f"No PDF, directory, archive or match for {entry}")
+
+
+def _split(document: str):
+    """(archive path, member name) of an archive member, (path, None) of a file."""
+    if ARCHIVE_SEPARATOR in document and not os.path.exists(document):
+        archive, member = document.split(ARCHIVE_SEPARATOR, 1)
+        return archive, member
+    return document, None
+
+
+def open_document(document: str):
+    """A seekable binary file object of the document, for pdfplumber."""
+    path, member = _split(document)
+    if member is None:
+        return open(path, "rb")
+    with zipfile.ZipFile(path) as archive:
+        return io.BytesIO(archive.read(member))
+
+
+def document_key(document: str) -> str:
+    """Identifies a document's current content cheaply (path, size and modification time, or the member's CRC)."""
+    path, member = _split(document)
+    stat = os.stat(path)
+    identity = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+    if member is not None:
+        with zipfile.ZipFile(path) as archive:
+            info = archive.getinfo(member)
+        identity = [os.path.abspath(path), member, info.file_size, info.CRC]
+    return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()[:32]
+
+
+class BatchCheckpoint:
+    """
+    Progress of a batch run under 'root', per extraction settings variant so
+    runs with other settings never reuse each other's results:
+
+    - progress.jsonl: one {"document", "key", "state"} line per finished document
+      (only the coordinating process appends to it).
+    - results/<key>.arrow: the extracted tables of each "extracted" document.
+
+    Documents whose last state is "extracted" or "no_tables" and whose key is
+    unchanged are skipped on resume; failed ones are tried again.
+    """
+
+    def __init__(self, root: str, variant: str):
+        self.root = os.path.join(root, variant)
+        os.makedirs(os.path.join(self.root, "results"), exist_ok=True)
+        self._log_path = os.path.join(self.root, "progress.jsonl")
+
+    def result_path(self, key: str) -> str:
+        return os.path.join(self.root, "results", f"{key}.arrow")
+
+    def finished(self) -> dict:
+        """{document: (key, state)} of the documents done in earlier runs."""
+        done = {}
+        try:
+            with open(self._log_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # the last line of a run that was killed mid-write
+                    done[entry["document"]] = (entry["key"], entry["state"])
+        except FileNotFoundError:
+            pass
+        return {
+            document: (key, state) for document, (key, state) in done.items()
+            if state == "no_tables" or (state == "extracted" and os.path.exists(self.result_path(key)))
+        }
+
+    def record(self, document: str, key: str, state: str):
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"document": document, "key": key, "state": state}) + "\n")
+
+    def write_result(self, key: str, table, chosen_header):
+        path = self.result_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(serialize_table(table, chosen_header))
+        os.replace(tmp_path, path)
+
+    def read_result(self, key: str):
+        return read_table(self.result_path(key))
+
+    def read_header(self, key: str):
+        """(column names, chosen_header) of a stored result, without reading its rows."""
+        return read_schema(self.result_path(key))
+
+
+def batch_settings(standard_headers=None, pages: str = None, max_tables: int = None, max_rows: int = None,
+                   profile: str = None) -> dict:
+    """PDFExtractor options of a batch run; every worker builds its extractor from them."""
+    settings = {"standard_headers": standard_headers, "pages": pages, "max_tables": max_tables, "max_rows": max_rows}
+    # Only when set, so checkpoints written before profiles existed still resume
+    if profile is not None:
+        settings["profile"] = profile
+    return settings
+
+
+# Per worker process: the extractor and checkpoint set up by _init_worker
+_worker = {}
+
+
+def _init_worker(settings: dict, checkpoint_root: str, variant: str, spawned: bool = True):
+    if spawned:
+        configure_logging()
+    # Documents are spread over the processes, so each parses its own on one thread. Pool
+    # processes can't start sandbox processes, so parse limits don't apply here
+    _worker["extractor"] = PDFExtractor(engine=ExtractionEngine.THREADS, limits=ParseLimits(0, 0, 0, 0, 0), **settings)
+    _worker["checkpoint"] = BatchCheckpoint(checkpoint_root, variant)
+
+
+def _extract_one(item):
+    """Extracts one document in a worker and checkpoints its result; returns (document, key, state)."""
+    document, key = item
+    extractor, checkpoint = _worker["extractor"], _worker["checkpoint"]
+    try:
+        with open_document(document) as pdf_file:
+            table, header = extractor.extract_document(pdf_file, document)
+    except (OSError, zipfile.BadZipFile, KeyError) as error:
+        logger.error("Can't read %s: %s", document, error)
+        return document, key, "failed"
+    except ExtractionError as error:
+        logger.error("%s", error, exc_info=error.__cause__)
+        return document, key, "failed"
+    if table is None:
+        return document, key, "no_tables"
+    checkpoint.write_result(key, table, header)
+    return document, key, "extracted"
+
+
+def run_batch(documents: list, checkpoint_root: str, settings: dict = None, processes: int = None, progress=None) -> list:
+    """
+    Extracts every document not already checkpointed, using 'processes' worker
+    processes (all cores by default; 1 extracts in this process). Returns
+    [(document, key)] of the documents with tables, in the order of 'documents',
+    for write_partitions(). 'progress' is called with (document, state) as each
+    document finishes, state being "extracted", "no_tables", "failed" or "skipped".
+    """
+    settings = settings or batch_settings()
+    variant = settings_variant(settings)
+    checkpoint = BatchCheckpoint(checkpoint_root, variant)
+    finished = checkpoint.finished()
+    states = {}
+    pending = []
+    for document in documents:
+        try:
+            key = document_key(document)
+        except (OSError, zipfile.BadZipFile, KeyError) as error:
+            logger.error("Can't read %s: %s", document, error)
+            states[document] = (None, "failed")
+            continue
+        if finished.get(document, (None,))[0] == key:
+            states[document] = finished[document]
+            if progress:
+                progress(document, "skipped")
+        else:
+            pending.append((document, key))
+    logger.info("%d of %d document(s) to extract, %d done in earlier runs", len(pending), len(documents), len(documents) - len(pending))
+
+    def finish(document, key, state):
+        checkpoint.record(document, key, state)
+        states[document] = (key, state)
+        if progress:
+            progress(document, state)
+        if len(states) % PROGRESS_EVERY == 0:
+            logger.info("%d of %d document(s) done", len(states), len(documents))
+
+    processes = processes or os.cpu_count() or 1
+    initargs = (settings, checkpoint_root, variant)
+    if processes <= 1 or len(pending) <= 1:
+        _init_worker(*initargs, spawned=False)
+        for item in pending:
+            finish(*_extract_one(item))
+    else:
+        # Spawned, like the table engine's pool, so every worker starts from a clean interpreter
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(min(processes, len(pending)), initializer=_init_worker, initargs=initargs) as pool:
+            for outcome in pool.imap_unordered(_extract_one, pending):
+                finish(*outcome)
+
+    counts = {}
+    for _, state in states.values():
+        counts[state] = counts.get(state, 0) + 1
+    logger.info("Batch extraction finished: %s", counts)
+    return [(document, states[document][0]) for document in documents if states[document][1] == "extracted"]
+
+
+def write_partitions(extracted: list, checkpoint_root: str, output_dir: str, settings: dict = None,
+                     partition_rows: int = PARTITION_ROWS, options: ExportOptions = None) -> list:
+    """
+    Merges the checkpointed results of 'extracted' ([(document, key)] from
+    run_batch) into Parquet part files (part-00000.parquet, ...) of about
+    'partition_rows' rows each, all with the same columns. The header vote
+    only reads the stored headers, and one partition is in memory at a time.
+    Part files of an earlier run in 'output_dir' are replaced. Returns the paths written.
+    """
+    settings = settings or batch_settings()
+    options = options or ExportOptions()
+    extractor = PDFExtractor(**settings)
+    checkpoint = BatchCheckpoint(checkpoint_root, settings_variant(settings))
+
+    headers = [checkpoint.read_header(key) for _, key in extracted]
+    global_header = extractor.choose_global_header([(None, header) for _, header in headers])
+    columns = extractor.merged_columns(headers, global_header)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.startswith("part-") and name.endswith(".parquet"):
+            os.remove(os.path.join(output_dir, name))
+
+    paths = []
+    tables, rows = [], 0
+
+    def flush():
+        table = pa.concat_tables(tables)
+        path = os.path.join(output_dir, f"part-{len(paths):05d}.parquet")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        pq.write_table(table, tmp_path, row_group_size=options.row_group_size, **options.parquet_kwargs())
+        os.replace(tmp_path, path)
+        paths.append(path)
+        logger.info("Wrote %d row(s) to %s", table.num_rows, path)
+
+    for (document, key), (_, header) in zip(extracted, headers):
+        table, _ = checkpoint.read_result(key)
+        tables.append(extractor.fit_columns(table, header, global_header, columns))
+        rows += table.num_rows
+        if rows >= partition_rows:
+            flush()
+            tables, rows = [], 0
+    if tables:
+        flush()
+    return paths
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import pyarrow as pa
+
+from app.settings import BASE_TMP_DIR
+from app.services.downloads import CHUNK_SIZE, Download
+
+CACHE_DIR = os.path.join(BASE_TMP_DIR, "cache")
+
+# Total size of cached PDFs and extraction results before least-recently-used entries are evicted
+DEFAULT_MAX_BYTES = int(os.environ.get("WEB_SCRAPER_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+
+class DocumentCache:
+    """
+    Persistent, content-addressed cache of downloaded PDFs and their extraction results.
+
+    - URLs map to the content hash of their last download plus the ETag and
+      Last-Modified validators needed to revalidate it with a conditional GET.
+    - PDF bytes are stored once per content hash (pdf/<hash>.pdf).
+    - Extraction results are stored per content hash and extraction settings
+      as Arrow IPC files (results/<hash>-<variant>.arrow), one record batch per
+      table with the chosen header kept in the schema metadata.
+
+    Files are tracked in a small SQLite index and evicted least-recently-used
+    first once their total size goes over 'max_bytes'.
+    """
+
+    def __init__(self, root: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "pdf"), exist_ok=True)
+        os.makedirs(os.path.join(root, "results"), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                "url TEXT PRIMARY KEY, content_hash TEXT, etag TEXT, last_modified TEXT)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, size INTEGER, last_used REAL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Yields an index connection that commits on success and is always closed."""
+        db = sqlite3.connect(os.path.join(self.root, "index.sqlite"), timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    # --- URL validators ---
+
+    def validators(self, url: str, variant: str) -> dict:
+        """
+        Request headers that revalidate the cached copy of 'url'. Empty when
+        neither its PDF nor its extraction result is still cached, since a 304
+        would then be of no use.
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT content_hash, etag, last_modified FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return {}
+        content_hash, etag, last_modified = row
+        if not (self._has(self._pdf_key(content_hash)) or self._has(self._result_key(content_hash, variant))):
+            return {}
+
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def content_hash(self, url: str):
+        """Content hash of the last download of 'url', or None."""
+        with self._connect() as db:
+            row = db.execute("SELECT content_hash FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def store_download(self, url: str, download: Download) -> str:
+        """Saves a freshly downloaded PDF and the validators that came with it, returns its content hash."""
+        content_hash = file_hash(download.open_pdf())
+
+        key = self._pdf_key(content_hash)
+        if not self._has(key):
+            self._write_file(key, download.open_pdf())
+
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO urls (url, content_hash, etag, last_modified) VALUES (?, ?, ?, ?)",
+                (url, content_hash, download.headers.get("ETag"), download.headers.get("Last-Modified")),
+            )
+        return content_hash
+
+    # --- PDFs ---
+
+    def open_pdf(self, content_hash: str):
+        """Opens the cached PDF for reading, or returns None if it was evicted."""
+        key = self._pdf_key(content_hash)
+        try:
+            pdf_file = open(self._path(key), "rb")
+        except FileNotFoundError:
+            return None
+        self._touch(key)
+        return pdf_file
+
+    # --- Extraction results ---
+
+    def load_result(self, content_hash: str, variant: str):
+        """Returns the cached (table, chosen_header) for a PDF, or None on a miss."""
+        key = self._result_key(content_hash, variant)
+        result = read_table(self._path(key))
+        if result is not None:
+            self._touch(key)
+        return result
+
+    def store_result(self, content_hash: str, variant: str, table, chosen_header):
+        """Caches the extraction result of a PDF; 'table' may be None when nothing was extracted."""
+        self._write_file(self._result_key(content_hash, variant), serialize_table(table, chosen_header))
+
+    # --- Bookkeeping ---
+
+    def _pdf_key(self, content_hash: str) -> str:
+        return f"pdf/{content_hash}.pdf"
+
+    def _result_key(self, content_hash: str, variant: str) -> str:
+        return f"results/{content_hash}-{variant}.arrow"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _has(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def _touch(self, key: str):
+        with self._connect() as db:
+            db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+
+    def _write_file(self, key: str, data):
+        """
+        Writes 'data' (bytes or a readable file object) atomically, records the
+        entry and evicts old entries if over budget.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f, CHUNK_SIZE)
+            size = f.tell()
+        os.replace(tmp_path, path)
+
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, size, last_used) VALUES (?, ?, ?)",
+                (key, size, time.time()),
+            )
+            self._evict(db)
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+
+def file_hash(pdf_file) -> str:
+    """SHA-256 of a file object's contents from its current position, read in chunks."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: pdf_file.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def serialize_table(table, chosen_header) -> bytes:
+    """
+    Arrow IPC file holding an extracted table (one record batch per PDF table,
+    all string columns), with the chosen header kept in the schema metadata.
+    """
+    schema = table.schema if table is not None else pa.schema([])
+    schema = schema.with_metadata({"chosen_header": json.dumps(chosen_header)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, schema) as writer:
+        if table is not None:
+            writer.write_table(table.replace_schema_metadata(schema.metadata))
+    return sink.getvalue().to_pybytes()
+
+
+def read_table(path: str):
+    """Reads a file written by serialize_table back as (table or None, chosen_header), or None if missing."""
+    try:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            header = json.loads(reader.schema.metadata[b"chosen_header"])
+            table = reader.read_all().replace_schema_metadata(None)
+    except FileNotFoundError:
+        return None
+    return (table if table.num_rows else None), header
+
+
+def read_schema(path: str):
+    """(column names, chosen_header) of a file written by serialize_table, without reading its rows."""
+    with pa.memory_map(path) as source:
+        schema = pa.ipc.open_file(source).schema
+    return schema.names, json.loads(schema.metadata[b"chosen_header"])
+
+
+def settings_variant(settings) -> str:
+    """Short stable hash of the extraction settings a cached result depends on."""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+_document_cache = None
+_document_cache_lock = threading.Lock()
+
+
+def get_document_cache() -> DocumentCache:
+    """Returns the cache shared by all requests, creating it on first use."""
+    global _document_cache
+    with _document_cache_lock:
+        if _document_cache is None:
+            _document_cache = DocumentCache()
+        return _document_cache
@@ -0,0 +1,491 @@
+"""
+Extraction spread over worker processes or machines. The coordinator (the API
+process) turns a request into one task per document on a TaskQueue; workers
+(python -m app.worker) take tasks, extract their document and write the result
+as an Arrow IPC file (see cache.serialize_table) to a ResultStore that the
+coordinator and every worker can reach. The coordinator then votes on the
+global header and merges exactly as PDFExtractor.extract does, so the output
+is the same.
+
+Tasks are delivered at least once: a task whose worker stops renewing its
+lease is queued again and may be extracted twice, which only costs time.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from app.models import OutputFormat
+from app.services.cache import serialize_table, read_table, get_document_cache
+from app.services.metrics import DOCUMENTS
+from app.services.pdfextractor import PDFExtractor
+from app.services.sandbox import ParseLimits
+from app.services.singleflight import dedupe_urls
+from app.settings import TASK_QUEUE, SHARED_DIR, TASK_LEASE
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = os.path.join(SHARED_DIR, "results")
+
+# States of a task once its document is done, as PDFExtractor.extract reports them
+OUTCOMES = ("extracted", "no_tables", "failed")
+
+
+class TaskQueue(ABC):
+    """
+    Per-document extraction tasks (JSON-serializable dicts with 'id', 'batch',
+    'url' and 'settings'), queued by a coordinator and taken by workers.
+    A task is "queued", then "running" under a lease, then one of OUTCOMES.
+    """
+
+    @abstractmethod
+    def push(self, tasks: list):
+        """Queues tasks, in order."""
+        pass
+
+    @abstractmethod
+    def pop(self, lease: float = TASK_LEASE, timeout: float = 1.0):
+        """Takes the next queued task for 'lease' seconds, waiting up to 'timeout' seconds; None if there is none."""
+        pass
+
+    @abstractmethod
+    def renew(self, task_id: str, lease: float = TASK_LEASE):
+        """Extends the lease of a running task."""
+        pass
+
+    @abstractmethod
+    def finish(self, task_id: str, state: str):
+        """Records the outcome of a task."""
+        pass
+
+    @abstractmethod
+    def states(self, batch: str) -> dict:
+        """{task id: state} of the tasks of a batch."""
+        pass
+
+    @abstractmethod
+    def reclaim(self, batch: str) -> int:
+        """Queues again the running tasks of a batch whose lease ran out; returns how many."""
+        pass
+
+    @abstractmethod
+    def delete(self, batch: str):
+        """Forgets the tasks of a batch."""
+        pass
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """Tasks in a SQLite file, shared by the processes of one machine (or of a shared filesystem with working locks)."""
+
+    def __init__(self, path: str = os.path.join(SHARED_DIR, "tasks.sqlite"), poll_interval: float = 0.2):
+        self.path = path
+        self.poll_interval = poll_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE, batch TEXT, state TEXT, "
+                "leased_until REAL, data TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS tasks_batch ON tasks (batch)")
+            db.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, seq)")
+
+    @contextmanager
+    def _connect(self):
+        """Yields a connection that commits on success and is always closed."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def push(self, tasks: list):
+        with self._connect() as db:
+            db.executemany(
+                "INSERT INTO tasks (id, batch, state, leased_until, data) VALUES (?, ?, 'queued', NULL, ?)",
+                [(task["id"], task["batch"], json.dumps(task)) for task in tasks],
+            )
+
+    def pop(self, lease: float = TASK_LEASE, timeout: float = 1.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._connect() as db:
+                # Takes the write lock first so two workers can't claim the same task
+                db.execute("BEGIN IMMEDIATE")
+                row = db.execute("SELECT id, data FROM tasks WHERE state = 'queued' ORDER BY seq LIMIT 1").fetchone()
+                if row is not None:
+                    db.execute(
+                        "UPDATE tasks SET state = 'running', leased_until = ? WHERE id = ?", (time.time() + lease, row[0])
+                    )
+                    return json.loads(row[1])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def renew(self, task_id: str, lease: float = TASK_LEASE):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE tasks SET leased_until = ? WHERE id = ? AND state = 'running'", (time.time() + lease, task_id)
+            )
+
+    def finish(self, task_id: str, state: str):
+        with self._connect() as db:
+            db.execute("UPDATE tasks SET state = ?, leased_until = NULL WHERE id = ?", (state, task_id))
+
+    def states(self, batch: str) -> dict:
+        with self._connect() as db:
+            rows = db.execute("SELECT id, state FROM tasks WHERE batch = ?", (batch,)).fetchall()
+        return dict(rows)
+
+    def reclaim(self, batch: str) -> int:
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE tasks SET state = 'queued', leased_until = NULL "
+                "WHERE batch = ? AND state = 'running' AND leased_until < ?", (batch, time.time())
+            )
+        return cursor.rowcount
+
+    def delete(self, batch: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM tasks WHERE batch = ?", (batch,))
+
+
+# Redis scripts, so each change to a task's state happens in one atomic step
+
+# Takes the first id off the queue (KEYS[1]) whose task (ARGV[1] .. id) is still
+# queued, leasing it until ARGV[2]; skips ids of deleted or already taken tasks
+_CLAIM_SCRIPT = """
+while true do
+    local task_id = redis.call('LPOP', KEYS[1])
+    if not task_id then
+        return false
+    end
+    local task_key = ARGV[1] .. task_id
+    if redis.call('HGET', task_key, 'state') == 'queued' then
+        redis.call('HSET', task_key, 'state', 'running', 'leased_until', ARGV[2])
+        return redis.call('HGET', task_key, 'data')
+    end
+end
+"""
+
+# Extends the lease of task KEYS[1] to ARGV[1] if it is still running
+_RENEW_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'state') == 'running' then
+    redis.call('HSET', KEYS[1], 'leased_until', ARGV[1])
+end
+"""
+
+# Records the outcome ARGV[1] of task KEYS[1], unless its batch was deleted
+_FINISH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], 'state', ARGV[1])
+    redis.call('HDEL', KEYS[1], 'leased_until')
+end
+"""
+
+# Queues task ARGV[1] (hash KEYS[1]) again on the queue KEYS[2] when it is running
+# with a lease that ran out before ARGV[2], or queued but missing from the queue
+_RECLAIM_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], 'state')
+local leased_until = tonumber(redis.call('HGET', KEYS[1], 'leased_until'))
+local expired = state == 'running' and leased_until ~= nil and leased_until < tonumber(ARGV[2])
+local orphaned = state == 'queued' and not redis.call('LPOS', KEYS[2], ARGV[1])
+if not (expired or orphaned) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'state', 'queued')
+redis.call('HDEL', KEYS[1], 'leased_until')
+redis.call('RPUSH', KEYS[2], ARGV[1])
+return 1
+"""
+
+
+class RedisTaskQueue(TaskQueue):
+    """
+    Tasks in Redis (or a Redis-compatible server, 6.0.6 or later), for workers on
+    several machines: a list of queued task ids, a hash per task and a set per
+    batch. Needs the 'redis' package; 'client' is an already connected one.
+    """
+
+    def __init__(self, url: str = None, prefix: str = "webscraper:tasks", poll_interval: float = 0.2, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("The Redis task queue needs the 'redis' package (pip install redis)")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self._claim = client.register_script(_CLAIM_SCRIPT)
+        self._renew = client.register_script(_RENEW_SCRIPT)
+        self._finish = client.register_script(_FINISH_SCRIPT)
+        self._reclaim = client.register_script(_RECLAIM_SCRIPT)
+
+    def _key(self, *parts) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def push(self, tasks: list):
+        pipe = self.client.pipeline()
+        for task in tasks:
+            pipe.hset(self._key("task", task["id"]), mapping={"state": "queued", "data": json.dumps(task)})
+            pipe.sadd(self._key("batch", task["batch"]), task["id"])
+            pipe.rpush(self._key("queue"), task["id"])
+        pipe.execute()
+
+    def pop(self, lease: float = TASK_LEASE, timeout: float = 1.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            # Taking the id and leasing the task in one step, so a worker stopping in
+            # between can't leave a task that is neither queued nor leased
+            data = self._claim(keys=[self._key("queue")], args=[self._key("task", ""), time.time() + lease])
+            if data is not None:
+                return json.loads(data)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def renew(self, task_id: str, lease: float = TASK_LEASE):
+        self._renew(keys=[self._key("task", task_id)], args=[time.time() + lease])
+
+    def finish(self, task_id: str, state: str):
+        self._finish(keys=[self._key("task", task_id)], args=[state])
+
+    def states(self, batch: str) -> dict:
+        ids = sorted(self.client.smembers(self._key("batch", batch)))
+        pipe = self.client.pipeline()
+        for task_id in ids:
+            pipe.hget(self._key("task", task_id), "state")
+        return dict(zip(ids, pipe.execute()))
+
+    def reclaim(self, batch: str) -> int:
+        """
+        Also queues again tasks left queued but missing from the queue list, as a
+        worker that stopped between taking and leasing a task used to leave them.
+        """
+        now = time.time()
+        return sum(
+            self._reclaim(keys=[self._key("task", task_id), self._key("queue")], args=[task_id, now])
+            for task_id in sorted(self.client.smembers(self._key("batch", batch)))
+        )
+
+    def delete(self, batch: str):
+        ids = self.client.smembers(self._key("batch", batch))
+        pipe = self.client.pipeline()
+        for task_id in ids:
+            pipe.delete(self._key("task", task_id))
+            pipe.lrem(self._key("queue"), 0, task_id)
+        pipe.delete(self._key("batch", batch))
+        pipe.execute()
+
+
+def get_task_queue(spec: str = TASK_QUEUE):
+    """
+    The TaskQueue named by 'spec' (WEB_SCRAPER_TASK_QUEUE): "sqlite" or
+    "sqlite:///path/to/tasks.sqlite", "redis://..." or "rediss://...", or None
+    when empty (extraction stays in-process).
+    """
+    if not spec:
+        return None
+    if spec == "sqlite":
+        return SQLiteTaskQueue()
+    if spec.startswith("sqlite:///"):
+        return SQLiteTaskQueue(spec[len("sqlite:///") - 1:])
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisTaskQueue(spec)
+    raise ValueError(f"Unknown task queue: {spec}")
+
+
+class ResultStore:
+    """
+    Per-document extraction results of each batch, as Arrow IPC files under
+    'root' (<batch>/<task id>.arrow), with the document's aborted pages, if
+    any, next to them (<batch>/<task id>.aborted.json).
+    """
+
+    def __init__(self, root: str = RESULTS_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, batch: str, task_id: str) -> str:
+        return os.path.join(self.root, batch, f"{task_id}.arrow")
+
+    def aborted_path(self, batch: str, task_id: str) -> str:
+        return os.path.join(self.root, batch, f"{task_id}.aborted.json")
+
+    def write(self, batch: str, task_id: str, table, chosen_header):
+        self._write(self.path(batch, task_id), serialize_table(table, chosen_header))
+
+    def read(self, batch: str, task_id: str):
+        """(table or None, chosen_header), or None if no result was written."""
+        return read_table(self.path(batch, task_id))
+
+    def write_aborted(self, batch: str, task_id: str, aborted: list):
+        """Keeps the (page, reason) pairs of the document's aborted pages (see PDFExtractor.aborted_pages)."""
+        self._write(self.aborted_path(batch, task_id), json.dumps(aborted).encode())
+
+    def read_aborted(self, batch: str, task_id: str) -> list:
+        """The (page, reason) pairs written by write_aborted(), or [] if none were."""
+        try:
+            with open(self.aborted_path(batch, task_id)) as f:
+                return [tuple(page) for page in json.load(f)]
+        except FileNotFoundError:
+            return []
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def delete(self, batch: str):
+        shutil.rmtree(os.path.join(self.root, batch), ignore_errors=True)
+
+
+def task_settings(extractor: PDFExtractor) -> dict:
+    """The options of 'extractor' a worker needs to extract a document the same way."""
+    return {
+        "standard_headers": extractor.standard_headers,
+        "engine": extractor.engine.value,
+        "use_cache": extractor.cache is not None,
+        "max_document_bytes": extractor.max_document_bytes,
+        "pages": extractor.pages,
+        "max_tables": extractor.max_tables,
+        "max_rows": extractor.max_rows,
+        "limits": extractor.limits.to_dict(),
+        "table_settings": extractor.table_settings,
+        "profile": extractor.profile,
+    }
+
+
+def build_extractor(settings: dict) -> PDFExtractor:
+    """A worker's extractor for the task_settings() of the coordinator's."""
+    settings = dict(settings)
+    cache = get_document_cache() if settings.pop("use_cache") else None
+    limits = settings.pop("limits", None)  # absent from tasks queued before parse limits existed
+    return PDFExtractor(cache=cache, limits=ParseLimits(**limits) if limits else None, **settings)
+
+
+class ExtractionWorker:
+    """Takes tasks from a TaskQueue, extracts their document and writes the result to a ResultStore."""
+
+    def __init__(self, queue: TaskQueue, results: ResultStore, lease: float = TASK_LEASE):
+        self.queue = queue
+        self.results = results
+        self.lease = lease
+
+    def run(self, stop: threading.Event = None):
+        """Works until 'stop' is set."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.run_once()
+
+    def run_once(self, timeout: float = 1.0) -> bool:
+        """Processes the next task, waiting up to 'timeout' seconds for one; False when there was none."""
+        task = self.queue.pop(self.lease, timeout)
+        if task is None:
+            return False
+        with self._renewing(task["id"]):
+            state = self.process(task)
+        self.queue.finish(task["id"], state)
+        return True
+
+    def process(self, task: dict) -> str:
+        """Extracts the task's document and stores the result; returns its state (one of OUTCOMES)."""
+        url = task["url"]
+        extractor = build_extractor(task["settings"])
+        try:
+            table, header = extractor.fetch_and_extract(url)
+            if table is not None:
+                self.results.write(task["batch"], task["id"], table, header)
+            return "extracted" if table is not None else "no_tables"
+        except Exception:
+            logger.exception("Error processing PDF %s", url)
+            return "failed"
+        finally:
+            # Reported by the coordinator like extract() does, whatever became of the document
+            if url in extractor.aborted_pages:
+                self.results.write_aborted(task["batch"], task["id"], extractor.aborted_pages[url])
+
+    @contextmanager
+    def _renewing(self, task_id: str):
+        """Renews the task's lease in the background while the block runs."""
+        done = threading.Event()
+
+        def renew():
+            while not done.wait(self.lease / 3):
+                self.queue.renew(task_id, self.lease)
+
+        thread = threading.Thread(target=renew, name=f"lease-{task_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+
+def extract_distributed(extractor: PDFExtractor, urls: list, output_format: OutputFormat = OutputFormat.CSV,
+                        progress=None, queue: TaskQueue = None, results: ResultStore = None,
+                        poll_interval: float = 0.5, timeout: float = None):
+    """
+    PDFExtractor.extract() with the documents extracted by workers: queues one
+    task per (deduplicated) URL, waits for all of them, and merges the stored
+    results in the order of 'urls'. 'progress' is called as in extract().
+    Raises TimeoutError if the tasks aren't done within 'timeout' seconds.
+    """
+    queue = queue or get_task_queue()
+    results = results or ResultStore()
+    urls = dedupe_urls(urls)
+    batch = uuid.uuid4().hex
+    settings = task_settings(extractor)
+    tasks = [{"id": f"{batch}-{i}", "batch": batch, "url": url, "settings": settings} for i, url in enumerate(urls)]
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    done = {}  # task id -> outcome
+
+    queue.push(tasks)
+    try:
+        while True:
+            queue.reclaim(batch)
+            states = queue.states(batch)
+            for task in tasks:
+                state = states.get(task["id"])
+                if state in OUTCOMES and task["id"] not in done:
+                    done[task["id"]] = state
+                    DOCUMENTS.inc(outcome=state)
+                    if progress:
+                        progress(task["url"], state)
+            if len(done) == len(tasks):
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"{len(tasks) - len(done)} of {len(tasks)} documents weren't extracted in time")
+            time.sleep(poll_interval)
+
+        for task in tasks:
+            aborted = results.read_aborted(batch, task["id"])
+            if aborted:
+                extractor.aborted_pages[task["url"]] = aborted
+
+        # Merged straight from the result files, one document in memory at a time
+        extracted = [results.path(batch, task["id"]) for task in tasks if done[task["id"]] == "extracted"]
+        output = extractor.combine_spilled([path for path in extracted if os.path.exists(path)], output_format)
+        return extractor.with_aborted_headers(output)
+    finally:
+        queue.delete(batch)
+        results.delete(batch)
+
+
+def run_extraction(extractor: PDFExtractor, urls: list, output_format: OutputFormat = OutputFormat.CSV, progress=None):
+    """extract() on the workers when WEB_SCRAPER_TASK_QUEUE is set, in this process otherwise."""
+    queue = get_task_queue()
+    if queue is None:
+        return extractor.extract(urls, output_format, progress=progress)
+    return extract_distributed(extractor, urls, output_format, progress=progress, queue=queue)
@@ -0,0 +1,158 @@
+import os
+import mmap
+import asyncio
+import tempfile
+import threading
+
+from app.settings import BASE_TMP_DIR, DOWNLOAD_SPOOL_BYTES, MAX_DOCUMENT_BYTES, INFLIGHT_BYTES_BUDGET
+
+# Size of the pieces a document body is read in
+CHUNK_SIZE = 1024 * 1024
+
+
+class DocumentTooLargeError(Exception):
+    """Raised when a document is bigger than the configured maximum size."""
+
+
+class ByteBudget:
+    """
+    Caps the bytes held by documents that are being downloaded or parsed.
+    A reservation larger than the whole budget is reduced to the budget, so a
+    single oversized (but allowed) document can still run, on its own.
+    """
+
+    def __init__(self, limit: int = INFLIGHT_BYTES_BUDGET):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+        self._async_waiters = []
+
+    def _take(self, amount: int) -> bool:
+        if self.in_use + amount > self.limit:
+            return False
+        self.in_use += amount
+        return True
+
+    def acquire(self, amount: int) -> int:
+        """Blocks until 'amount' bytes are free, returns the amount actually reserved."""
+        amount = min(amount, self.limit)
+        with self._condition:
+            self._condition.wait_for(lambda: self._take(amount))
+        return amount
+
+    async def acquire_async(self, amount: int) -> int:
+        """Like acquire(), but waits without blocking the event loop."""
+        amount = min(amount, self.limit)
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._take(amount):
+                    return amount
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def grow(self, amount: int) -> int:
+        """Adds to a reservation without waiting (a body turned out longer than announced)."""
+        with self._condition:
+            self.in_use += amount
+        return amount
+
+    def release(self, amount: int):
+        with self._condition:
+            self.in_use -= amount
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_inflight_budget = ByteBudget()
+
+
+def get_inflight_budget() -> ByteBudget:
+    """Returns the budget shared by every request in the process."""
+    return _inflight_budget
+
+
+def check_document_size(url: str, size, max_bytes: int = MAX_DOCUMENT_BYTES):
+    if max_bytes and size is not None and size > max_bytes:
+        raise DocumentTooLargeError(f"{url} is larger than the {max_bytes} byte limit")
+
+
+def content_length(headers):
+    """The announced body size, or None when missing or invalid."""
+    try:
+        return int(headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Download:
+    """
+    A downloaded document: response status and headers plus the body, spooled
+    in memory while small and in a temp file once it grows past DOWNLOAD_SPOOL_BYTES.
+    Holds its share of the in-flight byte budget until closed.
+    """
+
+    def __init__(self, url: str, status_code: int, headers, budget: ByteBudget = None,
+                 reserved: int = 0, max_bytes: int = MAX_DOCUMENT_BYTES):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.size = 0
+        self.max_bytes = max_bytes
+        self._budget = budget
+        self._reserved = reserved
+        self._map = None
+        self.file = None
+        if status_code != 304:
+            os.makedirs(BASE_TMP_DIR, exist_ok=True)
+            self.file = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES, dir=BASE_TMP_DIR)
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        check_document_size(self.url, self.size, self.max_bytes)
+        self.file.write(chunk)
+
+    def finish(self):
+        """Called once the body is complete; settles the budget reservation with the real size."""
+        if self._budget is not None and self.size > self._reserved:
+            self._reserved += self._budget.grow(self.size - self._reserved)
+        self.file.seek(0)
+
+    def open_pdf(self):
+        """
+        File object to hand to pdfplumber: a read-only memory map when the body
+        was spooled to disk, the in-memory spool otherwise.
+        """
+        if self._map is None and self.file._rolled and self.size:
+            self._map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        pdf_file = self._map if self._map is not None else self.file
+        pdf_file.seek(0)
+        return pdf_file
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self.file is not None:
+            self.file.close()
+        if self._budget is not None and self._reserved:
+            self._budget.release(self._reserved)
+            self._reserved = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
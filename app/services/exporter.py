@@ -0,0 +1,332 @@
+import io
+import json
+import zlib
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.models import OutputFormat
+
+# (file extension, media type) for every supported output format
+FORMAT_INFO = {
+    OutputFormat.CSV: ("csv", "text/csv"),
+    OutputFormat.CSV_GZIP: ("csv.gz", "application/gzip"),
+    OutputFormat.CSV_ZSTD: ("csv.zst", "application/zstd"),
+    OutputFormat.NDJSON: ("ndjson", "application/x-ndjson"),
+    OutputFormat.PARQUET: ("parquet", "application/octet-stream"),
+    OutputFormat.ARROW: ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+# CSV formats that are compressed as a whole, by codec
+CSV_CODECS = {OutputFormat.CSV: None, OutputFormat.CSV_GZIP: "gzip", OutputFormat.CSV_ZSTD: "zstd"}
+
+# Codecs each columnar format can compress its data with ("none" turns compression off)
+COLUMNAR_CODECS = {
+    OutputFormat.PARQUET: ("snappy", "gzip", "zstd", "brotli", "lz4", "none"),
+    OutputFormat.ARROW: ("lz4", "zstd", "none"),
+}
+
+# Formats that may be sent with a Content-Encoding; the others are binary or compressed already
+ENCODABLE_FORMATS = (OutputFormat.CSV, OutputFormat.NDJSON)
+
+# Content-Encodings the responses can be compressed with, preferred first
+CONTENT_ENCODINGS = ("zstd", "gzip")
+
+# Levels used for gzip and zstd text (the zlib and zstd defaults) unless one is requested;
+# Content-Encoding always uses these
+TEXT_COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+
+# Levels gzip and zstd text can be compressed with
+TEXT_LEVEL_RANGES = {"gzip": (0, 9), "zstd": (1, 22)}
+
+
+class ExportOptions:
+    """
+    Tuning of the serialized output, trading payload size against serialization time.
+
+    compression: codec of Parquet column chunks (snappy by default) or of Arrow
+                 IPC record batches (uncompressed by default); see COLUMNAR_CODECS.
+    compression_level: level of that codec, or of the gzip/zstd CSV formats;
+                 None for the codec's default (Content-Encoding always uses it).
+    row_group_size: most rows per Parquet row group (default: one row group per
+                 written table, up to Parquet's own limit).
+    dictionary: dictionary-encode Parquet columns (on by default; repetitive text
+                 shrinks a lot, unique text only costs time).
+    """
+
+    def __init__(self, compression: str = None, compression_level: int = None,
+                 row_group_size: int = None, dictionary: bool = True):
+        self.compression = compression
+        self.compression_level = compression_level
+        self.row_group_size = row_group_size
+        self.dictionary = dictionary
+
+    def check(self, output_format):
+        """Raises ValueError when an option doesn't apply to 'output_format' or isn't supported."""
+        output_format = OutputFormat(output_format)
+        if self.compression is not None:
+            codecs = COLUMNAR_CODECS.get(output_format, ())
+            if self.compression not in codecs:
+                supported = f"one of {', '.join(codecs)}" if codecs else "not supported"
+                raise ValueError(f"Compression for {output_format.value} output is {supported}")
+            if self.compression != "none" and not pa.Codec.is_available(self.compression):
+                raise ValueError(f"The {self.compression} codec isn't available in this build of pyarrow")
+        if self.compression_level is not None:
+            codec = self._codec_name(output_format)
+            if codec is None:
+                raise ValueError("compression_level needs a compressed output format or a compression codec")
+            if output_format in CSV_CODECS:
+                low, high = TEXT_LEVEL_RANGES[codec]
+                if not low <= self.compression_level <= high:
+                    raise ValueError(f"{codec} compression levels run from {low} to {high}")
+            else:
+                pa.Codec(codec, compression_level=self.compression_level)  # raises for codecs without levels
+        if self.row_group_size is not None:
+            if output_format != OutputFormat.PARQUET:
+                raise ValueError("row_group_size only applies to parquet output")
+            if self.row_group_size < 1:
+                raise ValueError("row_group_size must be at least 1")
+        if not self.dictionary and output_format != OutputFormat.PARQUET:
+            raise ValueError("dictionary only applies to parquet output")
+
+    def _codec_name(self, output_format: OutputFormat):
+        """The codec 'compression_level' applies to for 'output_format', or None if uncompressed."""
+        if output_format in CSV_CODECS:
+            return CSV_CODECS[output_format]
+        if output_format == OutputFormat.PARQUET:
+            codec = self.compression or "snappy"
+        else:
+            codec = self.compression
+        return None if codec in (None, "none") else codec
+
+    def parquet_kwargs(self) -> dict:
+        """Keyword arguments of pq.write_table / ParquetWriter; empty with the defaults, so output is unchanged."""
+        kwargs = {}
+        if self.compression is not None:
+            kwargs["compression"] = self.compression
+        if self.compression_level is not None:
+            kwargs["compression_level"] = self.compression_level
+        if not self.dictionary:
+            kwargs["use_dictionary"] = False
+        return kwargs
+
+    def ipc_options(self) -> pa.ipc.IpcWriteOptions:
+        if self.compression in (None, "none"):
+            return pa.ipc.IpcWriteOptions()
+        return pa.ipc.IpcWriteOptions(compression=pa.Codec(self.compression, compression_level=self.compression_level))
+
+    def text_level(self, codec: str) -> int:
+        return self.compression_level if self.compression_level is not None else TEXT_COMPRESSION_LEVELS[codec]
+
+
+def format_info(output_format) -> tuple:
+    """Returns (file_extension, mime_type) for 'output_format' or raises ValueError if unsupported."""
+    try:
+        return FORMAT_INFO[OutputFormat(output_format)]
+    except (ValueError, KeyError):
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+
+def attachment_headers(file_extension: str) -> dict:
+    return {
+        "Content-Disposition": f'attachment; filename="final_extracted_data.{file_extension}"'
+    }
+
+
+def negotiate_encoding(accept_encoding: str, output_format):
+    """
+    The Content-Encoding ("zstd" or "gzip") to send 'output_format' with, given
+    the request's Accept-Encoding header, or None to send it as is.
+    """
+    if not accept_encoding or OutputFormat(output_format) not in ENCODABLE_FORMATS:
+        return None
+    weights = {}
+    for entry in accept_encoding.split(","):
+        name, _, params = entry.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    accepted = [encoding for encoding in CONTENT_ENCODINGS if weights.get(encoding, 0) > 0 and pa.Codec.is_available(encoding)]
+    if not accepted:
+        return None
+    return max(accepted, key=lambda encoding: weights[encoding])  # ties keep the preferred order
+
+
+class TextCompressor:
+    """
+    Compresses text output chunk by chunk, handing back each chunk's bytes right
+    away: gzip as a single member flushed after every chunk (HTTP clients often
+    decode only the first member), zstd as one frame per chunk (decoders read
+    concatenated frames).
+    """
+
+    def __init__(self, codec: str, level: int = None):
+        self.codec = codec
+        level = level if level is not None else TEXT_COMPRESSION_LEVELS[codec]
+        if codec == "gzip":
+            self._gzip = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            self._zstd = pa.Codec(codec, compression_level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        if self.codec == "gzip":
+            return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        return self._zstd.compress(data, asbytes=True)
+
+    def finish(self) -> bytes:
+        return self._gzip.flush() if self.codec == "gzip" else b""
+
+
+def compress_text(data: bytes, codec: str, level: int = None) -> bytes:
+    """'data' compressed whole as a gzip or zstd stream."""
+    compressor = TextCompressor(codec, level)
+    return compressor.compress(data) + compressor.finish()
+
+
+def export_table(table: pa.Table, output_format, options: ExportOptions = None):
+    """
+    Serializes the final Arrow table, returns (buffer, mime_type, headers).
+    Parquet and Arrow IPC are written straight from the Arrow columns; CSV goes
+    through pandas so quoting stays minimal.
+    """
+    file_extension, mime_type = format_info(output_format)
+    output_format = OutputFormat(output_format)
+    options = options or ExportOptions()
+    buffer = io.BytesIO()
+    if output_format in CSV_CODECS:
+        data = _csv_bytes(table, header=True)
+        codec = CSV_CODECS[output_format]
+        buffer.write(compress_text(data, codec, options.text_level(codec)) if codec else data)
+    elif output_format == OutputFormat.NDJSON:
+        buffer.write(_ndjson_bytes(table))
+    elif output_format == OutputFormat.ARROW:
+        with pa.ipc.new_file(buffer, table.schema, options=options.ipc_options()) as writer:
+            writer.write_table(table)
+    else:
+        import pyarrow.parquet as pq
+        pq.write_table(table, buffer, row_group_size=options.row_group_size, **options.parquet_kwargs())
+
+    buffer.seek(0)
+    return buffer, mime_type, attachment_headers(file_extension)
+
+
+def _csv_bytes(table: pa.Table, header: bool) -> bytes:
+    import pandas as pd
+    # Nullable pandas types for typed integer columns, so missing values don't turn them into floats
+    integers = {pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype()}
+    return table.to_pandas(types_mapper=integers.get).to_csv(index=False, header=header).encode("utf-8")
+
+
+def _ndjson_bytes(table: pa.Table) -> bytes:
+    """One JSON object per row, keyed by column name; empty cells are null and dates ISO strings."""
+    # float32 values as the decimals they were read from rather than their exact binary value
+    for i, field in enumerate(table.schema):
+        if pa.types.is_float32(field.type):
+            table = table.set_column(i, pa.field(field.name, pa.float64()), pc.cast(pc.cast(table.column(i), pa.string()), pa.float64()))
+    lines = []
+    for batch in table.to_batches():
+        lines.extend(json.dumps(row, ensure_ascii=False, default=str) for row in batch.to_pylist())
+    return "".join(line + "\n" for line in lines).encode("utf-8")
+
+
+class _DrainableSink:
+    """Write-only file object that hands back whatever was written since the last drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class StreamWriter:
+    """
+    Incrementally serializes tables that share a fixed set of columns.
+    begin() returns the leading bytes, write() the bytes for one chunk of rows
+    (a CSV block, compressed with csv.gz/csv.zst, NDJSON lines, a Parquet row group
+    or an Arrow record batch) and close() the trailing bytes.
+    """
+
+    def __init__(self, output_format, options: ExportOptions = None):
+        self.file_extension, self.mime_type = format_info(output_format)
+        self.output_format = OutputFormat(output_format)
+        self.options = options or ExportOptions()
+        self.columns = None
+        self._sink = None
+        self._parquet_writer = None
+        self._ipc_writer = None
+        self._schema = None
+        codec = CSV_CODECS.get(self.output_format)
+        self._compressor = TextCompressor(codec, self.options.text_level(codec)) if codec else None
+
+    def begin(self, columns: list) -> bytes:
+        self.columns = list(columns)
+        if self.output_format in CSV_CODECS:
+            import pandas as pd
+            return self._text(pd.DataFrame(columns=self.columns).to_csv(index=False).encode("utf-8"))
+        if self.output_format == OutputFormat.NDJSON:
+            return b""
+
+        # Extracted cells are text, so every column is a string column
+        self._schema = pa.schema([(str(col), pa.string()) for col in self.columns])
+        self._sink = _DrainableSink()
+        if self.output_format == OutputFormat.ARROW:
+            self._ipc_writer = pa.ipc.new_file(pa.PythonFile(self._sink, mode="w"), self._schema, options=self.options.ipc_options())
+        else:
+            import pyarrow.parquet as pq
+            self._parquet_writer = pq.ParquetWriter(pa.PythonFile(self._sink, mode="w"), self._schema, **self.options.parquet_kwargs())
+        return self._sink.drain()
+
+    def write(self, table: pa.Table) -> bytes:
+        """'table' is an Arrow table with the columns given to begin()."""
+        if table.num_rows == 0:
+            return b""
+        if self.output_format in CSV_CODECS:
+            return self._text(_csv_bytes(table, header=False))
+        if self.output_format == OutputFormat.NDJSON:
+            return _ndjson_bytes(table)
+
+        table = table.rename_columns(self._schema.names).cast(self._schema)
+        if self._ipc_writer is not None:
+            self._ipc_writer.write_table(table)
+        else:
+            self._parquet_writer.write_table(table, row_group_size=self.options.row_group_size)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        if self._compressor is not None:
+            return self._compressor.finish()
+        writer = self._parquet_writer or self._ipc_writer
+        if writer is None:
+            return b""
+        writer.close()
+        return self._sink.drain()
+
+    def _text(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) if self._compressor else data
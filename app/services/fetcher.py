@@ -0,0 +1,419 @@
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.downloads import (
+    CHUNK_SIZE,
+    ByteBudget,
+    Download,
+    check_document_size,
+    content_length,
+)
+from app.settings import (
+    DOWNLOAD_SPOOL_BYTES,
+    MAX_DOCUMENT_BYTES,
+    FETCH_TIMEOUT,
+    FETCH_MAX_RETRIES,
+    FETCH_MAX_PER_HOST,
+    FETCH_HOST_REQUESTS_PER_SECOND,
+)
+
+# Connection pool shared by every request handled by the worker
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HostLimits:
+    """
+    Per-host politeness settings.
+    max_concurrency: requests to the host allowed in flight at once.
+    requests_per_second: maximum rate of request starts, 0 for unlimited.
+    """
+
+    def __init__(self, max_concurrency: int = FETCH_MAX_PER_HOST, requests_per_second: float = FETCH_HOST_REQUESTS_PER_SECOND):
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_second = requests_per_second
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter for retryable failures, honoring Retry-After when sent."""
+
+    def __init__(self, max_retries: int = FETCH_MAX_RETRIES, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, max_retry_after: float = 120.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, retry_after: str = None) -> float:
+        """Seconds to wait before retry number 'attempt' + 1."""
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return min(server_delay, self.max_retry_after)
+        backoff = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return backoff * random.uniform(0.5, 1.0)
+
+
+def parse_retry_after(value: str):
+    """Parses a Retry-After header (delay in seconds or an HTTP date) into seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class _RateLimiter:
+    """Spaces out request starts to one host; shared by the sync and async fetchers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def reserve(self, requests_per_second: float) -> float:
+        """Claims the next start slot and returns how long to sleep until it."""
+        if not requests_per_second or requests_per_second <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + 1.0 / requests_per_second
+            return start - now
+
+    def defer(self, seconds: float):
+        """Holds back every request to the host for 'seconds' (after a 429/503 with Retry-After)."""
+        with self._lock:
+            self._next_start = max(self._next_start, time.monotonic() + seconds)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def _rate_limiter(host: str) -> _RateLimiter:
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = _RateLimiter()
+        return _rate_limiters[host]
+
+
+class _HostSlot:
+    """A host's concurrency slot held by a streamed response until it's closed; released once."""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._held = True
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._semaphore.release()
+
+
+class _FetcherBase:
+    """Host limits and retry decisions shared by Fetcher and AsyncFetcher."""
+
+    def __init__(self, retry: RetryPolicy = None, host_limits: dict = None, default_limits: HostLimits = None):
+        self.retry = retry or RetryPolicy()
+        self.host_limits = host_limits or {}
+        self.default_limits = default_limits or HostLimits()
+        self._semaphores = {}
+        self._semaphores_lock = threading.Lock()
+
+    def limits_for(self, host: str) -> HostLimits:
+        return self.host_limits.get(host, self.default_limits)
+
+    def _semaphore(self, host: str, factory):
+        with self._semaphores_lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = factory(self.limits_for(host).max_concurrency)
+            return self._semaphores[host]
+
+    def _retry_delay(self, host: str, attempt: int, status_code: int = None, headers=None):
+        """Seconds to wait before retrying, or None when the response/error should be returned/raised."""
+        if attempt >= self.retry.max_retries:
+            return None
+        if status_code is not None and status_code not in RETRY_STATUSES:
+            return None
+        retry_after = headers.get("Retry-After") if headers is not None else None
+        delay = self.retry.delay(attempt, retry_after)
+        if retry_after:
+            _rate_limiter(host).defer(delay)
+        return delay
+
+
+class Fetcher(_FetcherBase):
+    """
+    Blocking HTTP downloads over one pooled requests.Session (keep-alive per host),
+    with per-host concurrency caps and rate limits, and exponential-backoff
+    retries on connection errors, 429 and 5xx responses.
+    """
+
+    def __init__(self, session: requests.Session = None, timeout=FETCH_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+        self.session = session or self._new_session()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        # Keep one pooled connection per request a host may have in flight
+        pool_size = max([self.default_limits.max_concurrency] + [limits.max_concurrency for limits in self.host_limits.values()])
+        adapter = HTTPAdapter(pool_connections=MAX_KEEPALIVE_CONNECTIONS, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get(self, url: str, headers: dict = None, stream: bool = False) -> requests.Response:
+        """
+        GET 'url' and raise requests.HTTPError on 4xx/5xx responses once retries are exhausted.
+        A 304 Not Modified answer to a conditional request is returned as is.
+        With stream=True the body is left unread and the caller must close() the response;
+        it counts against the host's concurrency cap until then.
+        """
+        host = urlsplit(url).netloc
+        limits = self.limits_for(host)
+        slots = self._semaphore(host, threading.BoundedSemaphore)
+        attempt = 0
+        while True:
+            slots.acquire()
+            slot = _HostSlot(slots)
+            try:
+                time.sleep(_rate_limiter(host).reserve(limits.requests_per_second))
+                try:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+                except (requests.ConnectionError, requests.Timeout):
+                    delay = self._retry_delay(host, attempt)
+                    if delay is None:
+                        raise
+                    response = None
+
+                if response is not None:
+                    delay = self._retry_delay(host, attempt, response.status_code, response.headers)
+                    if delay is None:
+                        if stream and response.ok:
+                            _release_on_close(response, slot)
+                            slot = None
+                            return response
+                        if stream:
+                            response.close()
+                        response.raise_for_status()
+                        return response
+                    response.close()
+            finally:
+                if slot is not None:
+                    slot.release()
+
+            time.sleep(delay)
+            attempt += 1
+
+    def download(self, url: str, headers: dict = None, budget: ByteBudget = None,
+                 max_bytes: int = MAX_DOCUMENT_BYTES) -> Download:
+        """
+        Streams a document into a spooled Download instead of holding it in memory,
+        refusing documents over 'max_bytes' and waiting for room in 'budget' first.
+        """
+        response = self.get(url, headers=headers, stream=True)
+        try:
+            if response.status_code == 304:
+                return Download(url, 304, response.headers)
+            declared = content_length(response.headers)
+            check_document_size(url, declared, max_bytes)
+            reserved = budget.acquire(declared or DOWNLOAD_SPOOL_BYTES) if budget else 0
+            download = Download(url, response.status_code, response.headers, budget, reserved, max_bytes)
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    download.write(chunk)
+                download.finish()
+            except BaseException:
+                download.close()
+                raise
+            return download
+        finally:
+            response.close()
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncFetcher(_FetcherBase):
+    """
+    Non-blocking HTTP downloads for web pages and documents.
+    Wraps one httpx.AsyncClient so every request reuses the same connection pool,
+    with the same per-host limits and retries as Fetcher.
+    """
+
+    def __init__(self, client: httpx.AsyncClient = None, timeout=FETCH_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client or httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,  # requests.get follows redirects by default
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+
+    async def get(self, url: str, headers: dict = None, stream: bool = False) -> httpx.Response:
+        """
+        GET 'url' and raise httpx.HTTPStatusError on 4xx/5xx responses once retries are exhausted.
+        A 304 Not Modified answer to a conditional request is returned as is.
+        With stream=True the body is left unread and the caller must aclose() the response;
+        it counts against the host's concurrency cap until then.
+        """
+        host = urlsplit(url).netloc
+        limits = self.limits_for(host)
+        slots = self._semaphore(host, asyncio.Semaphore)
+        attempt = 0
+        while True:
+            await slots.acquire()
+            slot = _HostSlot(slots)
+            try:
+                await asyncio.sleep(_rate_limiter(host).reserve(limits.requests_per_second))
+                try:
+                    request = self.client.build_request("GET", url, headers=headers)
+                    response = await self.client.send(request, stream=stream)
+                except httpx.TransportError:
+                    delay = self._retry_delay(host, attempt)
+                    if delay is None:
+                        raise
+                    response = None
+
+                if response is not None:
+                    delay = self._retry_delay(host, attempt, response.status_code, response.headers)
+                    if delay is None:
+                        if response.status_code != 304 and not response.is_success:
+                            await response.aclose()
+                            response.raise_for_status()
+                        if stream:
+                            _release_on_aclose(response, slot)
+                            slot = None
+                        return response
+                    await response.aclose()
+            finally:
+                if slot is not None:
+                    slot.release()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def download(self, url: str, headers: dict = None, budget: ByteBudget = None,
+                       max_bytes: int = MAX_DOCUMENT_BYTES) -> Download:
+        """
+        Streams a document into a spooled Download instead of holding it in memory,
+        refusing documents over 'max_bytes' and waiting for room in 'budget' first.
+        """
+        response = await self.get(url, headers=headers, stream=True)
+        try:
+            if response.status_code == 304:
+                return Download(url, 304, response.headers)
+            declared = content_length(response.headers)
+            check_document_size(url, declared, max_bytes)
+            reserved = await budget.acquire_async(declared or DOWNLOAD_SPOOL_BYTES) if budget else 0
+            download = Download(url, response.status_code, response.headers, budget, reserved, max_bytes)
+            try:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    download.write(chunk)
+                download.finish()
+            except BaseException:
+                download.close()
+                raise
+            return download
+        finally:
+            await response.aclose()
+
+    async def get_text(self, url: str) -> str:
+        """Returns the decoded body of a web page."""
+        return (await self.get(url)).text
+
+    async def get_bytes(self, url: str) -> bytes:
+        """Returns the raw body of a document."""
+        return (await self.get(url)).content
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _release_on_close(response: requests.Response, slot: _HostSlot):
+    """Keeps 'slot' held while the body of 'response' is read, releasing it when the response is closed."""
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            slot.release()
+    response.close = close_and_release
+
+
+def _release_on_aclose(response: httpx.Response, slot: _HostSlot):
+    """Keeps 'slot' held while the body of 'response' is read, releasing it when the response is closed."""
+    aclose = response.aclose
+
+    async def aclose_and_release():
+        try:
+            await aclose()
+        finally:
+            slot.release()
+    response.aclose = aclose_and_release
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher() -> Fetcher:
+    """Returns the blocking fetcher shared by all threads, creating it on first use."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher()
+        return _fetcher
+
+
+_async_fetcher = None
+_async_fetcher_loop = None
+
+
+def get_async_fetcher() -> AsyncFetcher:
+    """
+    Returns the fetcher shared by all requests on the running event loop.
+    A client's pooled connections belong to one loop, so a new loop gets a new fetcher.
+    """
+    global _async_fetcher, _async_fetcher_loop
+    loop = asyncio.get_running_loop()
+    if _async_fetcher is None or _async_fetcher_loop is not loop:
+        _async_fetcher = AsyncFetcher()
+        _async_fetcher_loop = loop
+    return _async_fetcher
+
+
+async def close_async_fetcher():
+    """Closes the shared fetchers' connection pools (called on application shutdown)."""
+    global _async_fetcher, _async_fetcher_loop, _fetcher
+    if _async_fetcher is not None:
+        await _async_fetcher.aclose()
+        _async_fetcher = None
+        _async_fetcher_loop = None
+    with _fetcher_lock:
+        if _fetcher is not None:
+            _fetcher.close()
+            _fetcher = None
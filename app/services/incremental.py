@@ -0,0 +1,116 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from app.settings import BASE_TMP_DIR
+from app.services.cache import serialize_table, read_table, settings_variant
+
+INCREMENTAL_DIR = os.path.join(BASE_TMP_DIR, "incremental")
+
+
+def source_key(discover: dict, variant: str) -> str:
+    """Identifies a recurring collection: the discover request plus the extraction settings."""
+    return settings_variant({"discover": discover, "variant": variant})
+
+
+class IncrementalState:
+    """
+    Remembers, per source (see source_key), which document URLs the last runs
+    found, the content hash each had and the tables extracted from it.
+
+    - Rows live in a SQLite file (state.sqlite), one per (source, url).
+    - Extraction results are kept as Arrow IPC files (results/<source>/<hash>.arrow),
+      in the same layout as DocumentCache results but never evicted, so a
+      merged output can always be rebuilt without re-parsing.
+    """
+
+    def __init__(self, root: str = INCREMENTAL_DIR):
+        self.root = root
+        self._lock = threading.Lock()  # keeps remove() from deleting a result record() is writing
+        os.makedirs(os.path.join(root, "results"), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "source_key TEXT, url TEXT, content_hash TEXT, first_seen REAL, last_seen REAL, "
+                "PRIMARY KEY (source_key, url))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Yields a connection that commits on success and is always closed."""
+        db = sqlite3.connect(os.path.join(self.root, "state.sqlite"), timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def documents(self, key: str) -> dict:
+        """{url: content_hash} of the documents recorded for a source whose result is still on disk."""
+        with self._connect() as db:
+            rows = db.execute("SELECT url, content_hash FROM documents WHERE source_key = ?", (key,)).fetchall()
+        return {url: content_hash for url, content_hash in rows if os.path.exists(self._result_path(key, content_hash))}
+
+    def load_result(self, key: str, content_hash: str):
+        """The recorded (table, chosen_header) of a document, or None."""
+        return read_table(self._result_path(key, content_hash))
+
+    def record(self, key: str, url: str, content_hash: str, table, chosen_header):
+        """Stores a freshly extracted document; 'table' may be None when it had no tables."""
+        data = serialize_table(table, chosen_header)
+        path = self._result_path(key, content_hash)
+        now = time.time()
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            with self._connect() as db:
+                db.execute(
+                    "INSERT INTO documents (source_key, url, content_hash, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (source_key, url) DO UPDATE SET content_hash = excluded.content_hash, last_seen = excluded.last_seen",
+                    (key, url, content_hash, now, now),
+                )
+
+    def remove(self, key: str, urls: list):
+        """
+        Forgets documents that are no longer listed by the source, and deletes
+        result files (including those of replaced versions) nothing points to.
+        """
+        with self._lock:
+            with self._connect() as db:
+                db.executemany("DELETE FROM documents WHERE source_key = ? AND url = ?", [(key, url) for url in urls])
+            self._remove_unused(key)
+
+    def _result_path(self, key: str, content_hash: str) -> str:
+        return os.path.join(self.root, "results", key, f"{content_hash}.arrow")
+
+    def _remove_unused(self, key: str):
+        """Deletes result files no document of the source points to anymore."""
+        with self._connect() as db:
+            used = {row[0] for row in db.execute("SELECT content_hash FROM documents WHERE source_key = ?", (key,))}
+        directory = os.path.join(self.root, "results", key)
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if name.endswith(".arrow") and name[:-len(".arrow")] not in used:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+_incremental_state = None
+_incremental_state_lock = threading.Lock()
+
+
+def get_incremental_state() -> IncrementalState:
+    """Returns the state shared by all requests, creating it on first use."""
+    global _incremental_state
+    with _incremental_state_lock:
+        if _incremental_state is None:
+            _incremental_state = IncrementalState()
+        return _incremental_state
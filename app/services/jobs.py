@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import uuid
+import queue
+import socket
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from app.models import JobStatus
+from app.services.metrics import QUEUE_DEPTH, timed
+from app.settings import BASE_TMP_DIR, JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RESULT_TTL, JOB_STORE
+
+JOBS_DIR = os.path.join(BASE_TMP_DIR, "jobs")
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = (JobStatus.SUCCEEDED.value, JobStatus.FAILED.value)
+
+# Identifies the process that queued a job, so a shared store can tell abandoned jobs apart
+_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner) -> bool:
+    """False if 'owner' is a process on this host that has stopped (other hosts' jobs are left alone)."""
+    host, _, pid = str(owner).rpartition(":")
+    if not pid.isdigit():
+        return False
+    if host != socket.gethostname():
+        return True
+    if int(pid) == os.getpid():
+        return False  # a previous JobManager in this process; its queue is gone
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is already full."""
+
+
+class JobStore(ABC):
+    """Persists job records (plain JSON-serializable dicts keyed by 'id')."""
+
+    @abstractmethod
+    def save(self, job: dict):
+        """Insert or replace a job record."""
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str):
+        """Return the job record, or None if unknown."""
+        pass
+
+    @abstractmethod
+    def delete(self, job_id: str):
+        pass
+
+    @abstractmethod
+    def ids(self, statuses=None) -> list:
+        """Ids of all jobs, or of the jobs whose status is in 'statuses'."""
+        pass
+
+
+class InMemoryJobStore(JobStore):
+    """Job records that live as long as the process."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def save(self, job: dict):
+        with self._lock:
+            self._jobs[job["id"]] = json.loads(json.dumps(job))
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job is not None else None
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def ids(self, statuses=None) -> list:
+        with self._lock:
+            return [job_id for job_id, job in self._jobs.items() if statuses is None or job["status"] in statuses]
+
+
+class SQLiteJobStore(JobStore):
+    """Job records kept in a SQLite file so they survive restarts and are shared by workers."""
+
+    def __init__(self, path: str = os.path.join(JOBS_DIR, "jobs.sqlite")):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, data TEXT)")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def save(self, job: dict):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, data) VALUES (?, ?, ?)",
+                (job["id"], job["status"], json.dumps(job)),
+            )
+
+    def get(self, job_id: str):
+        with self._connect() as db:
+            row = db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, job_id: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def ids(self, statuses=None) -> list:
+        with self._connect() as db:
+            if statuses is None:
+                rows = db.execute("SELECT id FROM jobs").fetchall()
+            else:
+                placeholders = ", ".join("?" for _ in statuses)
+                rows = db.execute(f"SELECT id FROM jobs WHERE status IN ({placeholders})", tuple(statuses)).fetchall()
+        return [row[0] for row in rows]
+
+
+class JobContext:
+    """Handed to a running task so it can report per-document progress."""
+
+    def __init__(self, manager, job_id: str):
+        self.manager = manager
+        self.job_id = job_id
+
+    def set_documents(self, urls: list):
+        """Declares the documents the job will process, all pending."""
+        def apply(job):
+            job["documents"] = {url: "pending" for url in urls}
+            job["total_documents"] = len(job["documents"])
+        self.manager.modify(self.job_id, apply)
+
+    def document_done(self, url: str, state: str):
+        """Records the outcome of one document (a PDFExtractor.extract progress callback)."""
+        def apply(job):
+            job["documents"][url] = state
+            job["completed_documents"] = sum(1 for s in job["documents"].values() if s != "pending")
+        self.manager.modify(self.job_id, apply)
+
+
+class JobManager:
+    """
+    Runs submitted tasks on a fixed number of worker threads fed by a bounded
+    queue. Submissions beyond the queue size are refused (admission control).
+    Results are written under JOBS_DIR and, like finished job records, expire
+    'result_ttl' seconds after the job finishes.
+    """
+
+    def __init__(self, store: JobStore = None, workers: int = JOB_WORKERS,
+                 queue_size: int = JOB_QUEUE_SIZE, result_ttl: float = JOB_RESULT_TTL,
+                 results_dir: str = os.path.join(JOBS_DIR, "results")):
+        self.store = store or InMemoryJobStore()
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.results_dir = results_dir
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._threads = []
+        os.makedirs(results_dir, exist_ok=True)
+
+        # Jobs queued or running in a process that has since stopped will never finish
+        for job_id in self.store.ids([JobStatus.QUEUED.value, JobStatus.RUNNING.value]):
+            job = self.store.get(job_id)
+            if job is not None and not _owner_alive(job.get("owner")):
+                self._finish(job_id, JobStatus.FAILED, error="Interrupted by a server restart.")
+
+    def submit(self, kind: str, request: dict, task) -> dict:
+        """
+        Queues 'task' (a callable taking a JobContext and returning
+        (buffer, media_type, headers) like PDFExtractor.extract) and returns the job record.
+        Raises JobQueueFullError when the queue is full.
+        """
+        self.purge_expired()
+        self._start_workers()
+
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "owner": _OWNER,
+            "status": JobStatus.QUEUED.value,
+            "request": request,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "expires_at": None,
+            "documents": {},
+            "total_documents": None,
+            "completed_documents": 0,
+            "error": None,
+            "media_type": None,
+            "headers": None,
+        }
+        self.store.save(job)
+        QUEUE_DEPTH.inc(queue="jobs")
+        try:
+            self._queue.put_nowait((job["id"], task))
+        except queue.Full:
+            QUEUE_DEPTH.dec(queue="jobs")
+            self.store.delete(job["id"])
+            raise JobQueueFullError(f"The job queue is full ({self._queue.maxsize} jobs waiting); try again later.")
+        return job
+
+    def get(self, job_id: str):
+        """Returns the job record, or None if it doesn't exist or has expired."""
+        job = self.store.get(job_id)
+        if job is not None and job["expires_at"] is not None and job["expires_at"] <= time.time():
+            self._expire(job_id)
+            return None
+        return job
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, job_id)
+
+    def modify(self, job_id: str, apply):
+        """Read-modify-write of a job record."""
+        with self._lock:
+            job = self.store.get(job_id)
+            if job is None:
+                return None
+            apply(job)
+            self.store.save(job)
+            return job
+
+    def purge_expired(self):
+        """Deletes finished jobs (and their results) whose time to live is over."""
+        now = time.time()
+        for job_id in self.store.ids(FINISHED_STATUSES):
+            job = self.store.get(job_id)
+            if job is not None and job["expires_at"] is not None and job["expires_at"] <= now:
+                self._expire(job_id)
+
+    def shutdown(self, wait: bool = False):
+        """
+        Asks the workers to stop after their current job. Workers are daemon
+        threads, so by default this doesn't wait; jobs cut short are marked
+        failed by the next JobManager that opens the same store.
+        """
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put((None, None))
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _expire(self, job_id: str):
+        self.store.delete(job_id)
+        try:
+            os.remove(self.result_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _start_workers(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"job-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job_id, task = self._queue.get()
+            if job_id is None:
+                return
+            QUEUE_DEPTH.dec(queue="jobs")
+            self._run(job_id, task)
+
+    def _run(self, job_id: str, task):
+        def start(job):
+            job["status"] = JobStatus.RUNNING.value
+            job["started_at"] = time.time()
+        self.modify(job_id, start)
+
+        try:
+            with timed("job"):
+                output = task(JobContext(self, job_id))
+            if output is None:
+                self._finish(job_id, JobStatus.FAILED, error="No valid tables were extracted from any PDF.")
+                return
+
+            buffer, media_type, headers = output
+            path = self.result_path(job_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.getbuffer())
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self._finish(job_id, JobStatus.FAILED, error=str(e))
+            return
+
+        self._finish(job_id, JobStatus.SUCCEEDED, media_type=media_type, headers=headers)
+
+    def _finish(self, job_id: str, status: JobStatus, **fields):
+        def finish(job):
+            now = time.time()
+            job.update(fields)
+            job["status"] = status.value
+            job["finished_at"] = now
+            job["expires_at"] = now + self.result_ttl
+        self.modify(job_id, finish)
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Returns the manager shared by all requests, with the store chosen by WEB_SCRAPER_JOB_STORE."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            store = InMemoryJobStore() if JOB_STORE == "memory" else SQLiteJobStore()
+            _job_manager = JobManager(store=store)
+        return _job_manager
+
+
+def shutdown_job_manager():
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is not None:
+            _job_manager.shutdown()
+            _job_manager = None
@@ -0,0 +1,179 @@
+"""
+HTML backends used by WebScraper to find links. Each backend returns the raw
+'href' values, in document order, of the <a href> elements of a page or of
+the <a href> descendants of the elements matched by a CSS selector, as
+BeautifulSoup's html.parser tree would (the tokenizer backend always agrees
+with it; lxml and selectolax may repair badly broken markup differently, so
+they are only used when asked for by name). Backends whose library is
+missing, or that can't evaluate CSS selectors, fall back to BeautifulSoup.
+"""
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+
+from app.settings import HTML_PARSER
+
+
+class LinkParser(ABC):
+    """Parses a page once and lists its link targets."""
+
+    name = None
+    supports_selectors = True
+
+    @classmethod
+    def available(cls) -> bool:
+        """True when the library behind the backend can be imported."""
+        return True
+
+    @abstractmethod
+    def parse(self, html: str):
+        """Parses 'html' into whatever hrefs() works on."""
+        pass
+
+    @abstractmethod
+    def hrefs(self, document, css_selector: str = None) -> list:
+        """href values of the links in the document, or below the elements matched by 'css_selector'."""
+        pass
+
+
+class SoupLinkParser(LinkParser):
+    """BeautifulSoup with the standard library parser: the reference behavior, always available."""
+
+    name = "soup"
+
+    def parse(self, html: str):
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(html, 'html.parser')
+
+    def hrefs(self, document, css_selector: str = None) -> list:
+        if css_selector is None:
+            return [a['href'] for a in document.find_all('a', href=True)]
+        return [
+            a['href'] for el in document.select(css_selector)
+            for a in el.find_all('a', href=True)
+        ]
+
+
+class _HrefCollector(HTMLParser):
+    """Collects <a href> values while the standard library tokenizer runs, without building a tree."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            href = None
+            for name, value in attrs:
+                if name == 'href':
+                    href = value or ''  # like BeautifulSoup, the last duplicate wins
+            if href is not None:
+                self.hrefs.append(href)
+
+
+class TokenizerLinkParser(LinkParser):
+    """
+    Streams the page through the same tokenizer BeautifulSoup's html.parser
+    uses but keeps only the link targets, so the result is identical at a
+    fraction of the cost. Can't evaluate CSS selectors.
+    """
+
+    name = "tokenizer"
+    supports_selectors = False
+
+    def parse(self, html: str):
+        collector = _HrefCollector()
+        collector.feed(html)
+        collector.close()
+        return collector.hrefs
+
+    def hrefs(self, document, css_selector: str = None) -> list:
+        if css_selector is not None:
+            raise ValueError("The tokenizer backend doesn't support CSS selectors")
+        return list(document)
+
+
+class LxmlLinkParser(LinkParser):
+    """lxml's C parser; CSS selectors need the cssselect package as well."""
+
+    name = "lxml"
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import lxml.html  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def __init__(self):
+        import lxml.html
+        self._html = lxml.html
+        try:
+            import cssselect  # noqa: F401
+        except ImportError:
+            self.supports_selectors = False
+
+    def parse(self, html: str):
+        if not html.strip():
+            return None
+        parser = self._html.HTMLParser(encoding='utf-8')
+        return self._html.document_fromstring(html.encode('utf-8'), parser=parser)
+
+    def hrefs(self, document, css_selector: str = None) -> list:
+        if document is None:
+            return []
+        if css_selector is None:
+            return [a.get('href') for a in document.iter('a') if a.get('href') is not None]
+        return [
+            a.get('href') for el in document.cssselect(css_selector)
+            for a in el.iterdescendants('a') if a.get('href') is not None
+        ]
+
+
+class SelectolaxLinkParser(LinkParser):
+    """selectolax's Lexbor engine, which evaluates CSS selectors natively."""
+
+    name = "selectolax"
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            from selectolax.lexbor import LexborHTMLParser  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def parse(self, html: str):
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser(html)
+
+    def hrefs(self, document, css_selector: str = None) -> list:
+        if css_selector is None:
+            return [a.attributes['href'] or '' for a in document.css('a[href]')]
+        return [
+            a.attributes['href'] or '' for el in document.css(css_selector)
+            for a in el.css('a[href]') if a.mem_id != el.mem_id
+        ]
+
+
+# Backends by name
+LINK_PARSERS = {
+    parser.name: parser
+    for parser in (SoupLinkParser, TokenizerLinkParser, LxmlLinkParser, SelectolaxLinkParser)
+}
+
+
+def get_link_parser(name: str = None, css_selector: str = None) -> LinkParser:
+    """
+    The backend called 'name' (HTML_PARSER when None), or BeautifulSoup when
+    it is missing or can't handle 'css_selector'.
+    """
+    name = name or HTML_PARSER
+    if name not in LINK_PARSERS:
+        raise ValueError(f"Unknown HTML parser: {name}")
+    candidate = LINK_PARSERS[name]
+    if candidate.available():
+        parser = candidate()
+        if css_selector is None or parser.supports_selectors:
+            return parser
+    return SoupLinkParser()
@@ -0,0 +1,256 @@
+"""
+Process-wide counters, gauges and histograms rendered in the Prometheus text
+exposition format by GET /metrics, plus StageTimings, the per-request view of
+the same stage timings that can be returned in a Server-Timing header.
+"""
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    """Label value escaped as the exposition format requires (backslash, double quote, newline)."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    """A named metric with optional labels; one series per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) for every series."""
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._series.items())]
+
+    def value(self, **labels):
+        """Current value of one series (0 when it was never touched); for tests and diagnostics."""
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """A total that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can't decrease")
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down, such as a queue depth."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their count and sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["count"] += 1
+            series["sum"] += value
+
+    def value(self, **labels):
+        """(count, sum) of one series."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return (series["count"], series["sum"]) if series else (0, 0.0)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    cumulative += count
+                    samples.append(("_bucket", key, (("le", _format_value(bound)),), cumulative))
+                samples.append(("_count", key, (), series["count"]))
+                samples.append(("_sum", key, (), series["sum"]))
+        return samples
+
+
+class Registry:
+    """The metrics exposed by one process."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "webscraper_stage_seconds",
+    "Time spent in each scraping and extraction stage.",
+    ["stage"],
+))
+DOWNLOADED_BYTES = REGISTRY.register(Counter(
+    "webscraper_downloaded_bytes_total",
+    "Bytes downloaded, by kind of resource (page or document).",
+    ["kind"],
+))
+DOCUMENTS = REGISTRY.register(Counter(
+    "webscraper_documents_total",
+    "Documents processed, by outcome (extracted, no_tables, failed, unchanged).",
+    ["outcome"],
+))
+PDF_PAGES = REGISTRY.register(Counter("webscraper_pdf_pages_total", "PDF pages searched for tables."))
+PDF_PAGES_SKIPPED = REGISTRY.register(Counter(
+    "webscraper_pdf_pages_skipped_total",
+    "PDF pages not searched for tables, by reason (range, no_ruling, limit, or timeout, cpu_limit, memory_limit, crashed when aborted).",
+    ["reason"],
+))
+TABLES = REGISTRY.register(Counter("webscraper_tables_total", "Tables extracted from PDFs."))
+ROWS = REGISTRY.register(Counter("webscraper_rows_total", "Rows extracted from PDFs, before merging and cleanup."))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "webscraper_cache_lookups_total",
+    "Extraction results looked up in the document cache, by result (hit or miss).",
+    ["result"],
+))
+PROFILE_LOOKUPS = REGISTRY.register(Counter(
+    "webscraper_profile_lookups_total",
+    "Table-settings profiles looked up for a source under profile auto, by result (hit, tuned or untuned).",
+    ["result"],
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "webscraper_queue_depth",
+    "Items waiting in a queue: downloaded PDFs waiting for a parser (pipeline, async_parse) or queued jobs (jobs).",
+    ["queue"],
+))
+DEDUPLICATED = REGISTRY.register(Counter(
+    "webscraper_deduplicated_documents_total",
+    "Documents not fetched again, by kind: duplicate (repeated in one request) or coalesced (shared with a concurrent request).",
+    ["kind"],
+))
+INFLIGHT_BYTES = REGISTRY.register(Gauge(
+    "webscraper_inflight_bytes",
+    "Bytes reserved by documents being downloaded or parsed (see WEB_SCRAPER_INFLIGHT_BYTES_BUDGET).",
+))
+
+
+class Tally:
+    """Named totals for one request, added to by the threads that work on it."""
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, amount: float = 1):
+        with self._lock:
+            self._totals[name] = self._totals.get(name, 0) + amount
+
+    def merge(self, other: "Tally"):
+        for name, amount in other.totals().items():
+            self.add(name, amount)
+
+    def totals(self) -> dict:
+        """The totals, in the order the names were first added."""
+        with self._lock:
+            return dict(self._totals)
+
+
+class StageTimings(Tally):
+    """Time spent per stage by one request, summed over the threads that worked on it."""
+
+    def server_timing(self, total: float = None) -> str:
+        """The totals as a Server-Timing header value (milliseconds), with 'total' wall-clock seconds if given."""
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.totals().items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def timed(stage: str, timings: StageTimings = None):
+    """Records the time spent in the block as 'stage', globally and in 'timings' when given."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if timings is not None:
+            timings.add(stage, elapsed)
@@ -3,24 +3,167 @@ import os
 import uuid
 import re
 import shutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-import pdfplumber
+import httpx
 import requests
-import pandas as pd
-import pyarrow.parquet as pq
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 
 # Adjust imports below to match your project structure
 from .extractor import Extractor
-from app.models import OutputFormat
+from .tableengine import extract_page_tables
+from .sandbox import ParseAborted, ParseLimits
+from .profiles import AUTO, DEFAULT, PROFILES, ProfileStore, get_profile_store, source_key, tune_profile
+from .fetcher import Fetcher, get_fetcher, get_async_fetcher
+from .exporter import ExportOptions, export_table, attachment_headers, StreamWriter
+from .cache import DocumentCache, settings_variant, file_hash, serialize_table, read_table, read_schema
+from .downloads import ByteBudget, Download, DocumentTooLargeError, get_inflight_budget
+from .pipeline import run_pipeline
+from .typeinference import infer_types
+from .singleflight import AbandonedError, SingleFlight, dedupe_urls, get_document_flights, normalize_url
+from .metrics import (
+    CACHE_LOOKUPS, DEDUPLICATED, DOCUMENTS, DOWNLOADED_BYTES, PDF_PAGES, PDF_PAGES_SKIPPED, QUEUE_DEPTH, ROWS, TABLES,
+    StageTimings, Tally, timed,
+)
+from app.models import OutputFormat, ExtractionEngine
+from app.settings import BASE_TMP_DIR, MAX_DOCUMENT_BYTES, DOWNLOAD_WORKERS, PARSE_WORKERS, PIPELINE_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Number of PDFs stream_async buffers to vote on the output header before emitting rows
+STREAM_HEADER_SAMPLE = 5
+
+# Rows combine_spilled gathers from spilled documents before serializing them as one chunk
+SPILL_CHUNK_ROWS = 65536
+
+# Runs of whitespace as Python's \s matches them (RE2's \s is ASCII only), for clean_header in Arrow
+WHITESPACE_RUN = r"[\t\n\v\f\r \x{1c}-\x{1f}\x{85}\p{Z}]+"
+
+# Aborted pages listed by name in the X-Pages-Aborted-Detail header; the rest are only counted
+ABORTED_DETAIL_LIMIT = 20
+
+# Columns extract_incremental adds to every row so consumers can upsert per document
+SOURCE_COLUMNS = ["source_document", "source_hash"]
+
+class ExtractionError(Exception):
+    """Parsing a PDF failed; unlike finding no tables in it, worth trying again later."""
+
+
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
+
+
+def get_parse_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by async requests for CPU-bound parsing and merging."""
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            _parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="pdf-parse")
+        return _parse_executor
+
 
 class PDFExtractor(Extractor):
-    def __init__(self, standard_headers=None):
+    def __init__(self, standard_headers=None, engine=ExtractionEngine.AUTO, cache: DocumentCache = None, fetcher: Fetcher = None,
+                 max_document_bytes: int = MAX_DOCUMENT_BYTES, budget: ByteBudget = None,
+                 download_workers: int = DOWNLOAD_WORKERS, parse_workers: int = PARSE_WORKERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, pages: str = None, max_tables: int = None,
+                 max_rows: int = None, flights: SingleFlight = None, export_options: ExportOptions = None,
+                 typed: bool = False, decimal_separator: str = "auto", limits: ParseLimits = None,
+                 table_settings: dict = None, profile: str = None, profiles: ProfileStore = None):
         """
         standard_headers: list of column names that this document should have
                           if no valid header row is detected (fallback).
+        engine: how pages are parsed; THREADS keeps each PDF in its worker thread,
+                PROCESSES spreads page ranges over a process pool, AUTO picks per PDF.
+        cache: optional DocumentCache; PDFs are then revalidated with conditional
+               GETs and unchanged documents reuse their stored extraction result.
+        fetcher: blocking Fetcher used by fetch_and_extract; defaults to the shared pooled one.
+        max_document_bytes: PDFs larger than this are skipped instead of downloaded.
+        budget: ByteBudget shared by the PDFs being downloaded or parsed; defaults
+                to the process-wide in-flight budget.
+        download_workers, parse_workers, queue_size: sizes of the download and parse
+                stages and of the queue of downloaded PDFs waiting for a parser.
+        pages: page ranges searched for tables in every PDF, e.g. "1-3,8,10-"
+               (1-based, see tableengine.parse_page_ranges); None for all pages.
+        max_tables, max_rows: stop searching a PDF once this many tables, or tables
+               with this many rows, were found; the PDF's output is trimmed to them.
+        flights: SingleFlight through which concurrent extractions of the same
+                 document with the same settings share one download and result;
+                 defaults to the process-wide one.
+        export_options: ExportOptions tuning the serialized output (compression
+                 codec and level, Parquet row groups and dictionary encoding).
+        typed: convert the merged table's columns to integer, decimal, date and
+               categorical types where every value fits (see typeinference);
+               'decimal_separator' is ".", "," or "auto". Not available when streaming.
+        limits: ParseLimits on the wall-clock time, CPU time and memory parsing a
+                PDF or one of its pages may take; defaults to the PARSE_* settings.
+                Pages over a limit are aborted and reported, see aborted_pages.
+        table_settings: pdfplumber table settings used for every PDF.
+        profile: name of a built-in table-settings profile (see profiles.PROFILES),
+                 or "auto" to use the profile tuned for each PDF's source, tuning
+                 one on the PDF when its source has none yet. Ignored when
+                 'table_settings' is given; pdfplumber's defaults when neither is.
+        profiles: ProfileStore remembering the tuned profiles; defaults to the shared one.
         """
         self.standard_headers = standard_headers
+        self.engine = ExtractionEngine(engine)
+        self.cache = cache
+        self.fetcher = fetcher
+        self.max_document_bytes = max_document_bytes
+        self.budget = budget or get_inflight_budget()
+        self.download_workers = download_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.pages = pages
+        self.max_tables = max_tables
+        self.max_rows = max_rows
+        self.flights = flights or get_document_flights()
+        self.export_options = export_options or ExportOptions()
+        self.typed = typed
+        self.decimal_separator = decimal_separator
+        # Time this extractor spent in each stage, for the Server-Timing header
+        self.timings = StageTimings()
+        # PDF pages searched and skipped (by reason) by this extractor
+        self.page_counts = Tally()
+        self.limits = limits or ParseLimits()
+        # url -> [(page number, reason)] of the pages whose parse was aborted
+        self.aborted_pages = {}
+        self.table_settings = table_settings
+        self.profile = profile
+        self.profiles = profiles
+        # url -> name of the profile its PDF was parsed with under profile "auto"
+        self.resolved_profiles = {}
+
+    def cache_variant(self, url: str = None) -> str:
+        """
+        Identifies the settings that change what extract_document returns for a
+        given PDF. Under profile "auto", passing the PDF's 'url' adds the profile
+        it was parsed with, or else the one remembered for its source.
+        """
+        settings = {"standard_headers": self.standard_headers}
+        # Only when set, so results cached before these options existed stay valid
+        for name in ("pages", "max_tables", "max_rows", "table_settings", "profile"):
+            if getattr(self, name) is not None:
+                settings[name] = getattr(self, name)
+        if url is not None and self.profile == AUTO and self.table_settings is None:
+            settings["resolved_profile"] = self._resolved_profile(url)
+        return settings_variant(settings)
+
+    def _resolved_profile(self, url: str):
+        """The profile "auto" parsed 'url' with, or else the one remembered for its source (None if none)."""
+        if url in self.resolved_profiles:
+            return self.resolved_profiles[url]
+        remembered = self._profile_store().get(source_key(url))
+        return remembered[0] if remembered else None
+
+    def flight_key(self, url) -> tuple:
+        """Identifies the work of extracting 'url' with these settings, for coalescing."""
+        return normalize_url(url), self.cache_variant(), self.max_document_bytes
 
     def clean_header(self, header: str) -> str:
         """
@@ -64,22 +207,164 @@ class PDFExtractor(Extractor):
             return None
         return table
 
-    def ensure_unique_columns(self, df: pd.DataFrame):
+    def ensure_unique_columns(self, df):
         """Make repeated column names distinct (Column, Column_1, etc.)."""
+        df.columns = self.unique_names(df.columns)
+
+    def unique_names(self, names) -> list:
+        """Column names with repeats made distinct (Column, Column_1, etc.)."""
         seen = {}
         new_cols = []
-        for col in df.columns:
+        for col in names:
             if col in seen:
                 seen[col] += 1
                 new_cols.append(f"{col}_{seen[col]}")
             else:
                 seen[col] = 0
                 new_cols.append(col)
-        df.columns = new_cols
+        return new_cols
+
+    def table_rows(self, table) -> list:
+        """
+        Rows of a raw pdfplumber table padded to the same width, without rows
+        whose cells are all empty (None). Cells are text or None.
+        """
+        width = max(len(row) for row in table)
+        rows = []
+        for row in table:
+            if all(cell is None for cell in row):
+                continue
+            cells = [cell if cell is None or isinstance(cell, str) else str(cell) for cell in row]
+            rows.append(cells + [None] * (width - len(cells)))
+        return rows
+
+    def rows_to_batch(self, rows: list, schema: pa.Schema) -> pa.RecordBatch:
+        """Column-wise record batch of 'rows', padded with empty columns or trimmed to the schema."""
+        width = len(schema)
+        columns = [list(column) for column in zip(*rows)][:width]
+        columns += [[None] * len(rows)] * (width - len(columns))
+        return pa.RecordBatch.from_arrays([pa.array(column, type=pa.string()) for column in columns], schema=schema)
 
     def fetch_and_extract(self, url):
         """
-        Processes a single PDF, returns (list_of_dfs, chosen_header).
+        Downloads a single PDF and processes it, returns (table, chosen_header).
+        Raises ExtractionError when the PDF can't be parsed.
+        """
+        try:
+            return self.parse_download(url, self.download(url))
+        except requests.RequestException as req_err:
+            logger.warning("Request error for %s: %s", url, req_err)
+        except DocumentTooLargeError as size_err:
+            logger.warning("Skipping %s: %s", url, size_err)
+        return None, None
+
+    def download(self, url, revalidate: bool = True) -> Download:
+        """Download stage: fetches a PDF, conditionally when a cached copy exists and 'revalidate' is set."""
+        logger.debug("Processing %s", url)
+        fetcher = self.fetcher or get_fetcher()
+        headers = self._validators(url) if revalidate else {}
+        with timed("download", self.timings):
+            download = fetcher.download(url, headers=headers, budget=self.budget, max_bytes=self.max_document_bytes)
+        DOWNLOADED_BYTES.inc(download.size, kind="document")
+        return download
+
+    def parse_download(self, url, download: Download):
+        """Parse stage: processes (and closes) a Download, returns (table, chosen_header)."""
+        with download:
+            result = self.extract_downloaded(url, download)
+        if result is None:
+            # Revalidated, but the cached copy was evicted meanwhile: download it again
+            with self.download(url, revalidate=False) as download:
+                result = self.extract_downloaded(url, download)
+        return result
+
+    def fetch_tracked(self, url, known_hash=None):
+        """
+        fetch_and_extract() for incremental runs, returns (content_hash, result).
+        When the PDF still has 'known_hash' it isn't parsed again and 'result'
+        is None; otherwise 'result' is (table, chosen_header).
+        Returns (None, None) when the download fails.
+        """
+        try:
+            return self.parse_tracked(url, self.download(url, revalidate=known_hash is not None), known_hash)
+        except requests.RequestException as req_err:
+            logger.warning("Request error for %s: %s", url, req_err)
+        except DocumentTooLargeError as size_err:
+            logger.warning("Skipping %s: %s", url, size_err)
+        return None, None
+
+    def parse_tracked(self, url, download: Download, known_hash=None):
+        """Parse stage of fetch_tracked(): processes (and closes) a Download, returns (content_hash, result)."""
+        with download:
+            content_hash, result = self._extract_tracked(url, download, known_hash)
+        if content_hash is None:
+            # Revalidated, but the cached copy was evicted meanwhile: download it again
+            with self.download(url, revalidate=False) as download:
+                content_hash, result = self._extract_tracked(url, download, known_hash)
+        return content_hash, result
+
+    def _validators(self, url) -> dict:
+        """Conditional request headers for 'url' when a cached copy exists."""
+        return self.cache.validators(url, self.cache_variant(url)) if self.cache else {}
+
+    def _extract_tracked(self, url, download: Download, known_hash):
+        """Hashes a download and extracts it unless the hash is 'known_hash'; (None, None) if a 304 can't be served."""
+        if download.not_modified:
+            content_hash = self.cache.content_hash(url)
+        elif self.cache is not None:
+            content_hash = self.cache.store_download(url, download)
+        else:
+            content_hash = file_hash(download.open_pdf())
+
+        if content_hash is not None and content_hash == known_hash:
+            logger.debug("Unchanged since the last run: %s", url)
+            return content_hash, None
+        result = self.extract_downloaded(url, download, content_hash)
+        return (content_hash, result) if result is not None else (None, None)
+
+    def extract_downloaded(self, url, download: Download, content_hash=None):
+        """
+        Processes a downloaded PDF, going through the cache when one is configured.
+        Returns (table, chosen_header), or None if a 304 arrived for a
+        document that is no longer cached. 'content_hash' skips hashing a body
+        that was already stored.
+        """
+        if self.cache is None:
+            return self.extract_document(download.open_pdf(), url)
+
+        variant = self.cache_variant(url)
+        if content_hash is None:
+            if download.not_modified:
+                content_hash = self.cache.content_hash(url)
+            else:
+                content_hash = self.cache.store_download(url, download)
+
+        cached = self.cache.load_result(content_hash, variant) if content_hash else None
+        CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+        if cached is not None:
+            logger.debug("Cache hit for %s (%s)", url, "not modified" if download.not_modified else "same content")
+            return cached
+
+        if download.not_modified:
+            pdf_file = self.cache.open_pdf(content_hash) if content_hash else None
+            if pdf_file is None:
+                return None
+            with pdf_file:
+                table, header = self.extract_document(pdf_file, url)
+        else:
+            table, header = self.extract_document(download.open_pdf(), url)
+        if url not in self.aborted_pages:
+            # An aborted page may parse next time; don't make its absence stick. Keyed by the
+            # profile actually used, which tuning may have just chosen
+            self.cache.store_result(content_hash, self.cache_variant(url), table, header)
+        return table, header
+
+    def extract_document(self, pdf_file, url):
+        """
+        Processes a single downloaded PDF, returns (table, chosen_header) where
+        'table' is an Arrow table with one record batch per PDF table, or None.
+        Raises ExtractionError when parsing fails, so a failure is never cached
+        or recorded as a PDF without tables.
 
         Steps:
           - Gather raw tables from pdfplumber.
@@ -88,216 +373,834 @@ class PDFExtractor(Extractor):
           - Apply that chosen/fallback header, removing rows that match that header verbatim.
         """
         try:
-            print(f"\n--- Processing: {url} ---")
-            pdf_response = requests.get(url, timeout=10, stream=True)
-            pdf_response.raise_for_status()
-            pdf_file = io.BytesIO(pdf_response.content)
-
             raw_tables = []
             row_counts = {}
 
-            with pdfplumber.open(pdf_file) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    tables = page.extract_tables()
-                    for tbl_idx, tbl in enumerate(tables):
-                        reshaped = self.reshape_table(tbl)
-                        if not reshaped:
-                            continue
+            table_settings, source = self._table_settings(pdf_file, url)
+            with timed("extract_tables", self.timings):
+                scan = extract_page_tables(pdf_file, self.engine, pages=self.pages, enough=self._table_limit(),
+                                           limits=self.limits, table_settings=table_settings)
+            self._count_pages(scan, url)
+
+            # Raw tables come back in page order regardless of the engine used
+            for page_num, tables in enumerate(scan.tables):
+                if self.max_tables is not None and len(raw_tables) >= self.max_tables:
+                    break
+                for tbl_idx, tbl in enumerate(tables):
+                    if self.max_tables is not None and len(raw_tables) >= self.max_tables:
+                        break
+                    reshaped = self.reshape_table(tbl)
+                    if not reshaped:
+                        continue
 
-                        df = pd.DataFrame(reshaped).dropna(how='all')
-                        if df.empty:
-                            continue
+                    rows = self.table_rows(reshaped)
+                    if not rows:
+                        continue
 
-                        # Clean the first row for consistent matching
-                        cleaned_first_row = [
-                            self.clean_header(str(x)) for x in df.iloc[0]
-                        ]
-                        first_row_tuple = tuple(cleaned_first_row)
+                    # Clean the first row for consistent matching
+                    cleaned_first_row = [
+                        self.clean_header(str(x)) for x in rows[0]
+                    ]
+                    first_row_tuple = tuple(cleaned_first_row)
 
-                        # Track frequency
-                        row_counts[first_row_tuple] = row_counts.get(first_row_tuple, 0) + 1
+                    # Track frequency
+                    row_counts[first_row_tuple] = row_counts.get(first_row_tuple, 0) + 1
 
-                        raw_tables.append(df)
+                    raw_tables.append(rows)
 
+            TABLES.inc(len(raw_tables))
             if not raw_tables:
-                print(f"No valid tables found in {url}.")
+                logger.info("No valid tables found in %s", url)
                 return None, None
 
-            # Sort candidate rows by frequency desc
-            sorted_candidates = sorted(
-                row_counts.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )
+            with timed("header_vote", self.timings):
+                # Sort candidate rows by frequency desc
+                sorted_candidates = sorted(
+                    row_counts.items(),
+                    key=lambda x: x[1],
+                    reverse=True
+                )
 
-            chosen_header = None
-            for row_tuple, freq in sorted_candidates:
-                if self.is_valid_header(list(row_tuple)):
-                    chosen_header = [self.clean_header(x) for x in row_tuple]
-                    print(f"Chosen header (frequency={freq}) for {url}: {chosen_header}")
-                    break
+                chosen_header = None
+                for row_tuple, freq in sorted_candidates:
+                    if self.is_valid_header(list(row_tuple)):
+                        chosen_header = [self.clean_header(x) for x in row_tuple]
+                        logger.debug("Chosen header (frequency=%d) for %s: %s", freq, url, chosen_header)
+                        break
 
-            # Fallback if no valid repeated header
-            if not chosen_header:
-                chosen_header = (
-                    self.standard_headers
-                    or [f"Column_{i}" for i in range(len(raw_tables[0].columns))]
-                )
-                print(f"No strong repeated header found; using fallback: {chosen_header}")
-
-            chosen_header_tuple = tuple(chosen_header)
-            final_dfs = []
-            num_pdf_cols = len(chosen_header)
-
-            for df in raw_tables:
-                # Pad or trim columns
-                if df.shape[1] < num_pdf_cols:
-                    for _ in range(num_pdf_cols - df.shape[1]):
-                        df[f"Extra_Col_{df.shape[1]}"] = None
-                elif df.shape[1] > num_pdf_cols:
-                    df = df.iloc[:, :num_pdf_cols]
-
-                # Assign the chosen columns
-                df.columns = chosen_header
-                self.ensure_unique_columns(df)
-
-                # Remove rows that exactly match chosen_header
-                row_tuples = df.astype(str).apply(
-                    lambda r: tuple(self.clean_header(x) for x in r),
-                    axis=1
-                )
-                df = df[row_tuples != chosen_header_tuple].reset_index(drop=True)
+                # Fallback if no valid repeated header
+                if not chosen_header:
+                    if source is not None:
+                        # The source's tuned profile doesn't suit it (any longer); tune again on its next PDF
+                        logger.info("Profile tuned for %s found no valid header in %s; forgetting it", source, url)
+                        self._profile_store().forget(source)
+                    chosen_header = (
+                        self.standard_headers
+                        or [f"Column_{i}" for i in range(len(raw_tables[0][0]))]
+                    )
+                    logger.debug("No strong repeated header found in %s; using fallback: %s", url, chosen_header)
+
+            with timed("build_tables", self.timings):
+                # Every table of the document becomes a record batch of one all-string schema
+                chosen_header_tuple = tuple(chosen_header)
+                schema = pa.schema([(name, pa.string()) for name in self.unique_names(chosen_header)])
+                batches = []
+
+                for rows in raw_tables:
+                    # Pad or trim columns to the chosen header
+                    batch = self.rows_to_batch(rows, schema)
+
+                    # Remove rows that exactly match chosen_header
+                    batch = batch.filter(pa.array(~self.header_row_mask(batch, chosen_header_tuple)))
 
-                if not df.empty:
-                    final_dfs.append(df)
+                    if batch.num_rows:
+                        batches.append(batch)
 
-            if final_dfs:
-                print(f"Finished extracting {len(final_dfs)} table(s) from {url}.")
-                return final_dfs, chosen_header
+            if batches:
+                table = pa.Table.from_batches(batches, schema)
+                if self.max_rows is not None:
+                    table = table.slice(0, self.max_rows)
+                ROWS.inc(table.num_rows)
+                logger.info("Finished extracting %d table(s), %d row(s) from %s", len(batches), table.num_rows, url)
+                return table, chosen_header
             else:
-                print(f"All tables for {url} ended up empty after removing headers.")
+                logger.info("All tables for %s ended up empty after removing headers", url)
                 return None, chosen_header
 
-        except requests.RequestException as req_err:
-            print(f"Request error for {url}: {req_err}")
-        except Exception as e:
-            print(f"Unexpected error processing {url}: {e} (File: {url})")
-        return None, None
+        except Exception as error:
+            raise ExtractionError(f"Can't extract tables from {url}: {error}") from error
 
-    def extract(self, urls: list, output_format: OutputFormat = OutputFormat.CSV):
+    def _table_settings(self, pdf_file, url):
+        """
+        (table settings, source) for a PDF: the explicit settings or the named
+        profile's, with source None; under profile "auto", the profile tuned for
+        the PDF's source (tuning one on this PDF when there is none yet) and
+        that source, or (None, None) when no profile suits the source. Under
+        parse limits, tuning runs in a sandbox too; when it's aborted, the PDF
+        gets (None, None) as well.
+        """
+        if self.table_settings is not None or self.profile is None:
+            return self.table_settings, None
+        if self.profile != AUTO:
+            return PROFILES[self.profile], None
+
+        source = source_key(url)
+
+        def tune():
+            with timed("tune_profile", self.timings):
+                tuned = tune_profile(pdf_file, self._has_valid_header, pages=self.pages, limits=self.limits)
+            logger.info("Tuned profile for %s on %s: %s", source, url, tuned[0] if tuned else "none found")
+            return tuned
+
+        try:
+            name, settings = self._profile_store().resolve(source, tune)
+        except ParseAborted as aborted:
+            # Nothing is remembered, so the source's next PDF is tuned again
+            logger.warning("Tuning a profile for %s on %s was aborted (%s); using the defaults", source, url, aborted.reason)
+            self.resolved_profiles[url] = DEFAULT
+            return None, None
+        self.resolved_profiles[url] = name
+        if name == DEFAULT:
+            # No profile suits the source; not finding a valid header is expected, nothing to forget
+            return None, None
+        return settings, source
+
+    def _profile_store(self) -> ProfileStore:
+        return self.profiles or get_profile_store()
+
+    def _has_valid_header(self, table) -> bool:
+        """Whether a raw pdfplumber table's first row passes is_valid_header, as the header vote would see it."""
+        reshaped = self.reshape_table(table)
+        rows = self.table_rows(reshaped) if reshaped else []
+        return bool(rows) and self.is_valid_header([self.clean_header(str(x)) for x in rows[0]])
+
+    def _table_limit(self):
+        """The enough() callback stopping extract_page_tables at max_tables/max_rows, or None without limits."""
+        if self.max_tables is None and self.max_rows is None:
+            return None
+        found = {"tables": 0, "rows": 0}
+
+        def enough(page_tables):
+            for tbl in page_tables:
+                reshaped = self.reshape_table(tbl)
+                rows = self.table_rows(reshaped) if reshaped else []
+                if rows:
+                    found["tables"] += 1
+                    found["rows"] += len(rows) - 1  # the first row may turn out to be the header
+            return (
+                (self.max_tables is not None and found["tables"] >= self.max_tables)
+                or (self.max_rows is not None and found["rows"] >= self.max_rows)
+            )
+        return enough
+
+    def _count_pages(self, scan, url):
+        """Records the pages of a PageScan that were searched and skipped, per extractor and process-wide."""
+        PDF_PAGES.inc(scan.searched)
+        self.page_counts.add("searched", scan.searched)
+        for reason, count in scan.skipped.items():
+            PDF_PAGES_SKIPPED.inc(count, reason=reason)
+            self.page_counts.add(reason, count)
+        logger.debug("Searched %d of %d page(s) of %s, skipped: %s", scan.searched, scan.page_count, url, scan.skipped)
+        if scan.aborted:
+            self.aborted_pages[url] = scan.aborted
+            logger.warning("Aborted %d page(s) of %s: %s", len(scan.aborted), url, scan.aborted)
+
+    def with_aborted_headers(self, output):
+        """
+        Adds X-Pages-Aborted (the number of pages whose parse was aborted) and
+        X-Pages-Aborted-Detail ("url#page=N (reason)" for the first
+        ABORTED_DETAIL_LIMIT of them) to an export's (buffer, mime_type, headers).
+        """
+        aborted = [(url, page, reason) for url, pages in self.aborted_pages.items() for page, reason in pages]
+        if output is None or not aborted:
+            return output
+        buffer, mime_type, headers = output
+        headers = dict(headers)
+        headers["X-Pages-Aborted"] = str(len(aborted))
+        headers["X-Pages-Aborted-Detail"] = "; ".join(
+            f"{url}#page={page} ({reason})" for url, page, reason in aborted[:ABORTED_DETAIL_LIMIT]
+        )
+        return buffer, mime_type, headers
+
+    def extract(self, urls: list, output_format: OutputFormat = OutputFormat.CSV, progress=None):
         """
         Orchestrate parallel PDF processing for the list of URLs,
         then unify columns using the globally most-used header.
         Finally, remove blank rows and stray repeated header rows.
+
+        progress: optional callable(url, state) told as each PDF finishes, with
+                  state "extracted", "no_tables" (nothing usable, including download
+                  errors) or "failed".
+
+        Repeated URLs are processed once, and a PDF another request is already
+        extracting with the same settings is waited for instead of fetched again.
+        The output follows the order of 'urls' whatever order the PDFs finish in.
+        Each PDF's tables are spilled to an Arrow file in the run's temp directory
+        as it finishes and merged from there (see combine_spilled), so memory
+        doesn't grow with the number of PDFs.
         """
-        # Instead of creating a local directory, we store in /tmp/web_scraper
-        base_tmp_dir = "/tmp/web_scraper"
-        os.makedirs(base_tmp_dir, exist_ok=True)
+        output_dir = self._run_dir()
+        urls = self._unique_urls(urls)
+        claims = {url: self.flights.claim(self.flight_key(url)) for url in urls}
+        spilled = {}  # url -> Arrow file holding its (table, chosen_header)
 
-        # Create a unique subdirectory for this run
-        execution_id = uuid.uuid4().hex
-        output_dir = os.path.join(base_tmp_dir, f"extract_{execution_id}")
+        def finish(url, result, error):
+            if error is None:
+                table, header = result
+                if table is not None:
+                    spilled[url] = self._spill(output_dir, len(spilled), table, header)
+                state = "extracted" if table is not None else "no_tables"
+            else:
+                state = "no_tables" if self._download_failed(url, error) else "failed"
+            self._document_done(url, state, progress)
+
+        try:
+            # 1) Download and parse the URLs this request leads in a pipeline; results arrive as PDFs finish
+            leading = [url for url, (_, leader) in claims.items() if leader]
+            for url, result, error in self._pipeline(leading, self.download, self.parse_download):
+                self.flights.resolve(self.flight_key(url), claims[url][0], result, error)
+                finish(url, result, error)
+
+            # ...then wait for the ones other requests were already extracting
+            for url, (future, leader) in claims.items():
+                if not leader:
+                    finish(url, *self._follow(url, future))
+
+            # 2-4) Unify headers, merge and export, in the order of 'urls'
+            output = self.combine_spilled([spilled[url] for url in urls if url in spilled], output_format)
+            return self.with_aborted_headers(output)
+        finally:
+            # Followers of work this request didn't get to do it themselves
+            for url, (future, leader) in claims.items():
+                if leader:
+                    self.flights.abandon(self.flight_key(url), future)
+            # Safely remove the temporary directory in /tmp/web_scraper
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    @staticmethod
+    def _run_dir() -> str:
+        """Creates the temp directory of one extraction run, under /tmp/web_scraper rather than a local directory."""
+        os.makedirs(BASE_TMP_DIR, exist_ok=True)
+        output_dir = os.path.join(BASE_TMP_DIR, f"extract_{uuid.uuid4().hex}")
         os.makedirs(output_dir, exist_ok=True)
+        return output_dir
 
-        results = []  # will store tuples of (list_of_dfs, chosen_header)
-        header_usage = {}
+    @staticmethod
+    def _spill(output_dir: str, number: int, table: pa.Table, chosen_header: list) -> str:
+        """Writes one PDF's result to an Arrow file in 'output_dir' for combine_spilled and returns its path."""
+        path = os.path.join(output_dir, f"{number}.arrow")
+        with open(path, "wb") as f:
+            f.write(serialize_table(table, chosen_header))
+        return path
+
+    def _unique_urls(self, urls: list) -> list:
+        """'urls' without repeats of the same document, counting the repeats dropped."""
+        unique = dedupe_urls(urls)
+        if len(unique) < len(urls):
+            DEDUPLICATED.inc(len(urls) - len(unique), kind="duplicate")
+        return unique
 
+    def _follow(self, url, future):
+        """Waits for another request's extraction of 'url', returns (result, error) like the pipeline."""
+        DEDUPLICATED.inc(kind="coalesced")
         try:
-            # 1) Parallel process all URLs
-            with ThreadPoolExecutor(max_workers=min(16, os.cpu_count() or 4)) as executor:
-                future_to_url = {
-                    executor.submit(self.fetch_and_extract, url): url for url in urls
-                }
-                for future in as_completed(future_to_url):
-                    url = future_to_url[future]
-                    try:
-                        dfs, header = future.result()
-                        if dfs is not None:
-                            results.append((dfs, header))
-                            if header:
-                                header_tuple = tuple(header)
-                                header_usage[header_tuple] = header_usage.get(header_tuple, 0) + 1
-                    except Exception as e:
-                        print(f"Error processing PDF: {url}, Error: {e}")
-
-            # 2) Determine the globally most-used header
-            if header_usage:
-                global_most_used_header_tuple, global_freq = max(
-                    header_usage.items(),
-                    key=lambda x: x[1]
-                )
-                global_most_used_header = list(global_most_used_header_tuple)
-                print(f"Global most-used header: {global_most_used_header} (used {global_freq} times)")
-            else:
-                global_most_used_header = None
+            return future.result(), None
+        except AbandonedError:
+            logger.debug("Concurrent extraction of %s was abandoned; extracting it here", url)
+        except Exception as error:
+            return None, error
+        try:
+            return self.parse_download(url, self.download(url)), None
+        except Exception as error:
+            return None, error
 
-            # 3) Reassign fallback headers to the global header where applicable
-            all_dfs = []
-            for (dfs, chosen_header) in results:
-                if not dfs:
-                    continue
+    def extract_incremental(self, urls: list, output_format: OutputFormat, state, key: str, merged: bool = False, progress=None):
+        """
+        extract() for a recurring collection of the same source. 'state' is an
+        IncrementalState holding, under 'key', the URLs and content hashes of
+        earlier runs with their extracted tables.
 
-                # If there's a global header and it differs from chosen_header
-                # but they share the same column count, unify columns to the global
-                if (
-                    global_most_used_header is not None
-                    and chosen_header != global_most_used_header
-                    and len(chosen_header) == len(global_most_used_header)
-                ):
-                    for df in dfs:
-                        df.columns = global_most_used_header
-
-                all_dfs.extend(dfs)
-
-            # 4) Final merge and cleanup
-            if all_dfs:
-                final_df = pd.concat(all_dfs, ignore_index=True)
-
-                # --- Remove entirely blank rows (including empty strings) ---
-                final_df.replace('', pd.NA, inplace=True)
-                final_df.dropna(how='all', inplace=True)
-
-                # --- Remove rows that look like repeated headers ---
-                def row_starts_like_header(row, col_headers):
-                    """
-                    Returns True if *every* cell in 'row'
-                    starts with the first 2 chars of the corresponding header.
-                    """
-                    for cell_value, col_name in zip(row, col_headers):
-                        cell_str = str(cell_value).strip().lower()
-                        col_start = str(col_name).strip().lower()[:2]  # first 2 chars
-                        if not cell_str.startswith(col_start):
-                            return False
-                    return True
-
-                header_mask = final_df.apply(
-                    lambda r: row_starts_like_header(r, final_df.columns),
-                    axis=1
-                )
-                final_df = final_df[~header_mask]
-
-                # --- Export the final dataframe ---
-                buffer = io.BytesIO()
-                if output_format == OutputFormat.CSV.value:
-                    csv_str = final_df.to_csv(index=False)
-                    buffer.write(csv_str.encode("utf-8"))
-                    file_extension = "csv"
-                    mime_type = "text/csv"
-                elif output_format == OutputFormat.PARQUET.value:
-                    final_df.to_parquet(buffer, index=False, engine="pyarrow")
-                    file_extension = "parquet"
-                    mime_type = "application/octet-stream"
-                else:
-                    return {"error": f"Unsupported output format: {output_format}"}
-
-                buffer.seek(0)
-                headers = {
-                    "Content-Disposition": f'attachment; filename="final_extracted_data.{file_extension}"'
-                }
-                return buffer, mime_type, headers
+        Only new documents and documents whose content hash changed are parsed.
+        The output holds the rows of those documents (or, with 'merged', of every
+        listed document) plus SOURCE_COLUMNS naming the document each row came
+        from, so consumers can replace a document's rows wholesale. Documents no
+        longer listed are forgotten; a document that fails to download keeps its
+        previous state (and its previous rows in a merged output).
+
+        Returns (buffer, mime_type, headers); the X-Documents-* headers count the
+        new, changed, unchanged, removed and failed documents. The output is
+        empty, not None, when nothing changed.
+        """
+        known = state.documents(key)
+        # Not coalesced with other requests: what is parsed depends on this collection's state
+        urls = self._unique_urls(urls)
+        position = {url: i for i, url in enumerate(urls)}
+        counts = {"new": 0, "changed": 0, "unchanged": 0, "failed": 0}
+        finished = []  # (position in urls, (table, chosen_header), {source column: value})
+
+        def fetch(url):
+            return self.download(url, revalidate=url in known)
+
+        def parse(url, download):
+            return self.parse_tracked(url, download, known.get(url))
+
+        for url, tracked, error in self._pipeline(urls, fetch, parse):
+            content_hash, result = tracked if error is None else (None, None)
+            if error is not None:
+                self._download_failed(url, error)
+
+            if content_hash is None:
+                counts["failed"] += 1
+                state_name = "failed"
+                if merged and url in known:
+                    content_hash = known[url]
+                    result = state.load_result(key, content_hash)
+            elif result is None:
+                counts["unchanged"] += 1
+                state_name = "unchanged"
+                if merged:
+                    result = state.load_result(key, content_hash)
             else:
-                print("No valid tables were extracted from any PDF.")
-                return None
+                counts["changed" if url in known else "new"] += 1
+                if url not in self.aborted_pages:
+                    # Otherwise parsed again next run, when the aborted pages may succeed
+                    state.record(key, url, content_hash, *result)
+                state_name = "extracted" if result[0] is not None else "no_tables"
+
+            if result is not None and result[0] is not None:
+                finished.append((position[url], result, {"source_document": url, "source_hash": content_hash}))
+            self._document_done(url, state_name, progress)
+        finished.sort(key=lambda item: item[0])
+
+        listed = set(urls)
+        removed = [url for url in known if url not in listed]
+        state.remove(key, removed)
+        counts["removed"] = len(removed)
+        logger.info("Incremental run: %s", counts)
+
+        output = self.combine_results([result for _, result, _ in finished], output_format,
+                                      [source for _, _, source in finished])
+        if output is None:
+            output = export_table(pa.table({name: pa.array([], pa.string()) for name in SOURCE_COLUMNS}), output_format, self.export_options)
+        buffer, mime_type, headers = output
+        headers = dict(headers)
+        headers.update({f"X-Documents-{name.capitalize()}": str(count) for name, count in counts.items()})
+        return self.with_aborted_headers((buffer, mime_type, headers))
+
+    def _pipeline(self, urls: list, fetch, parse):
+        """Runs fetch (download stage) and parse (parse stage) over 'urls' with this extractor's stage sizes."""
+        return run_pipeline(
+            urls, fetch, parse,
+            download_workers=self.download_workers,
+            parse_workers=self.parse_workers,
+            queue_size=self.queue_size,
+            discard=Download.close,
+        )
+
+    def _download_failed(self, url, error) -> bool:
+        """Reports a pipeline error; True when it is a download error rather than a processing failure."""
+        if isinstance(error, requests.RequestException):
+            logger.warning("Request error for %s: %s", url, error)
+        elif isinstance(error, DocumentTooLargeError):
+            logger.warning("Skipping %s: %s", url, error)
+        else:
+            logger.error("Error processing PDF %s: %s", url, error, exc_info=error)
+            return False
+        return True
+
+    def _document_done(self, url, state: str, progress=None):
+        """Counts a finished document by outcome and tells 'progress' about it."""
+        DOCUMENTS.inc(outcome=state)
+        if progress:
+            progress(url, state)
+
+    async def extract_async(self, urls: list, output_format: OutputFormat = OutputFormat.CSV, fetcher=None):
+        """
+        Non-blocking version of extract() for the API: PDFs are downloaded
+        concurrently over the shared async connection pool, and parsing and
+        merging run on the parse executor so the event loop stays free. Like
+        extract(), each PDF's tables are spilled as it finishes and merged with
+        combine_spilled.
+        """
+        output_dir = self._run_dir()
+        urls = self._unique_urls(urls)
+        loop = asyncio.get_running_loop()
+        executor = get_parse_executor()
+        spilled = {}  # url -> Arrow file holding its (table, chosen_header)
+        try:
+            async for url, table, header in self._iter_results_async(urls, fetcher):
+                spilled[url] = await loop.run_in_executor(executor, self._spill, output_dir, len(spilled), table, header)
+            # In the order of 'urls' whatever order the PDFs finished in
+            paths = [spilled[url] for url in urls if url in spilled]
+            output = await loop.run_in_executor(executor, self.combine_spilled, paths, output_format)
+            return self.with_aborted_headers(output)
         finally:
-            # Safely remove the temporary directory in /tmp/web_scraper
             shutil.rmtree(output_dir, ignore_errors=True)
+
+    async def stream_async(self, urls: list, output_format: OutputFormat = OutputFormat.CSV, fetcher=None):
+        """
+        Streaming version of extract_async(), returns (async_byte_iterator, mime_type, headers).
+
+        The first STREAM_HEADER_SAMPLE successful PDFs are buffered to vote on the
+        header; from then on each PDF's rows are cleaned, projected onto that
+        header and emitted (CSV block or Parquet row group) as soon as it finishes,
+        so memory holds only the sample plus the PDFs in flight.
+        """
+        writer = StreamWriter(output_format, self.export_options)  # raises ValueError for unsupported formats up front
+        if self.typed:
+            raise ValueError("Typed output needs the whole table to infer column types and can't be streamed")
+        urls = self._unique_urls(urls)
+        loop = asyncio.get_running_loop()
+        executor = get_parse_executor()
+        sample_size = max(1, min(STREAM_HEADER_SAMPLE, len(urls)))
+        columns = None
+
+        def emit(table, header):
+            return loop.run_in_executor(executor, self._stream_chunk, writer, table, header, columns)
+
+        async def body():
+            nonlocal columns
+            pending = []
+            async for _, table, header in self._iter_results_async(urls, fetcher):
+                pending.append((table, header))
+                if columns is None:
+                    if len(pending) < sample_size:
+                        continue
+                    columns = self._settle_columns(pending)
+                    yield writer.begin(columns)
+                while pending:
+                    yield await emit(*pending.pop(0))
+
+            # Fewer PDFs than the sample succeeded: settle on what we have
+            if columns is None:
+                if not pending:
+                    logger.warning("No valid tables were extracted from any PDF")
+                    return
+                columns = self._settle_columns(pending)
+                yield writer.begin(columns)
+                while pending:
+                    yield await emit(*pending.pop(0))
+            yield writer.close()
+
+        return body(), writer.mime_type, attachment_headers(writer.file_extension)
+
+    def _settle_columns(self, results: list) -> list:
+        """Fixes the streamed output columns from the header vote over 'results'."""
+        global_header = self.choose_global_header(results)
+        if global_header is None:
+            global_header = self.standard_headers or results[0][0].column_names
+        return self.unique_names(global_header)
+
+    def _stream_chunk(self, writer: StreamWriter, table: pa.Table, chosen_header: list, columns: list) -> bytes:
+        """Unifies, cleans and serializes one PDF's tables against the settled columns."""
+        table = self.fit_columns(table, chosen_header, columns, columns)
+        with timed("serialize", self.timings):
+            return writer.write(table)
+
+    def fit_columns(self, table: pa.Table, chosen_header: list, global_header: list, columns: list) -> pa.Table:
+        """One PDF's tables unified with 'global_header', laid out as 'columns' and cleaned."""
+        with timed("merge", self.timings):
+            table = self.unify_columns(table, chosen_header, global_header)
+            missing = None
+            if table.column_names != columns:
+                # Differently shaped PDFs keep the matching columns; missing ones are left empty
+                present = set(table.column_names)
+                missing = {name: np.ones(table.num_rows, dtype=bool) for name in columns if name not in present}
+                table = pa.table({
+                    name: table.column(name) if name in present else pa.nulls(table.num_rows, pa.string())
+                    for name in columns
+                })
+            return self.clean_rows(table, missing)
+
+    async def _iter_results_async(self, urls: list, fetcher=None):
+        """
+        Downloads and parses every URL concurrently, yielding (url, table, chosen_header)
+        as PDFs finish. PDFs another request is already extracting with the same
+        settings are waited for instead.
+        """
+        fetcher = fetcher or get_async_fetcher()
+        loop = asyncio.get_running_loop()
+        executor = get_parse_executor()
+        download_slots = asyncio.Semaphore(self.download_workers)
+        # Downloaded PDFs being parsed or waiting for a parser; a download keeps its
+        # slot until one frees up, so downloads can't run far ahead of parsing
+        parse_slots = asyncio.Semaphore(self.parse_workers + self.queue_size)
+
+        async def download_and_extract(url):
+            try:
+                async with download_slots:
+                    logger.debug("Processing %s", url)
+                    validators = await loop.run_in_executor(executor, self._validators, url)
+                    with timed("download", self.timings):
+                        download = await fetcher.download(url, headers=validators, budget=self.budget, max_bytes=self.max_document_bytes)
+                    DOWNLOADED_BYTES.inc(download.size, kind="document")
+                    QUEUE_DEPTH.inc(queue="async_parse")
+                    try:
+                        await parse_slots.acquire()
+                    finally:
+                        QUEUE_DEPTH.dec(queue="async_parse")
+                try:
+                    with download:
+                        result = await loop.run_in_executor(executor, self.extract_downloaded, url, download)
+                finally:
+                    parse_slots.release()
+                if result is None:
+                    # Revalidated, but the cached copy was evicted meanwhile: download it again
+                    async with download_slots:
+                        with timed("download", self.timings):
+                            download = await fetcher.download(url, budget=self.budget, max_bytes=self.max_document_bytes)
+                        DOWNLOADED_BYTES.inc(download.size, kind="document")
+                    with download:
+                        result = await loop.run_in_executor(executor, self.extract_downloaded, url, download)
+                return result
+            except httpx.HTTPError as req_err:
+                logger.warning("Request error for %s: %s", url, req_err)
+            except DocumentTooLargeError as size_err:
+                logger.warning("Skipping %s: %s", url, size_err)
+            return None, None
+
+        async def coalesced(url):
+            """(url, result, error) of one PDF, like the pipeline's results."""
+            key = self.flight_key(url)
+            future, leader = self.flights.claim(key)
+            if not leader:
+                DEDUPLICATED.inc(kind="coalesced")
+                try:
+                    # Shielded: a cancelled request mustn't cancel the future other requests wait on
+                    return url, await asyncio.shield(asyncio.wrap_future(future)), None
+                except AbandonedError:
+                    logger.debug("Concurrent extraction of %s was abandoned; extracting it here", url)
+                except Exception as error:
+                    return url, None, error
+                try:
+                    return url, await download_and_extract(url), None
+                except Exception as error:
+                    return url, None, error
+            try:
+                result = await download_and_extract(url)
+            except Exception as error:
+                self.flights.resolve(key, future, error=error)
+                return url, None, error
+            except BaseException:
+                self.flights.abandon(key, future)
+                raise
+            self.flights.resolve(key, future, result)
+            return url, result, None
+
+        for next_done in asyncio.as_completed([coalesced(url) for url in urls]):
+            url, result, error = await next_done
+            if error is not None:
+                # One PDF failing doesn't fail the request, as in extract()
+                state = "no_tables" if self._download_failed(url, error) else "failed"
+                self._document_done(url, state)
+                continue
+            table, header = result
+            self._document_done(url, "extracted" if table is not None else "no_tables")
+            if table is not None:
+                yield url, table, header
+
+    def choose_global_header(self, results: list):
+        """Returns the header chosen by the most PDFs in 'results', or None."""
+        header_usage = {}
+        for _, header in results:
+            if header:
+                header_tuple = tuple(header)
+                header_usage[header_tuple] = header_usage.get(header_tuple, 0) + 1
+
+        if not header_usage:
+            return None
+
+        global_most_used_header_tuple, global_freq = max(
+            header_usage.items(),
+            key=lambda x: x[1]
+        )
+        global_most_used_header = list(global_most_used_header_tuple)
+        logger.info("Global most-used header: %s (used %d times)", global_most_used_header, global_freq)
+        return global_most_used_header
+
+    def merged_columns(self, headers: list, global_header: list) -> list:
+        """
+        The columns combine_results() ends up with for tables whose
+        (column names, chosen_header) are 'headers': each table's columns
+        after unify_columns, in order of first appearance.
+        """
+        columns = []
+        seen = set()
+        for names, chosen_header in headers:
+            if (
+                global_header is not None
+                and chosen_header != global_header
+                and len(chosen_header) == len(global_header)
+            ):
+                names = self.unique_names(global_header)
+            for name in names:
+                if name not in seen:
+                    seen.add(name)
+                    columns.append(name)
+        return columns
+
+    def unify_columns(self, table: pa.Table, chosen_header: list, global_header: list) -> pa.Table:
+        """
+        If there's a global header and it differs from chosen_header
+        but they share the same column count, unify columns to the global.
+        """
+        if (
+            global_header is not None
+            and chosen_header != global_header
+            and len(chosen_header) == len(global_header)
+        ):
+            return table.rename_columns(self.unique_names(global_header))
+        return table
+
+    def clean_rows(self, table: pa.Table, missing: dict = None) -> pa.Table:
+        """
+        Remove blank rows and stray repeated header rows from a merged table.
+        SOURCE_COLUMNS, when present, are not part of either check.
+
+        missing: {column name: boolean array over the rows} of the cells the merge
+                 left empty because their PDF has no such column.
+        """
+        missing = missing or {}
+        # --- Remove entirely blank rows (including empty strings) ---
+        data_columns = [i for i, name in enumerate(table.column_names) if name not in SOURCE_COLUMNS]
+        not_blank = np.zeros(table.num_rows, dtype=bool)
+        null_text = []  # per data column, what each of its null cells reads as to the header check
+        for i in data_columns:
+            column = table.column(i)
+            empty = _to_numpy(pc.fill_null(pc.equal(column, ""), False))
+            # As in the row-wise check this replaced: "" became pd.NA, a column missing
+            # from a PDF NaN after the concat, and None stayed None
+            text = np.full(table.num_rows, "None", dtype=object)
+            if table.column_names[i] in missing:
+                text[missing[table.column_names[i]]] = "nan"
+            text[empty] = "<NA>"
+            null_text.append(text)
+            column = pc.if_else(pc.equal(column, ""), pa.scalar(None, pa.string()), column)
+            table = table.set_column(i, table.field(i), column)
+            not_blank |= _to_numpy(pc.is_valid(column))
+        table = table.filter(pa.array(not_blank))
+
+        # --- Remove rows that look like repeated headers ---
+        if table.num_rows == 0:
+            return table
+        null_text = [text[not_blank] for text in null_text]
+        return table.filter(pa.array(~self.header_like_mask(table.select(data_columns), null_text)))
+
+    @staticmethod
+    def missing_cells(tables: list) -> dict:
+        """
+        {column name: boolean array} of the cells pa.concat_tables(tables) leaves
+        empty because the table they come from has no such column.
+        """
+        names = {name for table in tables for name in table.column_names}
+        return {
+            name: np.concatenate([np.full(table.num_rows, name not in table.column_names) for table in tables])
+            for name in names
+            if any(name not in table.column_names for table in tables)
+        }
+
+    def header_row_mask(self, table, header) -> np.ndarray:
+        """
+        True for rows whose cells, cleaned like clean_header(str(cell)),
+        equal 'header' cell for cell. Works column by column instead of row
+        by row, and each column only looks at rows that still match.
+        'table' is an Arrow table or record batch (or a DataFrame).
+        """
+        table = _as_arrow(table)
+        mask = np.ones(table.num_rows, dtype=bool)
+        for i, expected in enumerate(header):
+            rows = np.flatnonzero(mask)
+            if rows.size == 0:
+                break
+            # clean_header: newlines and whitespace runs become one space, then strip; str(None) is "None"
+            cells = pc.fill_null(table.column(i).take(rows), "None")
+            cleaned = pc.utf8_trim_whitespace(pc.replace_substring_regex(cells, WHITESPACE_RUN, " "))
+            mask[rows] = _to_numpy(pc.equal(cleaned, expected))
+        return mask
+
+    def header_like_mask(self, table, null_text: list = None) -> np.ndarray:
+        """
+        True for rows where *every* cell starts with the first
+        2 chars of the corresponding column name (case-insensitive).
+        'table' is an Arrow table or record batch (or a DataFrame).
+
+        null_text: per column, an array of what each null cell reads as, as
+                   clean_rows works out; otherwise nulls read as str(None), so a
+                   null under "No" looks like a header cell.
+        """
+        table = _as_arrow(table)
+        mask = np.ones(table.num_rows, dtype=bool)
+        for i, col_name in enumerate(table.column_names):
+            rows = np.flatnonzero(mask)
+            if rows.size == 0:
+                break
+            col_start = str(col_name).strip().lower()[:2]  # first 2 chars
+            if not col_start:
+                continue
+            cells = table.column(i).take(rows)
+            if null_text is not None:
+                cells = pc.coalesce(cells, pa.array(null_text[i][rows], pa.string()))
+            else:
+                cells = pc.fill_null(cells, "None")
+            cells = pc.utf8_lower(pc.utf8_trim_whitespace(cells))
+            mask[rows] = _to_numpy(pc.starts_with(cells, col_start))
+        return mask
+
+    def combine_results(self, results: list, output_format: OutputFormat = OutputFormat.CSV, sources: list = None):
+        """
+        Unify columns of the per-PDF (table, chosen_header) results using
+        the globally most-used header, remove blank rows and stray repeated
+        header rows, and export the merged table.
+
+        sources: optional list matching 'results' of {column: value} dicts
+                 (SOURCE_COLUMNS) added to every row of that PDF, as last columns.
+        """
+        # 2) Determine the globally most-used header
+        with timed("header_vote", self.timings):
+            global_most_used_header = self.choose_global_header(results)
+
+        # 3) Reassign fallback headers to the global header where applicable
+        with timed("merge", self.timings):
+            tables = []
+            for i, (table, chosen_header) in enumerate(results):
+                if table is None or table.num_rows == 0:
+                    continue
+                table = self.unify_columns(table, chosen_header, global_most_used_header)
+                if sources:
+                    for name, value in sources[i].items():
+                        table = table.append_column(name, pa.array([value] * table.num_rows, pa.string()))
+                tables.append(table)
+
+            # 4) Final merge (columns are matched by name, missing ones left empty) and cleanup
+            if tables:
+                final_table = pa.concat_tables(tables, promote_options="default")
+                if sources:
+                    trailing = [name for name in SOURCE_COLUMNS if name in final_table.column_names]
+                    final_table = final_table.select(
+                        [name for name in final_table.column_names if name not in trailing] + trailing
+                    )
+                final_table = self.clean_rows(final_table, self.missing_cells(tables))
+
+        if tables and self.typed:
+            with timed("infer_types", self.timings):
+                final_table = infer_types(final_table, self.decimal_separator, skip=SOURCE_COLUMNS)
+
+        if tables:
+            with timed("serialize", self.timings):
+                return export_table(final_table, output_format, self.export_options)
+        else:
+            logger.warning("No valid tables were extracted from any PDF")
+            return None
+
+
+    def combine_spilled(self, paths: list, output_format: OutputFormat = OutputFormat.CSV):
+        """
+        combine_results() for per-PDF results spilled to Arrow files (see
+        cache.serialize_table), given in output order. The header vote only reads
+        the files' schemas; the PDFs are then read back one at a time, fitted to
+        the final header, cleaned and serialized in chunks of SPILL_CHUNK_ROWS, so
+        memory holds the largest PDF and one chunk rather than every PDF. The
+        output has the same rows and columns as combine_results(). Typed output
+        needs every row to infer column types, so it reads all the files back.
+        """
+        if self.typed:
+            return self.combine_results([read_table(path) for path in paths], output_format)
+
+        with timed("header_vote", self.timings):
+            headers = [read_schema(path) for path in paths]
+            global_header = self.choose_global_header([(None, header) for _, header in headers])
+        columns = self.merged_columns(headers, global_header)
+
+        writer = StreamWriter(output_format, self.export_options)
+        buffer = io.BytesIO()
+        pending, pending_rows, extracted = [], 0, False
+
+        def flush():
+            with timed("serialize", self.timings):
+                buffer.write(writer.write(pa.concat_tables(pending)))
+
+        with timed("serialize", self.timings):
+            buffer.write(writer.begin(columns))
+        for path, (_, chosen_header) in zip(paths, headers):
+            table, _ = read_table(path)
+            if table is None:
+                continue
+            extracted = True
+            table = self.fit_columns(table, chosen_header, global_header, columns)
+            pending.append(table)
+            pending_rows += table.num_rows
+            if pending_rows >= SPILL_CHUNK_ROWS:
+                flush()
+                pending, pending_rows = [], 0
+
+        if not extracted:
+            logger.warning("No valid tables were extracted from any PDF")
+            return None
+        if pending:
+            flush()
+        with timed("serialize", self.timings):
+            buffer.write(writer.close())
+        buffer.seek(0)
+        return buffer, writer.mime_type, attachment_headers(writer.file_extension)
+
+
+def _to_numpy(values) -> np.ndarray:
+    """Boolean Arrow array (or chunked array) as a numpy array."""
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    return values.to_numpy(zero_copy_only=False)
+
+
+def _as_arrow(data):
+    """Arrow view of a DataFrame with every column as text (missing values null); Arrow input is returned as is."""
+    if isinstance(data, (pa.Table, pa.RecordBatch)):
+        return data
+    arrays = []
+    for i in range(data.shape[1]):
+        column = data.iloc[:, i].astype(object)
+        column = column.where(column.notna(), None)
+        try:
+            arrays.append(pa.array(column, type=pa.string(), from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array([None if cell is None else str(cell) for cell in column], type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(name) for name in data.columns])
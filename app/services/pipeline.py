@@ -0,0 +1,94 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.metrics import QUEUE_DEPTH
+
+_DONE = object()
+
+
+def run_pipeline(items: list, fetch, parse, download_workers: int, parse_workers: int,
+                 queue_size: int, discard=None):
+    """
+    Runs every item through two stages and yields (item, result, error) as
+    items finish, in completion order:
+
+      - fetch(item) on 'download_workers' threads (I/O bound),
+      - parse(item, fetched) on 'parse_workers' threads (CPU bound).
+
+    Fetched values wait for a parser in a queue of 'queue_size'; when it is
+    full the fetch threads block, so no more than queue_size + download_workers
+    fetched values are held at once however far downloads run ahead of parsing.
+    'error' is the exception raised by either stage (then 'result' is None).
+
+    Closing the generator early stops fetching new items; values already
+    fetched are handed to discard(fetched) instead of being parsed.
+    """
+    fetched = queue.Queue(maxsize=max(1, queue_size))
+    results = queue.Queue()
+    cancelled = threading.Event()
+
+    def fetch_one(item):
+        if cancelled.is_set():
+            return
+        try:
+            value = fetch(item)
+        except Exception as e:
+            results.put((item, None, e))
+            return
+        # Counted from here: downloaded and waiting for a parser, in the queue or blocked on it
+        QUEUE_DEPTH.inc(queue="pipeline")
+        while not cancelled.is_set():
+            try:
+                fetched.put((item, value), timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        QUEUE_DEPTH.dec(queue="pipeline")
+        if discard:
+            discard(value)
+
+    def parse_loop():
+        while True:
+            entry = fetched.get()
+            if entry is _DONE:
+                return
+            item, value = entry
+            QUEUE_DEPTH.dec(queue="pipeline")
+            if cancelled.is_set():
+                if discard:
+                    discard(value)
+                continue
+            try:
+                results.put((item, parse(item, value), None))
+            except Exception as e:
+                results.put((item, None, e))
+
+    parsers = [
+        threading.Thread(target=parse_loop, name=f"pipeline-parse-{i}", daemon=True)
+        for i in range(max(1, parse_workers))
+    ]
+    for parser in parsers:
+        parser.start()
+
+    downloads = ThreadPoolExecutor(max_workers=max(1, download_workers), thread_name_prefix="pipeline-download")
+    for item in items:
+        downloads.submit(fetch_one, item)
+
+    def close_parse_stage():
+        # Parsers stop once every fetch has been handed over
+        downloads.shutdown(wait=True)
+        for _ in parsers:
+            fetched.put(_DONE)
+
+    closer = threading.Thread(target=close_parse_stage, name="pipeline-close", daemon=True)
+    closer.start()
+
+    try:
+        for _ in range(len(items)):
+            yield results.get()
+    finally:
+        cancelled.set()
+        closer.join()
+        for parser in parsers:
+            parser.join()
@@ -0,0 +1,257 @@
+"""
+Extraction profiles: pdfplumber table settings suited to a kind of document.
+Lines-vs-text strategies and tolerances differ widely in speed and accuracy
+between publishers, so a request can name a profile, pass its own settings, or
+ask for "auto".
+
+With "auto", the first document of a source (see source_key) is tuned: every
+built-in profile searches a sample of its pages, and the fastest one that finds
+a table with a valid header wins. The choice is remembered per source in a
+ProfileStore, so later documents from the same source go straight to it. When
+no profile finds a valid header, "default" (pdfplumber's defaults) is
+remembered instead, so the source isn't tuned on every document. Either choice
+is tuned again once it is PROFILE_TTL seconds old.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from app.services.metrics import PROFILE_LOOKUPS
+from app.services.tableengine import page_may_have_tables, search_page, select_pages
+from app.settings import BASE_TMP_DIR, PROFILE_PATTERNS, PROFILE_TTL
+
+PROFILE_DIR = os.path.join(BASE_TMP_DIR, "profiles")
+
+# Profile name that picks a profile per source
+AUTO = "auto"
+
+# Profile remembered for a source where tuning found none: pdfplumber's defaults
+DEFAULT = "default"
+
+# Built-in profiles, in the order they are tried
+PROFILES = {
+    # pdfplumber's defaults: ruling lines and rectangle edges bound the cells
+    "lines": {"vertical_strategy": "lines", "horizontal_strategy": "lines"},
+    # Only drawn lines, not rectangle edges (background fills don't split cells)
+    "lines_strict": {"vertical_strategy": "lines_strict", "horizontal_strategy": "lines_strict"},
+    # Ruling with gaps or slightly offset segments
+    "lines_loose": {
+        "vertical_strategy": "lines", "horizontal_strategy": "lines",
+        "snap_tolerance": 6, "join_tolerance": 6, "intersection_tolerance": 6,
+    },
+    # Rows ruled, columns only aligned (tables without vertical lines)
+    "text_columns": {"vertical_strategy": "text", "horizontal_strategy": "lines"},
+    # No ruling at all: cells from word alignment
+    "text": {"vertical_strategy": "text", "horizontal_strategy": "text"},
+}
+
+# Pages of a document searched with every profile when tuning
+PROFILE_SAMPLE_PAGES = 3
+
+# Times the profiles that found a valid header are run over the sample, interleaved,
+# keeping each one's best time; and how much faster than an earlier profile a later
+# one must be to win. Both keep timing noise from picking between equally fast profiles
+PROFILE_ROUNDS = 2
+PROFILE_MARGIN = 0.1
+
+
+def check_table_settings(settings: dict):
+    """Raises ValueError when 'settings' aren't valid pdfplumber table settings."""
+    from pdfplumber.table import TableSettings
+
+    try:
+        TableSettings.resolve(settings)
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"Invalid table_settings: {error}")
+
+
+def source_key(url: str, patterns: list = PROFILE_PATTERNS) -> str:
+    """
+    The source sharing a tuned profile that 'url' belongs to: the first of
+    'patterns' (regular expressions) it matches, otherwise its host (the
+    directory of a local file).
+    """
+    for pattern in patterns:
+        if re.search(pattern, url):
+            return pattern
+    return urlsplit(url).hostname or os.path.dirname(url)
+
+
+def time_profiles(pdf_file, pages: str = None, profiles: dict = PROFILES, sample_pages: int = PROFILE_SAMPLE_PAGES,
+                  accept=None) -> dict:
+    """
+    Searches the first 'sample_pages' pages of 'pdf_file' (a path or binary file)
+    selected by 'pages' (see tableengine.parse_page_ranges) with each of
+    'profiles', PROFILE_ROUNDS times interleaved. Returns {name: (tables found,
+    best seconds)}. With 'accept', profiles that found no table accept(table)
+    holds true for are left out after the first round.
+    """
+    import pdfplumber
+
+    found = {}  # name -> (tables, best seconds)
+    with pdfplumber.open(pdf_file) as pdf:
+        sample = [pdf.pages[i] for i in select_pages(len(pdf.pages), pages)[:sample_pages]]
+        # Lay the pages out and decode their content up front, so every profile is timed on finding tables alone
+        for page in sample:
+            page_may_have_tables(page)
+        for attempt in range(PROFILE_ROUNDS):
+            for name, settings in profiles.items():
+                if attempt and name not in found:
+                    continue
+                started = time.perf_counter()
+                tables = [table for page in sample for table in search_page(page, settings) or []]
+                seconds = time.perf_counter() - started
+                if attempt:
+                    found[name] = (found[name][0], min(seconds, found[name][1]))
+                elif accept is None or any(accept(table) for table in tables):
+                    found[name] = (tables, seconds)
+    return found
+
+
+def tune_profile(pdf_file, accept, pages: str = None, profiles: dict = PROFILES,
+                 sample_pages: int = PROFILE_SAMPLE_PAGES, limits=None):
+    """
+    Searches the first 'sample_pages' pages of 'pdf_file' selected by 'pages'
+    (see tableengine.parse_page_ranges) with each of 'profiles'. Returns
+    (name, settings, seconds) of the fastest profile that found a table
+    accept(table) holds true for, or None when none did. A profile only beats
+    an earlier one when it is PROFILE_MARGIN faster.
+
+    With 'limits' (sandbox.ParseLimits) enabled, the search runs in a sandbox
+    process under the document's limits (a page's, times the pages searched,
+    where only those are set), and sandbox.ParseAborted is raised when it goes
+    over them.
+    """
+    if limits is not None and limits.enabled:
+        from app.services.sandbox import run_isolated
+
+        searches = PROFILE_ROUNDS * len(profiles) * sample_pages
+        timeout = limits.document_timeout or (limits.page_timeout and limits.page_timeout * searches)
+        cpu = limits.document_cpu or (limits.page_cpu and limits.page_cpu * searches)
+        found = run_isolated(pdf_file, time_profiles, (pages, profiles, sample_pages), timeout, cpu, limits.memory_bytes)
+        found = {name: result for name, result in found.items() if any(accept(table) for table in result[0])}
+    else:
+        pdf_file.seek(0)
+        found = time_profiles(pdf_file, pages, profiles, sample_pages, accept)
+        pdf_file.seek(0)
+
+    best = None
+    for name in profiles:
+        if name in found and (best is None or found[name][1] < found[best][1] * (1 - PROFILE_MARGIN)):
+            best = name
+    return (best, profiles[best], found[best][1]) if best else None
+
+
+class ProfileStore:
+    """
+    Remembers the profile tuned for each source, in a SQLite file
+    (profiles.sqlite) shared by every process, fronted by an in-process memo.
+    A profile is forgotten once it is 'ttl' seconds old (None or 0: never).
+    """
+
+    def __init__(self, root: str = PROFILE_DIR, ttl: float = PROFILE_TTL):
+        self.root = root
+        self.ttl = ttl or None
+        self._memo = {}  # source -> (name, settings, tuned_at)
+        self._lock = threading.Lock()
+        self._tuning = {}  # source -> [lock held while the source is tuned, threads using it]
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "source TEXT PRIMARY KEY, profile TEXT, settings TEXT, sample_seconds REAL, tuned_at REAL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Yields a connection that commits on success and is always closed."""
+        db = sqlite3.connect(os.path.join(self.root, "profiles.sqlite"), timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, source: str):
+        """(profile name, table settings) remembered for 'source' and not expired, or None."""
+        found = self._memo.get(source)
+        if found is None:
+            with self._connect() as db:
+                row = db.execute("SELECT profile, settings, tuned_at FROM profiles WHERE source = ?", (source,)).fetchone()
+            if row is not None:
+                found = self._memo[source] = (row[0], json.loads(row[1]), row[2])
+        if found is None or (self.ttl is not None and time.time() - found[2] >= self.ttl):
+            return None
+        return found[0], found[1]
+
+    def put(self, source: str, name: str, settings: dict, seconds: float = None):
+        """Remembers the profile 'name' with 'settings' for 'source'; 'seconds' it took on the tuning sample."""
+        tuned_at = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO profiles (source, profile, settings, sample_seconds, tuned_at) VALUES (?, ?, ?, ?, ?)",
+                (source, name, json.dumps(settings), seconds, tuned_at),
+            )
+        self._memo[source] = (name, settings, tuned_at)
+
+    def forget(self, source: str):
+        """Drops the profile of 'source', so its next document is tuned again."""
+        self._memo.pop(source, None)
+        with self._connect() as db:
+            db.execute("DELETE FROM profiles WHERE source = ?", (source,))
+
+    def profiles(self) -> dict:
+        """{source: {"profile", "settings", "sample_seconds", "tuned_at"}} of every remembered source."""
+        with self._connect() as db:
+            rows = db.execute("SELECT source, profile, settings, sample_seconds, tuned_at FROM profiles").fetchall()
+        return {
+            source: {"profile": name, "settings": json.loads(settings), "sample_seconds": seconds, "tuned_at": tuned_at}
+            for source, name, settings, seconds, tuned_at in rows
+        }
+
+    def resolve(self, source: str, tune):
+        """
+        (profile name, table settings) for 'source': the remembered ones, or
+        else tune() (returning tune_profile's result) and remember them. When
+        tuning finds nothing, (DEFAULT, None) is remembered and returned, so the
+        source isn't tuned again until it expires. Concurrent documents of one
+        source in this process wait for a single tuning.
+        """
+        with self._lock:
+            tuning = self._tuning.setdefault(source, [threading.Lock(), 0])
+            tuning[1] += 1
+        try:
+            with tuning[0]:
+                found = self.get(source)
+                if found is not None:
+                    PROFILE_LOOKUPS.inc(result="hit")
+                    return found
+                tuned = tune()
+                PROFILE_LOOKUPS.inc(result="tuned" if tuned else "untuned")
+                name, settings, seconds = tuned if tuned is not None else (DEFAULT, None, None)
+                self.put(source, name, settings, seconds)
+                return name, settings
+        finally:
+            # The last thread out drops the lock, so sources don't pile up
+            with self._lock:
+                tuning[1] -= 1
+                if not tuning[1]:
+                    del self._tuning[source]
+
+
+_profile_store = None
+_profile_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    """Returns the profile store shared by all requests, creating it on first use."""
+    global _profile_store
+    with _profile_store_lock:
+        if _profile_store is None:
+            _profile_store = ProfileStore()
+        return _profile_store
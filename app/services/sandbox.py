@@ -0,0 +1,450 @@
+"""
+Isolated table detection for pathological PDFs. With ParseLimits set, a
+document's pages are searched in sandbox processes the caller can kill: a page
+that runs past its wall-clock or CPU-time limit, or a process that runs out of
+its memory cap, is aborted and reported (PageScan.aborted) while the rest of
+the document carries on in a fresh process. Once the document's own wall-clock
+or CPU-time budget is spent, its remaining pages are aborted too.
+
+Sandbox processes are spawned on demand and reused across documents; at most
+SANDBOX_WORKERS run at a time.
+"""
+import os
+import math
+import time
+import shutil
+import signal
+import logging
+import tempfile
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+
+from app.services.tableengine import PageScan, add_page, search_page, split_pages
+from app.settings import (
+    BASE_TMP_DIR, PARSE_DOCUMENT_TIMEOUT, PARSE_PAGE_TIMEOUT, PARSE_DOCUMENT_CPU, PARSE_PAGE_CPU, PARSE_MEMORY_LIMIT,
+    PARSE_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_WORKERS = max(os.cpu_count() or 4, PARSE_WORKERS)
+
+# Reasons a page is aborted, as counted in PageScan.skipped
+ABORT_REASONS = ("timeout", "cpu_limit", "memory_limit", "crashed")
+
+
+class ParseLimits:
+    """
+    Limits on the table detection of one PDF; None (or 0) for no limit.
+
+    document_timeout / page_timeout: wall-clock seconds for the whole document / one page.
+    document_cpu / page_cpu: CPU seconds for the whole document / one page (whole seconds).
+    memory_bytes: address space of each sandbox process.
+
+    Documents are only parsed in sandbox processes when a limit is set.
+    """
+
+    def __init__(self, document_timeout: float = PARSE_DOCUMENT_TIMEOUT, page_timeout: float = PARSE_PAGE_TIMEOUT,
+                 document_cpu: float = PARSE_DOCUMENT_CPU, page_cpu: float = PARSE_PAGE_CPU,
+                 memory_bytes: int = PARSE_MEMORY_LIMIT):
+        self.document_timeout = document_timeout or None
+        self.page_timeout = page_timeout or None
+        self.document_cpu = document_cpu or None
+        self.page_cpu = page_cpu or None
+        self.memory_bytes = memory_bytes or None
+
+    @property
+    def enabled(self) -> bool:
+        return any(value is not None for value in self.to_dict().values())
+
+    def tightened(self, **limits) -> "ParseLimits":
+        """A copy with the given limits (same names as to_dict) lowered to the values passed, where set."""
+        values = self.to_dict()
+        for name, value in limits.items():
+            if value:
+                values[name] = min(value, values[name]) if values[name] is not None else value
+        return ParseLimits(**values)
+
+    def to_dict(self) -> dict:
+        return {
+            "document_timeout": self.document_timeout,
+            "page_timeout": self.page_timeout,
+            "document_cpu": self.document_cpu,
+            "page_cpu": self.page_cpu,
+            "memory_bytes": self.memory_bytes,
+        }
+
+
+def _cpu_seconds() -> float:
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _limit_cpu(seconds):
+    """Makes the kernel stop this process (SIGXCPU) once it has used 'seconds' more CPU time; None lifts the limit."""
+    import resource
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = resource.RLIM_INFINITY if seconds is None else math.ceil(_cpu_seconds() + max(seconds, 0)) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = hard if soft == resource.RLIM_INFINITY else min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _sandbox_main(conn, memory_bytes):
+    """
+    Sandbox process loop: receives ("pages", pdf_path, page indexes, table_settings,
+    page_cpu, document_cpu) jobs and answers ("started", index) and ("page", index,
+    tables, cpu seconds) per page in order, then ("done",). The parent times a page
+    from its "started" message, so spawning the process and importing pdfplumber
+    don't count against the page's wall-clock limit. A page that runs out of
+    memory is answered with ("aborted", index, "memory_limit") and ends the
+    process; any other error with ("error", message). Exceeding a CPU limit gets
+    the process killed by the kernel (SIGXCPU).
+
+    ("call", pdf_path, func, args, cpu) jobs run func(pdf_path, *args) likewise,
+    answered with ("started", None), then ("result", value).
+    """
+    import pdfplumber
+    if memory_bytes:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job[0] == "call":
+            if not _sandbox_call(conn, *job[1:]):
+                return
+            continue
+        _, pdf_path, indexes, table_settings, page_cpu, document_cpu = job
+        page = indexes[0]
+        try:
+            document_end = _cpu_seconds() + document_cpu if document_cpu is not None else None
+            with pdfplumber.open(pdf_path) as pdf:
+                for page in indexes:
+                    before = _cpu_seconds()
+                    budgets = [budget for budget in (page_cpu, document_end and document_end - before) if budget is not None]
+                    if budgets:
+                        _limit_cpu(min(budgets))
+                    conn.send(("started", page))
+                    tables = search_page(pdf.pages[page], table_settings)
+                    conn.send(("page", page, tables, _cpu_seconds() - before))
+            if page_cpu is not None or document_cpu is not None:
+                _limit_cpu(None)
+            conn.send(("done",))
+        except MemoryError:
+            conn.send(("aborted", page, "memory_limit"))
+            return
+        except Exception as error:
+            conn.send(("error", f"{type(error).__name__}: {error}"))
+
+
+def _sandbox_call(conn, pdf_path, func, args, cpu) -> bool:
+    """Runs a "call" job for _sandbox_main; False when the process must end."""
+    try:
+        conn.send(("started", None))
+        if cpu is not None:
+            _limit_cpu(cpu)
+        result = func(pdf_path, *args)
+        if cpu is not None:
+            _limit_cpu(None)
+        conn.send(("result", result))
+    except MemoryError:
+        conn.send(("aborted", None, "memory_limit"))
+        return False
+    except Exception as error:
+        conn.send(("error", f"{type(error).__name__}: {error}"))
+    return True
+
+
+class _Sandbox:
+    """One sandbox process and the parent's end of its pipe."""
+
+    def __init__(self, memory_bytes):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.memory_bytes = memory_bytes
+        self.process = context.Process(target=_sandbox_main, args=(child_conn, memory_bytes), name="pdf-sandbox", daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def death_reason(self) -> str:
+        """Why the process ended on its own: "cpu_limit" (SIGXCPU), "memory_limit" (killed with a memory cap set) or "crashed"."""
+        self.process.join(timeout=5)
+        if self.process.exitcode == -signal.SIGXCPU:
+            return "cpu_limit"
+        if self.process.exitcode == -signal.SIGKILL and self.memory_bytes:
+            return "memory_limit"
+        return "crashed"
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """Idle sandbox processes kept for reuse, with at most 'size' processes working at once."""
+
+    def __init__(self, size: int = SANDBOX_WORKERS):
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self, memory_bytes, timeout: float = None):
+        """A sandbox process with the memory cap 'memory_bytes', or None if none was free within 'timeout' seconds."""
+        if not self._slots.acquire(timeout=timeout):
+            return None
+        with self._lock:
+            while self._idle:
+                sandbox = self._idle.pop()
+                if sandbox.memory_bytes == memory_bytes and sandbox.process.is_alive():
+                    return sandbox
+                sandbox.kill()
+        try:
+            return _Sandbox(memory_bytes)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, sandbox: _Sandbox):
+        """Returns a sandbox that finished its job to the idle processes."""
+        with self._lock:
+            self._idle.append(sandbox)
+        self._slots.release()
+
+    def discard(self, sandbox: _Sandbox):
+        """Kills a sandbox that is stuck or dead."""
+        sandbox.kill()
+        self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sandbox in idle:
+            sandbox.kill()
+
+
+_sandbox_pool = None
+_sandbox_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """Returns the sandbox pool shared by every request, creating it on first use."""
+    global _sandbox_pool
+    with _sandbox_pool_lock:
+        if _sandbox_pool is None:
+            _sandbox_pool = SandboxPool()
+        return _sandbox_pool
+
+
+def shutdown_sandbox_pool():
+    """Stops the idle sandbox processes."""
+    global _sandbox_pool
+    with _sandbox_pool_lock:
+        if _sandbox_pool is not None:
+            _sandbox_pool.shutdown()
+            _sandbox_pool = None
+
+
+class _Run:
+    """Consecutive pages of a document searched by one sandbox at a time."""
+
+    def __init__(self, pages: list):
+        self.pages = list(pages)
+        self.sandbox = None
+        self.page_started = None  # when the sandbox reported starting the current page
+        self.cpu_budget = None
+
+
+def extract_isolated(pdf_file, scan: PageScan, indexes: list, limits: ParseLimits, parts: int = 1,
+                     enough=None, pool: SandboxPool = None, table_settings: dict = None) -> PageScan:
+    """
+    extract_page_tables() for the pages 'indexes' of 'pdf_file' in sandbox
+    processes, up to 'parts' runs of consecutive pages at once (as many as there
+    are free sandboxes, at least one). Aborted pages are counted in scan.skipped
+    by reason (see ABORT_REASONS) and listed in scan.aborted as (page number, reason).
+    The document's CPU budget is what its pages used so far subtracted from
+    limits.document_cpu, handed to each run as it starts.
+    """
+    pool = pool or get_sandbox_pool()
+    os.makedirs(BASE_TMP_DIR, exist_ok=True)
+    pdf_file.seek(0)
+    with tempfile.NamedTemporaryFile(dir=BASE_TMP_DIR, suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(pdf_file, tmp)
+
+    deadline = time.monotonic() + limits.document_timeout if limits.document_timeout else None
+    pending = [_Run(indexes[start:stop]) for start, stop in split_pages(len(indexes), parts)] if indexes else []
+    active = []
+    outcomes = {}  # page index -> tables (None when pre-filtered) or an abort reason
+    cpu_used = 0.0
+    cursor = 0
+
+    def start_pending(sandbox=None):
+        """Starts waiting runs on 'sandbox', then on free sandboxes, waiting for one only when nothing else runs."""
+        while pending:
+            run = pending[0]
+            cpu_left = limits.document_cpu - cpu_used if limits.document_cpu else None
+            if cpu_left is not None and cpu_left <= 0:
+                pending.pop(0)
+                outcomes.update((page, "cpu_limit") for page in run.pages)
+                continue
+            if sandbox is None:
+                timeout = 0 if active else (max(0, deadline - time.monotonic()) if deadline is not None else None)
+                sandbox = pool.acquire(limits.memory_bytes, timeout)
+                if sandbox is None:
+                    return
+            pending.pop(0)
+            run.sandbox, run.page_started = sandbox, None
+            run.cpu_budget = min(budget for budget in (limits.page_cpu, cpu_left, math.inf) if budget is not None)
+            sandbox.conn.send(("pages", tmp.name, run.pages, table_settings, limits.page_cpu, cpu_left))
+            active.append(run)
+            sandbox = None
+        if sandbox is not None:
+            pool.release(sandbox)
+
+    def abort(run, reason):
+        """Aborts the page 'run' is on and kills its sandbox; the rest of the run waits for another."""
+        nonlocal cpu_used
+        active.remove(run)
+        pool.discard(run.sandbox)
+        page = run.pages.pop(0)
+        outcomes[page] = reason
+        if reason == "cpu_limit" and run.cpu_budget != math.inf:
+            cpu_used += run.cpu_budget
+        logger.debug("Aborted page %d: %s", page + 1, reason)
+        if run.pages:
+            pending.insert(0, run)
+
+    try:
+        start_pending()
+        while active or pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if not active:
+                start_pending()
+                continue
+            now = time.monotonic()
+            waits = [
+                run.page_started + limits.page_timeout - now
+                for run in active if limits.page_timeout and run.page_started is not None
+            ]
+            if deadline is not None:
+                waits.append(deadline - now)
+            ready = wait([run.sandbox.conn for run in active], max(0, min(waits)) if waits else None)
+
+            for run in [run for run in active if run.sandbox.conn in ready]:
+                try:
+                    message = run.sandbox.conn.recv()
+                except (EOFError, OSError):
+                    abort(run, run.sandbox.death_reason())
+                    continue
+                if message[0] == "started":
+                    run.page_started = time.monotonic()
+                elif message[0] == "page":
+                    _, page, tables, cpu_seconds = message
+                    outcomes[page] = tables
+                    cpu_used += cpu_seconds
+                    run.pages.pop(0)
+                    run.page_started = None
+                elif message[0] == "aborted":
+                    abort(run, message[2])
+                elif message[0] == "error":
+                    raise RuntimeError(message[1])
+                else:  # "done"
+                    active.remove(run)
+                    start_pending(run.sandbox)
+
+            if limits.page_timeout:
+                now = time.monotonic()
+                timed_out = [
+                    run for run in active
+                    if run.page_started is not None and now - run.page_started >= limits.page_timeout
+                ]
+                for run in timed_out:
+                    abort(run, "timeout")
+
+            # Hand finished pages over in page order, stopping once the caller has enough
+            while cursor < len(indexes) and indexes[cursor] in outcomes:
+                outcome = outcomes[indexes[cursor]]
+                cursor += 1
+                if isinstance(outcome, str):
+                    _record_abort(scan, indexes[cursor - 1], outcome)
+                elif add_page(scan, outcome, enough):
+                    scan.skipped["limit"] = len(indexes) - cursor
+                    return scan
+
+        # Pages still unfinished when the document ran out of time are aborted
+        for position in range(cursor, len(indexes)):
+            outcome = outcomes.get(indexes[position], "timeout")
+            if isinstance(outcome, str):
+                _record_abort(scan, indexes[position], outcome)
+            elif add_page(scan, outcome, enough):
+                scan.skipped["limit"] = len(indexes) - position - 1
+                return scan
+        return scan
+    finally:
+        for run in active:
+            pool.discard(run.sandbox)
+        os.remove(tmp.name)
+
+
+class ParseAborted(Exception):
+    """Work run by run_isolated went over a limit or its process died; 'reason' is one of ABORT_REASONS."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Parsing was aborted: {reason}")
+        self.reason = reason
+
+
+def run_isolated(pdf_file, func, args: tuple = (), timeout: float = None, cpu: float = None,
+                 memory_bytes: int = None, pool: SandboxPool = None):
+    """
+    func(pdf_path, *args) for work on a whole PDF (func must be a module-level
+    function), run in a sandbox process on a copy of 'pdf_file'. Raises
+    ParseAborted when it runs past 'timeout' wall-clock seconds (counted from
+    when the sandbox starts on it) or 'cpu' CPU seconds, runs out of
+    'memory_bytes', or its process dies; RuntimeError when func raises.
+    """
+    pool = pool or get_sandbox_pool()
+    os.makedirs(BASE_TMP_DIR, exist_ok=True)
+    pdf_file.seek(0)
+    with tempfile.NamedTemporaryFile(dir=BASE_TMP_DIR, suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(pdf_file, tmp)
+    pdf_file.seek(0)
+
+    sandbox = pool.acquire(memory_bytes)
+    try:
+        sandbox.conn.send(("call", tmp.name, func, args, cpu))
+        started = None
+        while True:
+            left = None if timeout is None or started is None else max(0, started + timeout - time.monotonic())
+            if not sandbox.conn.poll(left):
+                raise ParseAborted("timeout")
+            try:
+                message = sandbox.conn.recv()
+            except (EOFError, OSError):
+                raise ParseAborted(sandbox.death_reason())
+            if message[0] == "started":
+                started = time.monotonic()
+            elif message[0] == "result":
+                pool.release(sandbox)
+                sandbox = None
+                return message[1]
+            elif message[0] == "aborted":
+                raise ParseAborted(message[2])
+            else:  # "error"
+                raise RuntimeError(message[1])
+    finally:
+        if sandbox is not None:
+            pool.discard(sandbox)
+        os.remove(tmp.name)
+
+
+def _record_abort(scan: PageScan, page: int, reason: str):
+    scan.skipped[reason] = scan.skipped.get(reason, 0) + 1
+    scan.aborted.append((page + 1, reason))
@@ -5,6 +5,11 @@ class Scraper(ABC):
         self.url = request.url
         self.file_type = request.type
         self.css_selector = request.css_selector if hasattr(request, 'css_selector') else None
+        # Crawl options (a depth of 0 only looks at 'url' itself)
+        self.crawl_depth = getattr(request, 'crawl_depth', 0) or 0
+        self.max_pages = getattr(request, 'max_pages', 1) or 1
+        self.same_domain = getattr(request, 'same_domain', True)
+        self.follow_pattern = getattr(request, 'follow_pattern', None)
 
     @abstractmethod
     def scrape(self):
@@ -0,0 +1,107 @@
+import re
+import string
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Characters a percent-escape never needs to protect (RFC 3986 section 2.3)
+UNRESERVED = set(string.ascii_letters + string.digits + "-._~")
+
+_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+
+
+class AbandonedError(Exception):
+    """Set on a key's future when its leader stopped before doing the work; followers do it themselves."""
+
+
+def normalize_url(url: str) -> str:
+    """
+    The form of 'url' used to recognize the same document: scheme and host in
+    lower case, default port and fragment dropped, an empty path as "/", and
+    percent-escapes of characters that don't need them decoded (the rest in upper case).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or port == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    if parts.username is not None:
+        credentials = parts.username + (f":{parts.password}" if parts.password is not None else "")
+        netloc = f"{credentials}@{netloc}"
+    path = _normalize_escapes(parts.path) or "/"
+    return urlunsplit((scheme, netloc, path, _normalize_escapes(parts.query), ""))
+
+
+def _normalize_escapes(text: str) -> str:
+    def escape(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in UNRESERVED else f"%{match.group(1).upper()}"
+    return _ESCAPE.sub(escape, text).replace(" ", "%20")
+
+
+def dedupe_urls(urls: list) -> list:
+    """'urls' without repeats of the same document (see normalize_url), in first-seen order."""
+    seen = set()
+    unique = []
+    for url in urls:
+        key = normalize_url(url)
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
+
+
+class SingleFlight:
+    """
+    Coalesces identical work in flight. The first caller to claim a key is its
+    leader: it does the work and resolves the key with the outcome. Whoever
+    claims the key before that gets the leader's future instead and waits on it
+    (future.result() in a thread, asyncio.wrap_future() on an event loop).
+    Outcomes aren't kept once resolved; caching is the document cache's job.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def claim(self, key):
+        """Returns (future, leader); 'leader' is True when the caller has to do the work and resolve the key."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def resolve(self, key, future: Future, result=None, error: BaseException = None):
+        """Publishes the leader's result (or error) to the followers and lets the next claim start over."""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def abandon(self, key, future: Future):
+        """Resolves a claimed key whose work won't be done, so its followers do it themselves."""
+        self.resolve(key, future, error=AbandonedError(key))
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+_document_flights = SingleFlight()
+
+
+def get_document_flights() -> SingleFlight:
+    """Returns the single-flight group shared by every request in the process."""
+    return _document_flights
@@ -0,0 +1,289 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.models import ExtractionEngine
+from app.settings import BASE_TMP_DIR
+
+# In AUTO mode, PDFs shorter than this are parsed in the calling thread;
+# below it the cost of spawning work on the pool outweighs the parallelism.
+AUTO_MIN_PAGES = 8
+
+# Each worker receives roughly this many page ranges so slow pages even out
+RANGES_PER_WORKER = 2
+
+PROCESS_WORKERS = os.cpu_count() or 4
+
+# Table finding strategies that only find tables bounded by ruling lines (pdfplumber's default)
+RULED_STRATEGIES = ("lines", "lines_strict")
+
+# Content stream pieces for the ruling pre-filter: strings (whose text could look like
+# operators), inline images (binary data) and path construction operators
+_STRINGS = re.compile(rb"\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>", re.S)
+_INLINE_IMAGE = re.compile(rb"(?<![^\s])BI(?![^\s])")
+_PATH_OPERATOR = re.compile(rb"(?<![A-Za-z_*'\"])(?:re|l|c|v|y)(?![A-Za-z0-9_*'\"])")
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process pool shared by every request, creating it on first use.
+    Workers are spawned (not forked) because the API process is multi-threaded.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def shutdown_process_pool():
+    """Stops the shared process pool so the next call to get_process_pool starts a fresh one."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+class PageScan:
+    """
+    Result of extract_page_tables: the raw tables of every searched page, one
+    list per page in page order, and the pages that weren't searched, by reason:
+    "range" (outside the requested pages), "no_ruling" (the pre-filter ruled
+    tables out) or "limit" (the caller had enough tables before reaching them).
+    With parse limits, pages whose search was aborted are counted by reason too
+    ("timeout", "cpu_limit", "memory_limit" or "crashed") and listed in
+    'aborted' as (page number, reason).
+    """
+
+    def __init__(self, page_count: int):
+        self.page_count = page_count
+        self.tables = []
+        self.skipped = {"range": 0, "no_ruling": 0, "limit": 0}
+        self.aborted = []
+
+    @property
+    def searched(self) -> int:
+        return len(self.tables)
+
+
+def parse_page_ranges(spec: str) -> list:
+    """
+    Parses a page selection such as "1-3,8,10-" (1-based, inclusive; "10-" runs
+    to the last page, "-3" is the first three) into (first, last) pairs, last
+    None for an open end. Raises ValueError for a malformed selection.
+    """
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        first, dash, last = part.partition("-")
+        try:
+            first = int(first) if first.strip() else 1
+            last = (int(last) if last.strip() else None) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part!r}")
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid page range: {part!r}")
+        ranges.append((first, last))
+    return ranges
+
+
+def select_pages(page_count: int, pages: str = None) -> list:
+    """0-based indexes, in order and without repeats, of the pages 'pages' (see parse_page_ranges) selects."""
+    if not pages:
+        return list(range(page_count))
+    selected = set()
+    for first, last in parse_page_ranges(pages):
+        selected.update(range(first - 1, min(page_count, last or page_count)))
+    return sorted(selected)
+
+
+def content_may_draw_ruling(page_obj) -> bool:
+    """
+    Looks for path construction operators (re, l, c, v, y) in a page's raw content
+    streams without interpreting them, which costs a fraction of pdfplumber's
+    layout analysis. False means the page draws no lines, rectangles or curves.
+    Pages drawing through form XObjects or holding inline images are assumed to.
+    """
+    from pdfminer.pdftypes import resolve1
+
+    xobjects = resolve1((page_obj.resources or {}).get("XObject")) or {}
+    for xobject in xobjects.values():
+        if getattr(resolve1(xobject).get("Subtype"), "name", None) == "Form":
+            return True
+    for stream in page_obj.contents or []:
+        data = resolve1(stream).get_data()
+        if _INLINE_IMAGE.search(data):
+            return True
+        if _PATH_OPERATOR.search(_STRINGS.sub(b" ", data)):
+            return True
+    return False
+
+
+def page_may_have_tables(page, table_settings: dict = None) -> bool:
+    """
+    Pre-filter run before table detection: False when the page can't produce a
+    table with any text in it. For the ruled strategies, a page without path
+    operators in its content stream is ruled out before pdfplumber analyzes its
+    layout (most of the cost of a page). Otherwise the page must have characters
+    and, for the ruled strategies, ruling in the direction they need (horizontal
+    lines for rows, any other line for columns, as pdfplumber's line_to_edge
+    sorts them; rectangles and curves count for both). Explicit lines in
+    'table_settings' add ruling the page doesn't draw, so with them every page
+    is searched. It never rules out a page that has tables.
+    """
+    settings = table_settings or {}
+    if settings.get("explicit_vertical_lines") or settings.get("explicit_horizontal_lines"):
+        return True
+    needs_rows = settings.get("horizontal_strategy", "lines") in RULED_STRATEGIES
+    needs_columns = settings.get("vertical_strategy", "lines") in RULED_STRATEGIES
+    if (needs_rows or needs_columns) and not content_may_draw_ruling(page.page_obj):
+        return False
+    if not page.chars:
+        return False
+    if not (needs_rows or needs_columns):
+        return True
+    if page.rects or page.curves:
+        return True
+    has_rows = any(line["top"] == line["bottom"] for line in page.lines)
+    has_columns = any(line["top"] != line["bottom"] for line in page.lines)
+    return (has_rows or not needs_rows) and (has_columns or not needs_columns)
+
+
+def search_page(page, table_settings: dict = None):
+    """page.extract_tables(table_settings), or None when page_may_have_tables rules tables out without running detection."""
+    if not page_may_have_tables(page, table_settings):
+        return None
+    return page.extract_tables(table_settings)
+
+
+def resolve_engine(engine, page_count: int) -> ExtractionEngine:
+    """Turns AUTO into a concrete engine for a document with 'page_count' pages."""
+    engine = ExtractionEngine(engine)
+    if engine != ExtractionEngine.AUTO:
+        return engine
+    if page_count >= AUTO_MIN_PAGES and (os.cpu_count() or 1) > 1:
+        return ExtractionEngine.PROCESSES
+    return ExtractionEngine.THREADS
+
+
+def split_pages(page_count: int, parts: int) -> list:
+    """Splits [0, page_count) into at most 'parts' contiguous (start, stop) ranges."""
+    parts = max(1, min(parts, page_count))
+    size, remainder = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        stop = start + size + (1 if i < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def extract_pages(pdf_path: str, indexes: list, table_settings: dict = None) -> list:
+    """
+    Process pool task: opens the PDF at 'pdf_path' and returns search_page()
+    for every page in 'indexes', one entry per page.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        return [search_page(pdf.pages[i], table_settings) for i in indexes]
+
+
+def extract_page_tables(pdf_file, engine=ExtractionEngine.AUTO, pages: str = None, enough=None,
+                        limits=None, table_settings: dict = None) -> PageScan:
+    """
+    Returns the raw pdfplumber tables of the pages of 'pdf_file' (a binary file
+    object) selected by 'pages' (see parse_page_ranges; None for all), as a
+    PageScan. Pages without ruling or text are skipped before table detection.
+    enough(page_tables), when given, is called with each searched page's tables
+    in page order; once it returns True no further pages are searched.
+    'table_settings' are pdfplumber's (None for its defaults). The result
+    is the same whichever engine does the work. With 'limits' (sandbox.ParseLimits)
+    set, pages are searched in killable sandbox processes that enforce them.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(pdf_file) as pdf:
+        scan = PageScan(len(pdf.pages))
+        indexes = select_pages(scan.page_count, pages)
+        scan.skipped["range"] = scan.page_count - len(indexes)
+        engine = resolve_engine(engine, len(indexes))
+        isolated = limits is not None and limits.enabled
+        if engine == ExtractionEngine.THREADS and not isolated:
+            for position, i in enumerate(indexes):
+                if add_page(scan, search_page(pdf.pages[i], table_settings), enough):
+                    scan.skipped["limit"] = len(indexes) - position - 1
+                    break
+            return scan
+
+    if isolated:
+        from app.services.sandbox import extract_isolated
+        parts = 1 if engine == ExtractionEngine.THREADS else PROCESS_WORKERS
+        return extract_isolated(pdf_file, scan, indexes, limits, parts, enough, table_settings=table_settings)
+    return _extract_in_processes(pdf_file, scan, indexes, enough, table_settings)
+
+
+def add_page(scan: PageScan, tables, enough) -> bool:
+    """Records one page's search_page() result; True when the caller has enough tables."""
+    if tables is None:
+        scan.skipped["no_ruling"] += 1
+        return False
+    scan.tables.append(tables)
+    return bool(enough and enough(tables))
+
+
+def _extract_in_processes(pdf_file, scan: PageScan, indexes: list, enough=None, table_settings: dict = None) -> PageScan:
+    """Copies the PDF to a temp file and fans its page ranges out over the process pool."""
+    os.makedirs(BASE_TMP_DIR, exist_ok=True)
+    pdf_file.seek(0)
+    with tempfile.NamedTemporaryFile(dir=BASE_TMP_DIR, suffix=".pdf", delete=False) as tmp:
+        shutil.copyfileobj(pdf_file, tmp)
+
+    try:
+        try:
+            futures = _submit_ranges(get_process_pool(), tmp.name, indexes, table_settings)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM killed); start over with a healthy pool
+            shutdown_process_pool()
+            futures = _submit_ranges(get_process_pool(), tmp.name, indexes, table_settings)
+
+        # Merge back in submission order, which is page order
+        searched = 0
+        try:
+            for n, future in enumerate(futures):
+                for tables in future.result():
+                    searched += 1
+                    if add_page(scan, tables, enough):
+                        # Enough tables: later ranges that haven't started are cancelled
+                        scan.skipped["limit"] = len(indexes) - searched
+                        for pending in futures[n + 1:]:
+                            pending.cancel()
+                        return scan
+        except BrokenProcessPool:
+            # Don't leave a dead pool behind for the next request
+            shutdown_process_pool()
+            raise
+        return scan
+    finally:
+        os.remove(tmp.name)
+
+
+def _submit_ranges(pool: ProcessPoolExecutor, pdf_path: str, indexes: list, table_settings: dict = None) -> list:
+    """Submits one extract_pages task per run of consecutive selected pages, in page order."""
+    return [
+        pool.submit(extract_pages, pdf_path, indexes[start:stop], table_settings)
+        for start, stop in split_pages(len(indexes), PROCESS_WORKERS * RANGES_PER_WORKER)
+    ]
@@ -0,0 +1,136 @@
+"""
+Typed output: infers integer, decimal, date and categorical columns of an
+extracted (all-string) Arrow table and converts them to compact types:
+int32 (int64 when needed), float32 (float64 when float32 would lose digits),
+date32 and dictionary-encoded strings. Columns that don't type cleanly stay
+Arrow strings. Everything runs column-wise in Arrow compute kernels.
+
+Numbers may carry thousands separators, currency symbols or codes, a
+trailing percent sign (kept in percent units) and accounting-style
+parentheses for negatives; numbers written with leading zeros are taken
+for codes and stay text. The decimal separator is "." or "," (European
+style); "auto" tries "." first and falls back to "," for a column only when
+"." can't parse it.
+"""
+import re
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Cells read as missing in a column that otherwise types as numbers or dates
+MISSING_TOKENS = ["-", "--", "–", "—", "n/a", "N/A", "NA", "na", "null", "None"]
+
+# Currency symbols and ISO codes stripped from numbers
+CURRENCY = r"[$€£¥₹₩₽₺]|\b(?:USD|EUR|GBP|JPY|CHF|CAD|AUD|CNY|INR)\b"
+
+# Characters used to group thousands besides the one that isn't the decimal separator
+GROUP_SPACES = " '   "
+
+# Date formats tried in order; the day-first and month-first slash forms swap
+# places for "," decimal separators, where day-first dates are the norm
+DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%d/%m/%Y", "%d.%m.%Y", "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y"]
+
+# A string column becomes categorical when it has at most this share of distinct values...
+CATEGORY_MAX_RATIO = 0.5
+# ...and at least this many rows, so tiny tables aren't encoded for nothing
+CATEGORY_MIN_ROWS = 8
+
+# Significant digits float32 holds without changing a value's decimal text
+FLOAT32_DIGITS = 7
+
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def infer_types(table: pa.Table, decimal_separator: str = "auto", skip=()) -> pa.Table:
+    """Returns 'table' with every string column not named in 'skip' converted to the most compact type that fits."""
+    if decimal_separator not in ("auto", ".", ","):
+        raise ValueError(f"Unsupported decimal separator: {decimal_separator}")
+    for i, field in enumerate(table.schema):
+        if field.name in skip or not pa.types.is_string(field.type):
+            continue
+        column = infer_column(table.column(i), decimal_separator)
+        if column.type != field.type:
+            table = table.set_column(i, pa.field(field.name, column.type), column)
+    return table
+
+
+def infer_column(column, decimal_separator: str = "auto"):
+    """A string column converted to the first of integer, decimal, date or categorical that fits all its values."""
+    column = _combine(column)
+    trimmed = pc.utf8_trim_whitespace(column)
+    present = pc.and_(pc.is_valid(trimmed), pc.not_equal(trimmed, ""))
+    values = pc.if_else(pc.or_(present, pc.is_null(trimmed)), trimmed, pa.scalar(None, pa.string()))
+    values = pc.if_else(pc.is_in(values, pa.array(MISSING_TOKENS)), pa.scalar(None, pa.string()), values)
+    if values.null_count == len(values):
+        return column
+
+    separators = [".", ","] if decimal_separator == "auto" else [decimal_separator]
+    for separator in separators:
+        numbers = _parse_numbers(values, separator)
+        if numbers is not None:
+            return numbers
+    dates = _parse_dates(values, day_first=decimal_separator == ",")
+    if dates is not None:
+        return dates
+    return _categorical(column)
+
+
+def _combine(column) -> pa.Array:
+    return column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+
+
+def _parse_numbers(values: pa.Array, decimal_separator: str):
+    """'values' as int32/int64/float32/float64, or None if any of them isn't a number in this convention."""
+    group = "." if decimal_separator == "," else ","
+    text = pc.replace_substring_regex(values, CURRENCY, "")
+    text = pc.utf8_trim_whitespace(text)
+    percent = pc.ends_with(text, "%")
+    text = pc.utf8_trim_whitespace(pc.replace_substring_regex(text, r"%$", ""))
+    text = pc.replace_substring_regex(text, r"^\((.*)\)$", r"-\1")
+    text = pc.replace_substring_regex(text, r"^([+-])\s+", r"\1")
+
+    groups = re.escape(group + GROUP_SPACES)
+    dec = re.escape(decimal_separator)
+    pattern = rf"^[+-]?(?:[1-9]\d{{0,2}}(?:[{groups}]\d{{3}})+|\d+)(?:{dec}\d+)?$|^[+-]?{dec}\d+$"
+    if not pc.all(pc.match_substring_regex(text, pattern), skip_nulls=True).as_py():
+        return None
+
+    if pc.any(pc.match_substring_regex(text, r"^[+-]?0\d")).as_py():
+        return None  # leading zeros: codes and identifiers, not quantities
+    plain = pc.replace_substring_regex(text, f"[{groups}]", "")
+    if decimal_separator != ".":
+        plain = pc.replace_substring(plain, decimal_separator, ".")
+    if pc.all(pc.match_substring_regex(plain, r"^[+-]?\d+$"), skip_nulls=True).as_py() and not pc.any(percent).as_py():
+        integers = pc.cast(plain, pa.int64())
+        low, high = pc.min_max(integers).values()
+        if low.as_py() >= INT32_MIN and high.as_py() <= INT32_MAX:
+            return pc.cast(integers, pa.int32())
+        return integers
+
+    numbers = pc.cast(plain, pa.float64())
+    digits = pc.utf8_length(pc.replace_substring_regex(plain, r"^[+-]?0*\.?0*|[^0-9]", ""))
+    if (pc.max(digits).as_py() or 0) <= FLOAT32_DIGITS:
+        return pc.cast(numbers, pa.float32())
+    return numbers
+
+
+def _parse_dates(values: pa.Array, day_first: bool = False):
+    """'values' as date32 in the first format that reads all of them, or None."""
+    formats = list(DATE_FORMATS)
+    if day_first:
+        formats[2], formats[3] = formats[3], formats[2]
+    expected = len(values) - values.null_count
+    for date_format in formats:
+        parsed = pc.strptime(values, format=date_format, unit="s", error_is_null=True)
+        if len(parsed) - parsed.null_count == expected:
+            return pc.cast(parsed, pa.date32())
+    return None
+
+
+def _categorical(column: pa.Array) -> pa.Array:
+    """Dictionary-encoded 'column' when few distinct values repeat, otherwise the column as is."""
+    if len(column) < CATEGORY_MIN_ROWS:
+        return column
+    if pc.count_distinct(column).as_py() > CATEGORY_MAX_RATIO * len(column):
+        return column
+    return column.dictionary_encode()
@@ -1,27 +1,201 @@
-from app.services.scraper import Scraper
-from bs4 import BeautifulSoup
+import os
+import re
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import httpx
 import requests
-from urllib.parse import urljoin
+from app.services.scraper import Scraper
+from app.services.fetcher import get_fetcher, get_async_fetcher
+from app.services.linkparsers import get_link_parser
+from app.services.metrics import DOWNLOADED_BYTES, StageTimings, timed
+from app.settings import CRAWL_CONCURRENCY
+from urllib.parse import urljoin, urldefrag, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Links whose path ends in one of these are treated as pages a crawl may follow
+PAGE_EXTENSIONS = {"", ".html", ".htm", ".php", ".asp", ".aspx", ".jsp"}
+
+
+class CrawlFrontier:
+    """
+    Pages a crawl still has to visit, breadth first. Each URL (without its
+    fragment) is admitted at most once, and at most 'max_pages' pages in total.
+    """
+
+    def __init__(self, start_url: str, max_depth: int = 0, max_pages: int = 1,
+                 same_domain: bool = True, follow_pattern: str = None):
+        self.max_depth = max_depth
+        self.max_pages = max(1, max_pages)
+        self.same_domain = same_domain
+        self.domain = urlparse(start_url).netloc.lower()
+        self.pattern = re.compile(follow_pattern) if follow_pattern else None
+        self.visited = []  # admitted pages, in admission order
+        self._seen = set()
+        self._pending = deque()
+        self.add(start_url, 0)
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    def pop(self):
+        """Next (url, depth) to fetch."""
+        return self._pending.popleft()
+
+    def add(self, url: str, depth: int) -> bool:
+        """Queues a page found at 'depth' if it passes the filters and the budget allows."""
+        url = urldefrag(url)[0]
+        if depth > self.max_depth or url in self._seen or len(self._seen) >= self.max_pages:
+            return False
+        if depth > 0 and not self.allows(url):
+            return False
+        self._seen.add(url)
+        self.visited.append(url)
+        self._pending.append((url, depth))
+        return True
+
+    def allows(self, url: str) -> bool:
+        """Domain, pattern and page-type filters applied to followed links."""
+        parts = urlparse(url)
+        if parts.scheme not in ("http", "https"):
+            return False
+        if self.same_domain and parts.netloc.lower() != self.domain:
+            return False
+        if os.path.splitext(parts.path)[1].lower() not in PAGE_EXTENSIONS:
+            return False
+        return self.pattern is None or self.pattern.search(url) is not None
+
 
 class WebScraper(Scraper):
-    
-    def scrape(self):        
-        # Send an HTTP request to fetch the page content
-        response = requests.get(self.url)
-        response.raise_for_status()
-
-        # Parse the HTML content using BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        if not hasattr(self, 'css_selector') or self.css_selector is None:
-            parsed_data = [
-                urljoin(self.url, a['href']) for a in soup.find_all('a', href=True)
-                if a['href'].endswith(self.file_type.value)
-                ]
-        else:
-            parsed_data = [
-                urljoin(self.url, a['href']) for el in soup.select(self.css_selector)
-                for a in el.find_all('a', href=True) 
-                if a.get('href') and a['href'].endswith(self.file_type.value)
+    # HTML backend name (see linkparsers); None uses WEB_SCRAPER_HTML_PARSER
+    html_parser = None
+
+    def __init__(self, request):
+        super().__init__(request)
+        # Time this scraper spent fetching and parsing pages, for the Server-Timing header
+        self.timings = StageTimings()
+
+    def scrape(self, fetcher=None):
+        """
+        Returns the links to the requested file type on the page, or, with a
+        crawl depth, on every page of the crawl. Pages are fetched concurrently
+        (CRAWL_CONCURRENCY at a time); an HTTP error on the start page is raised,
+        errors on other pages only skip that page.
+        """
+        # Send HTTP requests to fetch the page content (pooled, retried, raises on HTTP errors)
+        fetcher = fetcher or get_fetcher()
+        frontier = self.frontier()
+        pages = {}
+
+        def visit(url):
+            with timed("page_fetch", self.timings):
+                response = fetcher.get(url)
+            DOWNLOADED_BYTES.inc(len(response.content), kind="page")
+            return self._timed_parse(response.text, url)
+
+        with ThreadPoolExecutor(max_workers=CRAWL_CONCURRENCY) as executor:
+            running = {}
+            while frontier.pending or running:
+                while frontier.pending and len(running) < CRAWL_CONCURRENCY:
+                    url, depth = frontier.pop()
+                    running[executor.submit(visit, url)] = (url, depth)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = running.pop(future)
+                    try:
+                        files, links = future.result()
+                    except requests.RequestException as e:
+                        if depth == 0:
+                            raise
+                        logger.warning("Skipping page %s: %s", url, e)
+                        continue
+                    self._visited(frontier, pages, url, depth, files, links)
+
+        return self._found(frontier, pages)
+
+    async def scrape_async(self, fetcher=None):
+        """Same as scrape(), but downloads without blocking the event loop and parses in worker threads."""
+        fetcher = fetcher or get_async_fetcher()
+        frontier = self.frontier()
+        pages = {}
+
+        async def visit(url, depth):
+            try:
+                with timed("page_fetch", self.timings):
+                    response = await fetcher.get(url)
+            except httpx.HTTPError as e:
+                if depth == 0:
+                    raise
+                logger.warning("Skipping page %s: %s", url, e)
+                return
+            DOWNLOADED_BYTES.inc(len(response.content), kind="page")
+            files, links = await asyncio.to_thread(self._timed_parse, response.text, url)
+            self._visited(frontier, pages, url, depth, files, links)
+
+        running = set()
+        while frontier.pending or running:
+            while frontier.pending and len(running) < CRAWL_CONCURRENCY:
+                running.add(asyncio.ensure_future(visit(*frontier.pop())))
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()  # raises the start page's error
+
+        return self._found(frontier, pages)
+
+    def _timed_parse(self, html, url):
+        """parse_page() recorded as the page_parse stage."""
+        with timed("page_parse", self.timings):
+            return self.parse_page(html, url)
+
+    def frontier(self) -> CrawlFrontier:
+        """A frontier holding the start page, configured by the discover request."""
+        return CrawlFrontier(
+            self.url,
+            max_depth=self.crawl_depth,
+            max_pages=self.max_pages if self.crawl_depth else 1,
+            same_domain=self.same_domain,
+            follow_pattern=self.follow_pattern,
+        )
+
+    def _visited(self, frontier: CrawlFrontier, pages: dict, url, depth, files, links):
+        pages[url] = files
+        if depth < frontier.max_depth:
+            for link in links:
+                frontier.add(link, depth + 1)
+        if depth > 0 or frontier.max_depth:
+            logger.info("Crawled %s (depth %d): %d file link(s)", url, depth, len(files))
+
+    def _found(self, frontier: CrawlFrontier, pages: dict) -> list:
+        """File links of all visited pages, without duplicates, in crawl order."""
+        found = {}
+        for url in frontier.visited:
+            for link in pages.get(url, []):
+                found.setdefault(link, None)
+        return list(found)
+
+    def parse_page(self, html, page_url=None):
+        """Returns (file_links, page_links) of 'html': links to the requested file type and to other pages."""
+        page_url = page_url or self.url
+        parser = get_link_parser(self.html_parser, self.css_selector)
+        document = parser.parse(html)
+        files = self._file_links(parser.hrefs(document, self.css_selector), page_url)
+        pages = []
+        if self.crawl_depth:
+            pages = [
+                urljoin(page_url, href) for href in parser.hrefs(document)
+                if not href.endswith(self.file_type.value)
                 ]
-        return parsed_data
\ No newline at end of file
+        return files, pages
+
+    def parse_links(self, html, page_url=None):
+        """Returns the absolute URLs of the links in 'html' that point to the requested file type."""
+        page_url = page_url or self.url
+        parser = get_link_parser(self.html_parser, self.css_selector)
+        return self._file_links(parser.hrefs(parser.parse(html), self.css_selector), page_url)
+
+    def _file_links(self, hrefs, page_url):
+        return [urljoin(page_url, href) for href in hrefs if href.endswith(self.file_type.value)]
@@ -0,0 +1,71 @@
+import os
+
+# All scratch space used by the services lives below this directory
+BASE_TMP_DIR = os.environ.get("WEB_SCRAPER_TMP_DIR", "/tmp/web_scraper")
+
+# Outbound HTTP: timeout per request (seconds), retries on 429/5xx/connection errors,
+# requests in flight per host, and request starts per second per host (0 = unlimited)
+FETCH_TIMEOUT = float(os.environ.get("WEB_SCRAPER_FETCH_TIMEOUT", 10))
+FETCH_MAX_RETRIES = int(os.environ.get("WEB_SCRAPER_FETCH_MAX_RETRIES", 3))
+FETCH_MAX_PER_HOST = int(os.environ.get("WEB_SCRAPER_FETCH_MAX_PER_HOST", 8))
+FETCH_HOST_REQUESTS_PER_SECOND = float(os.environ.get("WEB_SCRAPER_FETCH_HOST_RPS", 0))
+
+# Discovery crawls: pages fetched at the same time (the per-host limits above still apply)
+CRAWL_CONCURRENCY = int(os.environ.get("WEB_SCRAPER_CRAWL_CONCURRENCY", 8))
+
+# HTML backend used to find links: "soup" (BeautifulSoup), "tokenizer", "lxml" or
+# "selectolax"; unavailable ones fall back to "soup"
+HTML_PARSER = os.environ.get("WEB_SCRAPER_HTML_PARSER", "soup")
+
+# Document downloads: bodies are spooled in memory up to DOWNLOAD_SPOOL_BYTES and on disk
+# beyond it, documents over MAX_DOCUMENT_BYTES are refused, and documents being downloaded
+# or parsed may hold at most INFLIGHT_BYTES_BUDGET bytes between them
+DOWNLOAD_SPOOL_BYTES = int(os.environ.get("WEB_SCRAPER_DOWNLOAD_SPOOL_BYTES", 16 * 1024 ** 2))
+MAX_DOCUMENT_BYTES = int(os.environ.get("WEB_SCRAPER_MAX_DOCUMENT_BYTES", 512 * 1024 ** 2))
+INFLIGHT_BYTES_BUDGET = int(os.environ.get("WEB_SCRAPER_INFLIGHT_BYTES_BUDGET", 1024 ** 3))
+
+# Extraction pipeline: PDFs downloaded at the same time (I/O bound), PDFs parsed at the
+# same time (CPU bound, one per core by default), and downloaded PDFs that may wait for
+# a parser before further downloads pause
+DOWNLOAD_WORKERS = int(os.environ.get("WEB_SCRAPER_DOWNLOAD_WORKERS", 32))
+PARSE_WORKERS = int(os.environ.get("WEB_SCRAPER_PARSE_WORKERS", os.cpu_count() or 4))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("WEB_SCRAPER_PIPELINE_QUEUE_SIZE", 8))
+
+# Background jobs: worker threads, jobs allowed to wait in the queue before new ones
+# are refused, how long finished jobs and their results are kept (seconds), and the
+# job store backend ("sqlite" or "memory")
+JOB_WORKERS = int(os.environ.get("WEB_SCRAPER_JOB_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.environ.get("WEB_SCRAPER_JOB_QUEUE_SIZE", 16))
+JOB_RESULT_TTL = float(os.environ.get("WEB_SCRAPER_JOB_RESULT_TTL", 24 * 60 * 60))
+JOB_STORE = os.environ.get("WEB_SCRAPER_JOB_STORE", "sqlite")
+
+# Logging: level of the application's log records ("DEBUG" adds per-document progress)
+LOG_LEVEL = os.environ.get("WEB_SCRAPER_LOG_LEVEL", "INFO").upper()
+
+# Distributed extraction: queue shared with extraction workers (python -m app.worker) that
+# background jobs hand their documents to, "" to extract in this process, "sqlite" (a file
+# in SHARED_DIR) or a redis:// URL; the directory, visible to the API and every worker,
+# holding per-document results; and how long a worker may hold a task without renewing
+# its lease (seconds) before the task is given to another worker
+TASK_QUEUE = os.environ.get("WEB_SCRAPER_TASK_QUEUE", "")
+SHARED_DIR = os.environ.get("WEB_SCRAPER_SHARED_DIR", os.path.join(BASE_TMP_DIR, "shared"))
+TASK_LEASE = float(os.environ.get("WEB_SCRAPER_TASK_LEASE", 300))
+
+# Parse limits for pathological PDFs, 0 for none: wall-clock seconds a whole document /
+# one page may take to parse, CPU seconds likewise (whole seconds), and the memory
+# (bytes) each parsing process may use. With any limit set, documents are parsed in
+# sandbox processes that are killed when they exceed it; the page is reported as aborted
+PARSE_DOCUMENT_TIMEOUT = float(os.environ.get("WEB_SCRAPER_PARSE_DOCUMENT_TIMEOUT", 0))
+PARSE_PAGE_TIMEOUT = float(os.environ.get("WEB_SCRAPER_PARSE_PAGE_TIMEOUT", 0))
+PARSE_DOCUMENT_CPU = float(os.environ.get("WEB_SCRAPER_PARSE_DOCUMENT_CPU", 0))
+PARSE_PAGE_CPU = float(os.environ.get("WEB_SCRAPER_PARSE_PAGE_CPU", 0))
+PARSE_MEMORY_LIMIT = int(os.environ.get("WEB_SCRAPER_PARSE_MEMORY_LIMIT", 0))
+
+# Extraction profiles: regular expressions (whitespace separated) grouping document URLs
+# into sources that share one auto-tuned table-settings profile; URLs matching none are
+# grouped by host
+PROFILE_PATTERNS = os.environ.get("WEB_SCRAPER_PROFILE_PATTERNS", "").split()
+# Seconds a source's tuned profile (or the finding that none suits it) is kept before
+# its next document is tuned again; 0 keeps it for good (a tuned profile that stops finding
+# valid headers is still dropped)
+PROFILE_TTL = float(os.environ.get("WEB_SCRAPER_PROFILE_TTL", 7 * 24 * 3600))
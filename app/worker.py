@@ -0,0 +1,67 @@
+"""
+Extraction worker: takes per-document tasks queued by background jobs from
+the task queue and writes their results to the shared result directory (see
+app.services.distributed). Start as many as the machines have cores for,
+on any machine that reaches the queue and WEB_SCRAPER_SHARED_DIR.
+
+    python -m app.worker --queue sqlite --processes 4
+    python -m app.worker --queue redis://queue-host:6379/0
+"""
+import argparse
+import signal
+import logging
+import threading
+import multiprocessing
+
+from app.logconfig import configure_logging, shutdown_logging
+from app.services.distributed import RESULTS_DIR, ExtractionWorker, ResultStore, get_task_queue
+from app.settings import TASK_QUEUE, TASK_LEASE
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(queue_spec: str, results_dir: str, lease: float):
+    """Runs one worker until interrupted; SIGTERM lets it finish its current task first."""
+    configure_logging()
+    worker = ExtractionWorker(get_task_queue(queue_spec), ResultStore(results_dir), lease)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    logger.info("Extraction worker started on %s", queue_spec)
+    try:
+        worker.run(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_logging()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queue", default=TASK_QUEUE or "sqlite", help="task queue: sqlite, sqlite:///path or a redis:// URL")
+    parser.add_argument("--results-dir", default=RESULTS_DIR, help="shared result directory")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to run")
+    parser.add_argument("--lease", type=float, default=TASK_LEASE, help="seconds a task is held between lease renewals")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(args.queue, args.results_dir, args.lease)
+        return
+    # Spawned, like the table engine's pool, so every worker starts from a clean interpreter
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(args.queue, args.results_dir, args.lease), name=f"extraction-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: [process.terminate() for process in processes])
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
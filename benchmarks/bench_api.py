@@ -0,0 +1,218 @@
+"""
+End-to-end benchmark of /files/discover, /files/extract and /files/collect.
+A synthetic corpus (see corpus.py) is served from a local HTTP server; the
+API runs under uvicorn in a fresh process per endpoint so each endpoint's peak
+RSS is measured on its own. Every response is checked against the corpus
+(links found, data rows extracted) before throughput, latency percentiles and
+peak RSS are reported.
+
+    python -m benchmarks.bench_api --documents 20 --requests 5 --concurrency 2
+    python -m benchmarks.bench_api --output before.json
+    python -m benchmarks.bench_api --baseline before.json   # exits 1 on a regression
+
+Peak RSS is the API process's high-water mark (VmHWM, Linux only); process
+pool workers used by the "processes" engine are not included.
+"""
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pandas as pd
+
+from benchmarks.corpus import build_corpus, serve_directory
+
+ENDPOINTS = ("discover", "extract", "collect")
+
+# Arguments that must match for a comparison with a baseline to mean anything
+WORKLOAD_ARGUMENTS = ("documents", "max_pages", "max_tables", "narrative", "listing_pages", "filler_rows",
+                      "concurrency", "engine", "cache", "seed")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ApiServer:
+    """The application under uvicorn in a child process, with its scratch space in 'tmp_dir'."""
+
+    def __init__(self, tmp_dir: str, env: dict = None):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.env = dict(os.environ, WEB_SCRAPER_TMP_DIR=tmp_dir, WEB_SCRAPER_LOG_LEVEL="WARNING", **(env or {}))
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(self.port), "--log-level", "warning"],
+            env=self.env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f"{self.base_url}/metrics").status_code == 200:
+                    return self
+            except httpx.TransportError:
+                time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError("The API server didn't start")
+
+    def peak_rss(self):
+        """High-water mark of the server's resident memory in bytes, or None where /proc isn't available."""
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of 'values'."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def request_bodies(base_url: str, args) -> dict:
+    discover = {"url": f"{base_url}/index.html"}
+    if args.listing_pages > 1:
+        discover.update(crawl_depth=1, max_pages=args.listing_pages + 1, follow_pattern=r"/list-\d+\.html$")
+    extract = {"output_format": "csv", "engine": args.engine, "use_cache": args.cache}
+    return {
+        "discover": discover,
+        "extract": dict(extract, document_urls=None),  # filled in from the corpus
+        "collect": {"discover": discover, "extract": extract},
+    }
+
+
+def check(endpoint: str, response: httpx.Response, expected_links: set, expected_rows: int):
+    """Raises AssertionError when a response doesn't match the corpus."""
+    assert response.status_code == 200, f"{endpoint}: HTTP {response.status_code}"
+    if endpoint == "discover":
+        found = set(response.json()["document_urls"])
+        assert found == expected_links, f"discover: found {len(found)} of {len(expected_links)} documents"
+    else:
+        assert response.headers["content-type"].startswith("text/csv"), f"{endpoint}: {response.text[:200]}"
+        rows = len(pd.read_csv(io.BytesIO(response.content)))
+        assert rows == expected_rows, f"{endpoint}: {rows} rows extracted, expected {expected_rows}"
+
+
+def run_endpoint(endpoint: str, body: dict, args, expected_links: set, expected_rows: int, documents: int) -> dict:
+    """Runs the endpoint's requests against a fresh API process and summarizes them."""
+    with tempfile.TemporaryDirectory(prefix="bench_api_") as tmp_dir, ApiServer(tmp_dir) as server:
+        with httpx.Client(base_url=server.base_url, timeout=None) as client:
+            def call(_):
+                start = time.perf_counter()
+                response = client.post(f"/files/{endpoint}", json=body)
+                elapsed = time.perf_counter() - start
+                check(endpoint, response, expected_links, expected_rows)
+                return elapsed
+
+            call(None)  # warm-up: imports, pools, first connections
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                latencies = list(pool.map(call, range(args.requests)))
+            wall = time.perf_counter() - start
+        peak_rss = server.peak_rss()
+
+    return {
+        "requests": args.requests,
+        "requests_per_second": args.requests / wall,
+        "documents_per_second": args.requests * documents / wall if endpoint != "discover" else None,
+        "p50": percentile(latencies, 0.50),
+        "p90": percentile(latencies, 0.90),
+        "p99": percentile(latencies, 0.99),
+        "peak_rss": peak_rss,
+    }
+
+
+def report(results: dict, baseline: dict = None, tolerance: float = 0.2) -> bool:
+    """Prints the results (and the change from 'baseline'); False when throughput regressed beyond 'tolerance'."""
+    ok = True
+    print(f"\n{'endpoint':>10} {'req/s':>8} {'docs/s':>8} {'p50 s':>8} {'p90 s':>8} {'p99 s':>8} {'peak RSS':>10}")
+    for endpoint, result in results.items():
+        docs = f"{result['documents_per_second']:8.2f}" if result["documents_per_second"] else f"{'-':>8}"
+        rss = f"{result['peak_rss'] / 1024 ** 2:8.0f}MB" if result["peak_rss"] else f"{'n/a':>10}"
+        line = (f"{endpoint:>10} {result['requests_per_second']:8.2f} {docs} "
+                f"{result['p50']:8.3f} {result['p90']:8.3f} {result['p99']:8.3f} {rss}")
+        before = (baseline or {}).get(endpoint)
+        if before:
+            change = result["requests_per_second"] / before["requests_per_second"] - 1
+            line += f"  throughput {change:+.0%} vs baseline"
+            if change < -tolerance:
+                line += "  REGRESSION"
+                ok = False
+        print(line)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20, help="PDFs in the corpus")
+    parser.add_argument("--max-pages", type=int, default=10, help="most pages per PDF")
+    parser.add_argument("--max-tables", type=int, default=2, help="most tables per PDF page")
+    parser.add_argument("--narrative", type=float, default=0.0, help="share of PDF pages that are narrative text")
+    parser.add_argument("--listing-pages", type=int, default=1, help="listing pages the links are spread over (>1 crawls)")
+    parser.add_argument("--filler-rows", type=int, default=2000, help="rows of unrelated links per listing page")
+    parser.add_argument("--requests", type=int, default=5, help="timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once")
+    parser.add_argument("--engine", default="auto", choices=["auto", "threads", "processes"])
+    parser.add_argument("--cache", action="store_true", help="let the extractor reuse cached results (off by default)")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="throughput drop counted as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_corpus_") as root:
+        corpus = build_corpus(root, args.documents, args.listing_pages, args.filler_rows,
+                              args.max_pages, args.max_tables, narrative=args.narrative, seed=args.seed)
+        expected_rows = sum(document.data_rows for document in corpus)
+        pages = sum(len(document.pages) for document in corpus)
+        print(f"Corpus: {len(corpus)} PDFs, {pages} pages, {expected_rows:,} data rows, {args.listing_pages} listing page(s)")
+
+        with serve_directory(root) as base_url:
+            links = {f"{base_url}/docs/{document.name}.pdf" for document in corpus}
+            bodies = request_bodies(base_url, args)
+            bodies["extract"]["document_urls"] = sorted(links)
+            results = {}
+            for endpoint in args.endpoints:
+                print(f"Benchmarking /files/{endpoint} ...")
+                results[endpoint] = run_endpoint(endpoint, bodies[endpoint], args, links, expected_rows, len(corpus))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        differing = [name for name in WORKLOAD_ARGUMENTS if saved["arguments"].get(name) != getattr(args, name)]
+        if differing:
+            print(f"Warning: the baseline ran a different workload ({', '.join(differing)})")
+    ok = report(results, baseline, args.tolerance)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"arguments": vars(args), "results": results}, f, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares the row-by-row header filters PDFExtractor used to run with the
+column-wise versions it uses now, on synthetic tables.
+
+    python -m benchmarks.bench_header_filters --rows 1000000
+"""
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from app.services.pdfextractor import PDFExtractor
+
+HEADER = ["ID", "Column 1", "Column 2", "Column 3", "Column 4", "Column 5", "Column 6", "Column7"]
+
+
+def make_table(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Text cells with some empty/None cells and a repeated header row every 50 rows."""
+    rng = random.Random(seed)
+    words = ["X", "XXX", "ZZZ", "26", "773.43", "co\nlumn", " Col ", "", None]
+    data = []
+    for i in range(rows):
+        if i % 50 == 0:
+            data.append(["ID", "Column\n1", "Column  2", "Column 3", "Column 4", "Column 5", "Column 6", "Column7"])
+        else:
+            data.append([f"{rng.randint(100, 99999)} 00{i % 7}"] + [rng.choice(words) for _ in HEADER[1:]])
+    df = pd.DataFrame(data)
+    df.columns = HEADER
+    return df
+
+
+def rowwise_header_row_mask(extractor: PDFExtractor, df: pd.DataFrame, header) -> pd.Series:
+    """The original per-row lambda from fetch_and_extract."""
+    row_tuples = df.astype(str).apply(
+        lambda r: tuple(extractor.clean_header(x) for x in r),
+        axis=1
+    )
+    return row_tuples == tuple(header)
+
+
+def rowwise_header_like_mask(df: pd.DataFrame) -> pd.Series:
+    """The original row_starts_like_header apply from extract."""
+    def row_starts_like_header(row, col_headers):
+        for cell_value, col_name in zip(row, col_headers):
+            cell_str = str(cell_value).strip().lower()
+            col_start = str(col_name).strip().lower()[:2]
+            if not cell_str.startswith(col_start):
+                return False
+        return True
+
+    return df.apply(lambda r: row_starts_like_header(r, df.columns), axis=1)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    extractor = PDFExtractor()
+    df = make_table(args.rows)
+    cleaned = df.replace("", pd.NA)
+    print(f"Synthetic table: {len(df):,} rows x {len(df.columns)} columns")
+
+    cases = [
+        ("exact header rows", lambda: rowwise_header_row_mask(extractor, df, HEADER),
+         lambda: extractor.header_row_mask(df, tuple(HEADER))),
+        ("header-like rows", lambda: rowwise_header_like_mask(cleaned),
+         lambda: extractor.header_like_mask(cleaned)),
+    ]
+    for name, rowwise, vectorized in cases:
+        expected, rowwise_secs = timed(rowwise)
+        actual, vectorized_secs = timed(vectorized)
+        assert expected.tolist() == actual.tolist(), f"{name}: results differ"
+        print(
+            f"{name:>18}: row-wise {rowwise_secs:7.2f}s  vectorized {vectorized_secs:7.2f}s  "
+            f"speed-up {rowwise_secs / vectorized_secs:5.1f}x  ({int(actual.sum()):,} rows matched)"
+        )
+
+
+if __name__ == "__main__":
+    main()
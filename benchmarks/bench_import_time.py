@@ -0,0 +1,136 @@
+"""
+Cold-start benchmark: how long importing each entry point takes in a fresh
+interpreter, measured with `python -X importtime`, and which heavy
+dependencies it loads. Heavy dependencies only some code paths need (pandas,
+pdfplumber/pdfminer, BeautifulSoup, Parquet) are imported on those paths, so
+an entry point that loads one at import time fails the run.
+
+    python -m benchmarks.bench_import_time --runs 10
+    python -m benchmarks.bench_import_time --output before.json
+    python -m benchmarks.bench_import_time --baseline before.json   # exits 1 on a regression
+
+"api" is the API process (uvicorn imports app.main), "worker" an extraction
+worker, "cli" the batch CLI and "pool" a respawned table-engine process pool
+worker, which only imports the module holding its task function.
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+TARGETS = {
+    "api": "app.main",
+    "worker": "app.worker",
+    "cli": "app.cli",
+    "pool": "app.services.tableengine",
+}
+
+# Modules no entry point may import before it needs them
+DEFERRED = ("pandas", "pdfplumber", "pdfminer", "bs4", "pyarrow.parquet")
+
+# Deferred modules an entry point needs anyway (the batch CLI always writes Parquet)
+NEEDED = {"cli": ("pyarrow.parquet",)}
+
+
+def import_profile(module: str) -> list:
+    """(self µs, cumulative µs, indentation level, module) of every import made by 'import module' in a fresh interpreter."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        imports.append((int(own), int(cumulative), level, name.strip()))
+    return imports
+
+
+def measure(module: str, runs: int) -> dict:
+    """Median and best total import time of 'module' over 'runs' fresh interpreters, its heaviest packages and what it loaded."""
+    totals = []
+    packages = {}
+    loaded = set()
+    for _ in range(runs):
+        imports = import_profile(module)
+        # -X importtime lists an import after everything it imported: the target's
+        # own imports follow the previous top-level entry (interpreter startup)
+        end = next(i for i, (_, _, level, name) in enumerate(imports) if level == 0 and name == module)
+        start = max((i + 1 for i, (_, _, level, _) in enumerate(imports[:end]) if level == 0), default=0)
+        imports = imports[start:end + 1]
+        totals.append(imports[-1][1])
+        loaded.update(name for _, _, _, name in imports)
+        for _, cumulative, _, name in imports:
+            # Top-level packages outside the application, e.g. "fastapi" or "pyarrow"
+            if "." not in name and name != "app" and cumulative >= packages.get(name, 0):
+                packages[name] = cumulative
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "median_ms": statistics.median(totals) / 1000,
+        "best_ms": min(totals) / 1000,
+        "heaviest": {name: cumulative / 1000 for name, cumulative in heaviest},
+        "loaded": sorted(loaded),
+    }
+
+
+def eager_imports(target: str, result: dict) -> list:
+    """DEFERRED modules (or their submodules) 'target' imported without needing them."""
+    allowed = NEEDED.get(target, ())
+    return sorted(
+        module for module in DEFERRED
+        if module not in allowed and any(name == module or name.startswith(f"{module}.") for name in result["loaded"])
+    )
+
+
+def report(results: dict, baseline: dict = None, tolerance: float = 0.2) -> bool:
+    """Prints the results (and the change from 'baseline'); False on an eager heavy import or a slowdown beyond 'tolerance'."""
+    ok = True
+    print(f"\n{'target':>8} {'module':>26} {'median ms':>10} {'best ms':>8}  heaviest packages (cumulative ms)")
+    for target, result in results.items():
+        heaviest = ", ".join(f"{name} {ms:.0f}" for name, ms in result["heaviest"].items())
+        line = f"{target:>8} {TARGETS[target]:>26} {result['median_ms']:10.1f} {result['best_ms']:8.1f}  {heaviest}"
+        before = (baseline or {}).get(target)
+        if before:
+            change = result["median_ms"] / before["median_ms"] - 1
+            line += f"  {change:+.0%} vs baseline"
+            if change > tolerance:
+                line += "  REGRESSION"
+                ok = False
+        print(line)
+        eager = eager_imports(target, result)
+        if eager:
+            print(f"{'':>8} imports {', '.join(eager)} at startup  REGRESSION")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=TARGETS)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="import time increase counted as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.targets:
+        print(f"Importing {TARGETS[target]} ...")
+        results[target] = measure(TARGETS[target], args.runs)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    ok = report(results, baseline, args.tolerance)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"arguments": vars(args), "results": results}, f, indent=2)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares the HTML backends WebScraper can use for link discovery on large
+synthetic listing pages, with and without a CSS selector. Backends whose
+library isn't installed are reported and skipped.
+
+    python -m benchmarks.bench_link_parsers --rows 40000
+"""
+import argparse
+import random
+import time
+
+from app.services.linkparsers import LINK_PARSERS, SoupLinkParser
+
+SELECTOR = "#reports td.doc"
+
+
+def make_page(rows: int, seed: int = 0) -> str:
+    """A listing table with PDF and page links in every row, plus comments, scripts and navigation around it."""
+    rng = random.Random(seed)
+    parts = ['<html><head><title>Archive</title><style>a[href$=".pdf"] { color: red; }</style></head><body>']
+    parts.append('<nav>' + "".join(f'<a href="/archive?page={i}">{i}</a>' for i in range(1, 51)) + '</nav>')
+    parts.append('<table id="reports">')
+    for i in range(rows):
+        words = " ".join(rng.choice(["annual", "report", "fiscal", "summary", "Q1", "Q2"]) for _ in range(rng.randint(3, 12)))
+        parts.append(
+            f'<tr class="row-{i % 5}"><td>{i}</td><td class="doc"><a href="/files/report-{i}.pdf?v=1&amp;lang=en">{words}</a></td>'
+            f'<td><a href="reports/{i}.html" title="Details">details</a><span>{rng.randint(1, 10 ** 6)} KB</span></td></tr>'
+        )
+        if i % 100 == 0:
+            parts.append('<!-- <a href="/hidden.pdf">hidden</a> --><script>var link = "<a href=\\"/script.pdf\\">";</script>')
+    parts.append('</table><footer><a href="/contact.html">Contact</a></footer></body></html>')
+    return "".join(parts)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=40_000)
+    args = parser.parse_args()
+
+    html = make_page(args.rows)
+    print(f"Synthetic page: {len(html) / 1024 ** 2:.1f} MB, {args.rows:,} table rows")
+
+    for selector in (None, SELECTOR):
+        reference = SoupLinkParser()
+        expected, soup_secs = timed(lambda: reference.hrefs(reference.parse(html), selector))
+        print(f"\ncss_selector={selector!r}: {len(expected):,} links")
+        print(f"{'soup':>12}: {soup_secs:7.2f}s")
+
+        for name, backend in LINK_PARSERS.items():
+            if name == "soup":
+                continue
+            if not backend.available():
+                print(f"{name:>12}: not installed")
+                continue
+            link_parser = backend()
+            if selector is not None and not link_parser.supports_selectors:
+                print(f"{name:>12}: no CSS selector support (falls back)")
+                continue
+            actual, secs = timed(lambda: link_parser.hrefs(link_parser.parse(html), selector))
+            assert actual == expected, f"{name}: link list differs from BeautifulSoup"
+            print(f"{name:>12}: {secs:7.2f}s  speed-up {soup_secs / secs:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Synthetic corpus for the API benchmarks: PDFs with ruled tables (varying page
+counts, tables per page, column counts and repeated or one-off headers) mixed
+with narrative text pages, and HTML listing pages linking to them, written to a directory and served by a
+local HTTP server standing in for a real website.
+
+    python -m benchmarks.corpus /tmp/corpus --documents 20   # write a corpus and serve it
+"""
+import os
+import random
+import argparse
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 36
+ROW_HEIGHT = 14
+TABLE_GAP = 20
+FONT_SIZE = 7
+
+NARRATIVE_WORDS = ["the", "fiscal", "year", "report", "summary", "revenue", "growth", "region", "of", "and", "in"]
+
+COLUMN_NAMES = ["Code", "Region", "Amount", "Quantity", "Rate", "Balance", "Period", "Status", "Total", "Notes"]
+
+
+class SyntheticDocument:
+    """The tables of one generated PDF, page by page, and the data rows an extraction should return."""
+
+    def __init__(self, name: str, pages: list, header: list):
+        self.name = name
+        self.pages = pages  # pages -> tables -> rows -> cells, header rows included; narrative pages are lines of text
+        self.header = header
+
+    @property
+    def data_rows(self) -> int:
+        return sum(
+            len(table) - (1 if table[0] == self.header else 0)
+            for tables in self.pages if not isinstance(tables, str) for table in tables
+        )
+
+
+def make_document(name: str, rng: random.Random, max_pages: int = 10, max_tables: int = 2,
+                  columns=(4, 6, 8), repeat_header: bool = None, narrative: float = 0.0) -> SyntheticDocument:
+    """
+    A document with 1..max_pages pages of 1..max_tables tables each, where each
+    page is instead a narrative text page (no tables) with probability 'narrative'.
+    With a repeated header every table starts with the header row; otherwise only
+    the first table does and the others continue it.
+    """
+    width = rng.choice(columns)
+    header = COLUMN_NAMES[:width]
+    repeat_header = rng.random() < 0.5 if repeat_header is None else repeat_header
+    pages = []
+    header_written = False
+    for page in range(rng.randint(1, max_pages)):
+        if rng.random() < narrative:
+            lines = (PAGE_HEIGHT - 2 * MARGIN) // ROW_HEIGHT
+            pages.append("\n".join(" ".join(rng.choice(NARRATIVE_WORDS) for _ in range(16)) for _ in range(lines)))
+            continue
+        table_count = rng.randint(1, max_tables)
+        available_rows = (PAGE_HEIGHT - 2 * MARGIN - (table_count - 1) * TABLE_GAP) // ROW_HEIGHT
+        tables = []
+        for table in range(table_count):
+            rows = [list(header)] if repeat_header or not header_written else []
+            header_written = True
+            for row in range(rng.randint(2, available_rows // table_count) - len(rows)):
+                rows.append([f"{name.upper()}-P{page}T{table}R{row}"] + [
+                    f"{rng.uniform(0, 10 ** rng.randint(1, 6)):.2f}" for _ in header[1:]
+                ])
+            tables.append(rows)
+        pages.append(tables)
+    return SyntheticDocument(name, pages, header)
+
+
+def _pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _narrative_content(text: str) -> bytes:
+    """Text operators for a page of narrative lines, without any ruling."""
+    ops = ["BT", f"/F1 {FONT_SIZE + 2} Tf"]
+    for i, line in enumerate(text.split("\n")):
+        ops.append(f"1 0 0 1 {MARGIN} {PAGE_HEIGHT - MARGIN - (i + 1) * ROW_HEIGHT} Tm ({_pdf_text(line)}) Tj")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def _page_content(tables: list) -> bytes:
+    """Drawing operators for a page of ruled tables, stacked from the top margin down."""
+    ops = ["0.5 w"]
+    text = ["BT", f"/F1 {FONT_SIZE} Tf"]
+    top = PAGE_HEIGHT - MARGIN
+    for rows in tables:
+        columns = len(rows[0])
+        cell_width = (PAGE_WIDTH - 2 * MARGIN) / columns
+        bottom = top - len(rows) * ROW_HEIGHT
+        for i in range(len(rows) + 1):
+            y = top - i * ROW_HEIGHT
+            ops.append(f"{MARGIN} {y} m {PAGE_WIDTH - MARGIN} {y} l S")
+        for j in range(columns + 1):
+            x = MARGIN + j * cell_width
+            ops.append(f"{x:.2f} {top} m {x:.2f} {bottom} l S")
+        for i, row in enumerate(rows):
+            y = top - (i + 1) * ROW_HEIGHT + 4
+            for j, cell in enumerate(row):
+                text.append(f"1 0 0 1 {MARGIN + j * cell_width + 2:.2f} {y} Tm ({_pdf_text(cell)}) Tj")
+        top = bottom - TABLE_GAP
+    text.append("ET")
+    return "\n".join(ops + text).encode("latin-1")
+
+
+def make_pdf(document: SyntheticDocument) -> bytes:
+    """Writes the document as a minimal PDF (Helvetica text, line-drawn table rules) pdfplumber can read."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for tables in document.pages:
+        content = _narrative_content(tables) if isinstance(tables, str) else _page_content(tables)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_listing(links: list, filler_rows: int, rng: random.Random, title: str = "Reports") -> str:
+    """A listing page: a table of document links mixed into 'filler_rows' rows of other links and text."""
+    parts = [f'<html><head><title>{title}</title></head><body><nav>']
+    parts.append("".join(f'<a href="/archive?page={i}">{i}</a>' for i in range(1, 21)) + '</nav><table id="reports">')
+    every = max(1, filler_rows // max(1, len(links)))
+    pending = list(links)
+    for i in range(max(filler_rows, len(links))):
+        words = " ".join(rng.choice(["annual", "report", "fiscal", "summary", "Q1", "Q2"]) for _ in range(rng.randint(3, 10)))
+        cell = f'<a href="{pending.pop(0)}">{words}</a>' if pending and i % every == 0 else words
+        parts.append(
+            f'<tr><td>{i}</td><td class="doc">{cell}</td>'
+            f'<td><a href="details/{i}.html">details</a> <span>{rng.randint(1, 10 ** 6)} KB</span></td></tr>'
+        )
+    parts.append('</table><footer><a href="/contact.html">Contact</a></footer></body></html>')
+    return "".join(parts)
+
+
+def build_corpus(root: str, documents: int = 20, listing_pages: int = 1, filler_rows: int = 2000,
+                 max_pages: int = 10, max_tables: int = 2, columns=(4, 6, 8), narrative: float = 0.0,
+                 seed: int = 0) -> list:
+    """
+    Writes docs/<name>.pdf for every document and index.html under 'root'.
+    With more than one listing page, index.html links to list-<k>.html pages
+    that share the documents between them (a discovery crawl of depth 1).
+    Returns the SyntheticDocuments in listing order.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(root, "docs"), exist_ok=True)
+    corpus = []
+    for i in range(documents):
+        document = make_document(f"doc{i}", rng, max_pages, max_tables, columns, narrative=narrative)
+        with open(os.path.join(root, "docs", f"{document.name}.pdf"), "wb") as f:
+            f.write(make_pdf(document))
+        corpus.append(document)
+
+    links = [f"/docs/{document.name}.pdf" for document in corpus]
+    if listing_pages <= 1:
+        pages = {"index.html": links}
+    else:
+        pages = {f"list-{k}.html": links[k::listing_pages] for k in range(listing_pages)}
+        pages["index.html"] = list(pages)
+    for name, page_links in pages.items():
+        with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+            f.write(make_listing(page_links, filler_rows, rng, title=name))
+    return corpus
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_directory(root: str):
+    """Serves 'root' over HTTP on a free local port in a background thread; yields the base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=root))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="corpus-server", daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--listing-pages", type=int, default=1)
+    parser.add_argument("--max-pages", type=int, default=10)
+    parser.add_argument("--narrative", type=float, default=0.0, help="share of pages that are narrative text")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.root, args.documents, args.listing_pages, max_pages=args.max_pages,
+                          narrative=args.narrative, seed=args.seed)
+    print(f"{len(corpus)} documents, {sum(d.data_rows for d in corpus):,} data rows")
+    with serve_directory(args.root) as base_url:
+        print(f"Serving {args.root} at {base_url}/index.html (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
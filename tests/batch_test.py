@@ -0,0 +1,79 @@
+import os
+import shutil
+import zipfile
+import pytest
+import pandas as pd
+import pyarrow.parquet as pq
+from unittest.mock import patch
+from app import cli
+from app.services.batch import ARCHIVE_SEPARATOR, expand_inputs, run_batch, write_partitions
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Two copies of the test PDF in a directory tree and one in a zip archive."""
+    source = "tests/mock_data/pdfs/test_tables.pdf"
+    os.makedirs(tmp_path / "pdfs" / "sub")
+    shutil.copy(source, tmp_path / "pdfs" / "a.pdf")
+    shutil.copy(source, tmp_path / "pdfs" / "sub" / "b.pdf")
+    (tmp_path / "pdfs" / "notes.txt").write_text("not a pdf")
+    with zipfile.ZipFile(tmp_path / "archive.zip", "w") as archive:
+        archive.write(source, "2024/c.pdf")
+    return tmp_path
+
+def test_inputs_expand_directories_globs_archives_and_manifests(corpus):
+    a, b = str(corpus / "pdfs" / "a.pdf"), str(corpus / "pdfs" / "sub" / "b.pdf")
+    member = f"{corpus / 'archive.zip'}{ARCHIVE_SEPARATOR}2024/c.pdf"
+    manifest = corpus / "manifest.txt"
+    manifest.write_text("# backfill\npdfs/sub/b.pdf\n\narchive.zip\n")
+
+    assert expand_inputs([str(corpus / "pdfs")]) == [a, b]
+    assert expand_inputs([str(corpus / "**" / "*.pdf"), a]) == [a, b]
+    assert expand_inputs([a], [str(manifest)]) == [a, b, member]
+    with pytest.raises(FileNotFoundError):
+        expand_inputs([str(corpus / "missing.pdf")])
+
+def test_batch_output_matches_truth_and_resumes(corpus):
+    truth = pd.read_csv("tests/truth/test_tables.csv", dtype=str)
+    documents = expand_inputs([str(corpus / "pdfs"), str(corpus / "archive.zip")])
+    checkpoint, output = str(corpus / "checkpoint"), str(corpus / "out")
+
+    states = []
+    extracted = run_batch(documents, checkpoint, processes=1, progress=lambda document, state: states.append(state))
+    assert states == ["extracted"] * 3
+    paths = write_partitions(extracted, checkpoint, output, partition_rows=150)
+    assert [os.path.basename(path) for path in paths] == ["part-00000.parquet", "part-00001.parquet"]
+
+    merged = pq.read_table(output).to_pandas()
+    expected = pd.concat([truth] * 3, ignore_index=True)
+    pd.testing.assert_frame_equal(merged.fillna(""), expected.fillna(""))
+
+    # A second run only extracts what changed since the checkpoint
+    shutil.copy(documents[0], corpus / "pdfs" / "sub" / "b.pdf")
+    os.utime(corpus / "pdfs" / "sub" / "b.pdf", ns=(0, 0))
+    progress = {}
+    resumed = run_batch(documents, checkpoint, processes=1, progress=progress.__setitem__)
+    assert [progress[document] for document in documents] == ["skipped", "extracted", "skipped"]
+    assert [document for document, _ in resumed] == documents
+    assert resumed[1][1] != extracted[1][1]
+
+def test_failed_parse_is_retried_on_resume(corpus):
+    documents = expand_inputs([str(corpus / "pdfs")])
+    checkpoint = str(corpus / "checkpoint")
+
+    progress = {}
+    with patch("app.services.pdfextractor.extract_page_tables", side_effect=RuntimeError("transient")):
+        assert run_batch(documents, checkpoint, processes=1, progress=progress.__setitem__) == []
+    assert set(progress.values()) == {"failed"}
+
+    progress = {}
+    resumed = run_batch(documents, checkpoint, processes=1, progress=progress.__setitem__)
+    assert set(progress.values()) == {"extracted"}
+    assert [document for document, _ in resumed] == documents
+
+def test_cli_writes_parquet_parts(corpus):
+    output = corpus / "out"
+    assert cli.main([str(corpus / "pdfs"), "--output", str(output), "--processes", "1", "--compression", "zstd"]) == 0
+    assert len(pq.read_table(output)) == 200
+    assert pq.ParquetFile(output / "part-00000.parquet").metadata.row_group(0).column(0).compression == "ZSTD"
+    with pytest.raises(SystemExit):
+        cli.main([str(corpus / "pdfs"), "--output", str(output), "--pages", "x"])
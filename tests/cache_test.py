@@ -0,0 +1,95 @@
+import io
+import asyncio
+import httpx
+import pytest
+import pandas as pd
+from unittest.mock import patch, MagicMock
+from app.models.datatypes import OutputFormat
+from app.services.cache import DocumentCache
+from app.services.downloads import Download
+from app.services.fetcher import AsyncFetcher
+from app.services.pdfextractor import PDFExtractor
+
+@pytest.fixture
+def pdf_content():
+    with open("tests/mock_data/pdfs/test_tables.pdf", "rb") as f:
+        return f.read()
+
+def _download(content):
+    download = Download("http://example.com/doc.pdf", 200, {})
+    download.write(content)
+    download.finish()
+    return download
+
+@pytest.fixture
+def cache(tmp_path):
+    return DocumentCache(root=str(tmp_path / "cache"))
+
+def test_unchanged_document_is_revalidated_and_not_reparsed(pdf_content, cache):
+    """A 304 answer to the conditional GET must reuse the cached extraction result."""
+    seen_headers = []
+
+    def handler(request):
+        seen_headers.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=pdf_content, headers={"ETag": '"v1"'})
+
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    extractor = PDFExtractor(cache=cache)
+    urls = ["http://example.com/test_tables.pdf"]
+
+    first, _, _ = asyncio.run(extractor.extract_async(urls, OutputFormat.CSV.value, fetcher=fetcher))
+    with patch.object(PDFExtractor, "extract_document") as mock_extract:
+        second, _, _ = asyncio.run(extractor.extract_async(urls, OutputFormat.CSV.value, fetcher=fetcher))
+        mock_extract.assert_not_called()
+
+    assert "if-none-match" not in seen_headers[0]
+    assert seen_headers[1]["if-none-match"] == '"v1"'
+    assert first.getvalue() == second.getvalue()
+
+def test_same_content_at_new_url_is_not_reparsed(pdf_content, cache):
+    """Results are keyed by content hash, so a copy of a known PDF skips parsing."""
+    with patch('requests.Session.get') as mock_get:
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = pdf_content
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
+        mock_get.return_value = mock_response
+
+        extractor = PDFExtractor(cache=cache)
+        first, _, _ = extractor.extract(["http://example.com/a.pdf"], OutputFormat.CSV.value)
+        with patch.object(PDFExtractor, "extract_document") as mock_extract:
+            second, _, _ = extractor.extract(["http://mirror.example.com/b.pdf"], OutputFormat.CSV.value)
+            mock_extract.assert_not_called()
+
+    pd.testing.assert_frame_equal(
+        pd.read_csv(io.BytesIO(first.getvalue())),
+        pd.read_csv(io.BytesIO(second.getvalue())),
+    )
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    """Once over budget, the oldest entries are removed first."""
+    cache = DocumentCache(root=str(tmp_path / "cache"), max_bytes=250)
+    first = cache.store_download("http://example.com/1.pdf", _download(b"1" * 100))
+    second = cache.store_download("http://example.com/2.pdf", _download(b"2" * 100))
+    cache.open_pdf(first).close()  # use the first PDF so the second becomes the oldest
+    cache.store_download("http://example.com/3.pdf", _download(b"3" * 100))
+
+    assert cache.open_pdf(second) is None
+    with cache.open_pdf(first) as pdf_file:
+        assert pdf_file.read() == b"1" * 100
+
+def test_failed_parse_is_not_cached(pdf_content, cache):
+    """A parse that fails isn't stored as a PDF without tables: the next run parses it again."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=pdf_content))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+    extractor = PDFExtractor(cache=cache)
+    urls = ["http://example.com/test_tables.pdf"]
+
+    with patch("app.services.pdfextractor.extract_page_tables", side_effect=RuntimeError("transient")):
+        assert asyncio.run(extractor.extract_async(urls, OutputFormat.CSV.value, fetcher=fetcher)) is None
+    buffer, _, _ = asyncio.run(extractor.extract_async(urls, OutputFormat.CSV.value, fetcher=fetcher))
+
+    assert len(pd.read_csv(io.BytesIO(buffer.getvalue()))) == len(pd.read_csv("tests/truth/test_tables.csv"))
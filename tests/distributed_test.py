@@ -0,0 +1,171 @@
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from app.models.datatypes import OutputFormat
+from app.services.pdfextractor import PDFExtractor
+from app.services.distributed import (
+    SQLiteTaskQueue, RedisTaskQueue, ResultStore, ExtractionWorker, extract_distributed, get_task_queue, task_settings, build_extractor,
+)
+
+@pytest.fixture
+def pdf_content():
+    with open("tests/mock_data/pdfs/test_tables.pdf", "rb") as f:
+        return f.read()
+
+@pytest.fixture
+def task_queue(tmp_path):
+    return SQLiteTaskQueue(str(tmp_path / "tasks.sqlite"), poll_interval=0.01)
+
+@pytest.fixture
+def redis_queue():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis runs Lua scripts with it
+    return RedisTaskQueue(client=fakeredis.FakeRedis(decode_responses=True), poll_interval=0.01)
+
+def _task(batch, i, url="http://example.com/a.pdf"):
+    return {"id": f"{batch}-{i}", "batch": batch, "url": url, "settings": {}}
+
+def test_sqlite_queue_leases_and_reclaims_tasks(task_queue):
+    """Tasks are taken in order, once; a task whose lease ran out is queued again."""
+    task_queue.push([_task("b", 0), _task("b", 1)])
+    assert task_queue.pop(timeout=0)["id"] == "b-0"
+    assert task_queue.pop(lease=-1, timeout=0)["id"] == "b-1"  # its worker "died"
+    assert task_queue.pop(timeout=0) is None
+    assert task_queue.states("b") == {"b-0": "running", "b-1": "running"}
+
+    assert task_queue.reclaim("b") == 1
+    assert task_queue.pop(timeout=0)["id"] == "b-1"
+    task_queue.finish("b-0", "extracted")
+    task_queue.finish("b-1", "no_tables")
+    assert task_queue.states("b") == {"b-0": "extracted", "b-1": "no_tables"}
+
+    task_queue.delete("b")
+    assert task_queue.states("b") == {}
+
+def test_redis_queue_leases_and_reclaims_tasks(redis_queue):
+    """Same contract as the SQLite queue."""
+    redis_queue.push([_task("b", 0), _task("b", 1)])
+    assert redis_queue.pop(timeout=0)["id"] == "b-0"
+    assert redis_queue.pop(lease=-1, timeout=0)["id"] == "b-1"
+    assert redis_queue.pop(timeout=0) is None
+    assert redis_queue.states("b") == {"b-0": "running", "b-1": "running"}
+
+    assert redis_queue.reclaim("b") == 1
+    assert redis_queue.pop(timeout=0)["id"] == "b-1"
+    redis_queue.finish("b-0", "extracted")
+    redis_queue.finish("b-1", "no_tables")
+    assert redis_queue.states("b") == {"b-0": "extracted", "b-1": "no_tables"}
+
+    redis_queue.delete("b")
+    assert redis_queue.states("b") == {}
+
+def test_redis_queue_claims_each_task_once(redis_queue):
+    """Workers popping at the same time never take the same task, and every task they take is leased."""
+    redis_queue.push([_task("b", i) for i in range(20)])
+    taken = []
+
+    def work():
+        while (task := redis_queue.pop(timeout=0)) is not None:
+            taken.append(task["id"])
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(taken) == sorted(f"b-{i}" for i in range(20))
+    assert set(redis_queue.states("b").values()) == {"running"}
+
+def test_redis_queue_reclaims_orphaned_queued_tasks(redis_queue):
+    """A task still queued but off the queue list (its worker stopped after taking it) is queued again."""
+    redis_queue.push([_task("b", 0)])
+    redis_queue.client.lpop(redis_queue._key("queue"))
+    assert redis_queue.pop(timeout=0) is None
+
+    assert redis_queue.reclaim("b") == 1
+    assert redis_queue.reclaim("b") == 0
+    assert redis_queue.pop(timeout=0)["id"] == "b-0"
+
+def test_redis_queue_ignores_tasks_of_deleted_batches(redis_queue):
+    """Renewing or finishing a task whose batch was deleted doesn't bring it back."""
+    redis_queue.push([_task("b", 0), _task("b", 1)])
+    redis_queue.pop(timeout=0)
+    redis_queue.delete("b")
+
+    redis_queue.renew("b-0")
+    redis_queue.finish("b-0", "extracted")
+    assert not redis_queue.client.exists(redis_queue._key("task", "b-0"))
+    assert redis_queue.pop(timeout=0) is None
+
+def test_get_task_queue_backends(tmp_path):
+    assert get_task_queue("") is None
+    assert isinstance(get_task_queue(f"sqlite://{tmp_path}/tasks.sqlite"), SQLiteTaskQueue)
+    with pytest.raises(ValueError):
+        get_task_queue("amqp://localhost")
+
+def test_distributed_extraction_matches_in_process_output(pdf_content, task_queue, tmp_path):
+    """Workers extract the documents and the coordinator merges them into the same output as extract()."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.iter_content.return_value = [pdf_content]
+    mock_response.headers = {}
+    urls = ["http://example.com/a.pdf", "http://example.com/b.pdf", "http://example.com/a.pdf#copy"]
+    results = ResultStore(str(tmp_path / "results"))
+    progress = []
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=ExtractionWorker(task_queue, results).run, args=(stop,)) for _ in range(2)
+    ]
+
+    with patch("requests.Session.get", return_value=mock_response):
+        expected, _, _ = PDFExtractor(max_rows=7).extract(urls, OutputFormat.CSV.value)
+        for worker in workers:
+            worker.start()
+        try:
+            buffer, media_type, _ = extract_distributed(
+                PDFExtractor(max_rows=7), urls, OutputFormat.CSV.value, progress=lambda url, state: progress.append((url, state)),
+                queue=task_queue, results=results, poll_interval=0.01, timeout=60,
+            )
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+    assert buffer.getvalue() == expected.getvalue()
+    assert media_type == "text/csv"
+    assert sorted(progress) == [("http://example.com/a.pdf", "extracted"), ("http://example.com/b.pdf", "extracted")]
+    assert list((tmp_path / "results").iterdir()) == []  # the batch's results are removed once merged
+
+def test_distributed_extraction_reports_aborted_pages(pdf_content, task_queue, tmp_path):
+    """Pages a worker aborted are listed in the output headers, as extract() does."""
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.iter_content.return_value = [pdf_content]
+    mock_response.headers = {}
+    fetch_and_extract = PDFExtractor.fetch_and_extract
+
+    def aborting(self, url):
+        result = fetch_and_extract(self, url)
+        self.aborted_pages[url] = [(2, "timeout")]
+        return result
+
+    results = ResultStore(str(tmp_path / "results"))
+    stop = threading.Event()
+    worker = threading.Thread(target=ExtractionWorker(task_queue, results).run, args=(stop,))
+    with patch("requests.Session.get", return_value=mock_response), patch.object(PDFExtractor, "fetch_and_extract", aborting):
+        worker.start()
+        try:
+            _, _, headers = extract_distributed(
+                PDFExtractor(max_rows=7), ["http://example.com/a.pdf"], OutputFormat.CSV.value,
+                queue=task_queue, results=results, poll_interval=0.01, timeout=60,
+            )
+        finally:
+            stop.set()
+            worker.join()
+
+    assert headers["X-Pages-Aborted"] == "1"
+    assert headers["X-Pages-Aborted-Detail"] == "http://example.com/a.pdf#page=2 (timeout)"
+
+def test_task_settings_round_trip():
+    extractor = build_extractor(task_settings(PDFExtractor(engine="threads", pages="1-2", max_tables=3)))
+    assert (extractor.engine.value, extractor.pages, extractor.max_tables, extractor.cache) == ("threads", "1-2", 3, None)
@@ -0,0 +1,115 @@
+import io
+import json
+import httpx
+import pytest
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from unittest.mock import patch
+from pydantic import ValidationError
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routes.files import ExtractRequest
+from app.models.datatypes import OutputFormat
+from app.services.fetcher import AsyncFetcher
+from app.services.exporter import ExportOptions, StreamWriter, export_table, negotiate_encoding
+
+@pytest.fixture
+def table():
+    return pa.table({"Name": ["a", "b", None, "d"], "Value": ["1", "2", "3", None]})
+
+def _read(data: bytes, output_format: OutputFormat) -> pd.DataFrame:
+    """Reads an output back as a DataFrame of strings (empty cells as None)."""
+    if output_format in (OutputFormat.CSV, OutputFormat.CSV_GZIP, OutputFormat.CSV_ZSTD):
+        compression = {OutputFormat.CSV_GZIP: "gzip", OutputFormat.CSV_ZSTD: "zstd"}.get(output_format)
+        text = pa.input_stream(pa.BufferReader(data), compression=compression).read() if compression else data
+        df = pd.read_csv(io.BytesIO(text), dtype=str)
+    elif output_format == OutputFormat.NDJSON:
+        df = pd.DataFrame([json.loads(line) for line in data.decode("utf-8").splitlines()])
+    elif output_format == OutputFormat.ARROW:
+        df = pa.ipc.open_file(pa.BufferReader(data)).read_all().to_pandas()
+    else:
+        df = pq.read_table(io.BytesIO(data)).to_pandas()
+    return df.astype(object).where(df.notna(), None)
+
+FORMATS = [
+    (OutputFormat.CSV_GZIP, ExportOptions(compression_level=1)),
+    (OutputFormat.CSV_ZSTD, ExportOptions()),
+    (OutputFormat.NDJSON, ExportOptions()),
+    (OutputFormat.ARROW, ExportOptions(compression="zstd")),
+    (OutputFormat.PARQUET, ExportOptions(compression="zstd", compression_level=5, row_group_size=2, dictionary=False)),
+]
+
+@pytest.mark.parametrize("output_format, options", FORMATS)
+def test_formats_round_trip_buffered_and_streamed(table, output_format, options):
+    """Every format holds the same rows whether exported at once or streamed in chunks."""
+    options.check(output_format)
+    expected = _read(export_table(table, OutputFormat.CSV)[0].getvalue(), OutputFormat.CSV)
+
+    buffer, _, headers = export_table(table, output_format, options)
+    pd.testing.assert_frame_equal(_read(buffer.getvalue(), output_format), expected)
+    assert headers["Content-Disposition"].endswith(f'.{output_format.value}"')
+
+    writer = StreamWriter(output_format, options)
+    data = writer.begin(table.column_names) + writer.write(table.slice(0, 3)) + writer.write(table.slice(3)) + writer.close()
+    pd.testing.assert_frame_equal(_read(data, output_format), expected)
+    if output_format == OutputFormat.PARQUET:
+        metadata = pq.ParquetFile(io.BytesIO(buffer.getvalue())).metadata
+        assert metadata.num_row_groups == 2
+        assert metadata.row_group(0).column(0).compression == "ZSTD"
+
+def test_export_options_are_checked_against_the_format():
+    with pytest.raises(ValueError):
+        ExportOptions(compression="snappy").check(OutputFormat.ARROW)
+    with pytest.raises(ValueError):
+        ExportOptions(compression="zstd").check(OutputFormat.CSV)
+    with pytest.raises(ValueError):
+        ExportOptions(compression_level=3).check(OutputFormat.NDJSON)
+    with pytest.raises(ValueError):
+        ExportOptions(compression_level=12).check(OutputFormat.CSV_GZIP)
+    with pytest.raises(ValueError):
+        ExportOptions(row_group_size=100).check(OutputFormat.ARROW)
+    ExportOptions(compression_level=19).check(OutputFormat.CSV_ZSTD)
+
+def test_request_checks_export_options_against_the_default_format():
+    """A request leaving output_format out gets CSV, and its export options are checked against CSV."""
+    urls = ["http://example.com/a.pdf"]
+    assert ExtractRequest(document_urls=urls).output_format == OutputFormat.CSV
+    assert ExtractRequest(document_urls=urls, output_format="parquet", compression="zstd").output_format == OutputFormat.PARQUET
+    with pytest.raises(ValidationError):
+        ExtractRequest(document_urls=urls, compression="zstd")
+    with pytest.raises(ValidationError):
+        ExtractRequest(document_urls=urls, compression_level=3)
+    with pytest.raises(ValidationError):
+        ExtractRequest(document_urls=urls, output_format="xlsx")
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate", OutputFormat.CSV) == "gzip"
+    assert negotiate_encoding("gzip, zstd", OutputFormat.NDJSON) == "zstd"
+    assert negotiate_encoding("gzip;q=1.0, zstd;q=0.5", OutputFormat.CSV) == "gzip"
+    assert negotiate_encoding("gzip;q=0, identity", OutputFormat.CSV) is None
+    assert negotiate_encoding("gzip", OutputFormat.PARQUET) is None
+    assert negotiate_encoding(None, OutputFormat.CSV) is None
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_api_compresses_responses_per_accept_encoding(stream):
+    """A client accepting gzip gets the same CSV gzip-encoded; unusable options are refused up front."""
+    with open("tests/mock_data/pdfs/test_tables.pdf", "rb") as f:
+        pdf_content = f.read()
+    truth = pd.read_csv("tests/truth/test_tables.csv")
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=pdf_content))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+    client = TestClient(app)
+    request = {"document_urls": ["http://example.com/a.pdf"], "output_format": "csv", "use_cache": False, "stream": stream}
+
+    with patch("app.services.pdfextractor.get_async_fetcher", return_value=fetcher):
+        response = client.post("/files/extract", json=request, headers={"Accept-Encoding": "gzip"})
+        raw = client.post("/files/extract", json=request, headers={"Accept-Encoding": "identity"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in raw.headers
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(response.content)), truth)
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(raw.content)), truth)
+
+    refused = client.post("/files/extract", json=dict(request, compression="zstd"))
+    assert refused.status_code == 422
@@ -1,10 +1,21 @@
 import os
 import io
+import time
+import asyncio
+import threading
+import httpx
 import pytest
 from unittest.mock import patch, MagicMock
 import pandas as pd
-from app.models.datatypes import OutputFormat
+from app.models.datatypes import OutputFormat, ExtractionEngine
 from app.services.pdfextractor import PDFExtractor
+import pdfplumber
+from app.services.tableengine import split_pages, parse_page_ranges, select_pages, page_may_have_tables, content_may_draw_ruling
+from app.services.fetcher import AsyncFetcher
+from app.services.singleflight import SingleFlight
+from app.services.metrics import DEDUPLICATED
+from app.services.cache import serialize_table
+import pyarrow as pa
 import pyarrow.parquet as pq
 
 @pytest.fixture
@@ -32,11 +43,13 @@ def expected_extraction_parquet():
 def test_pdf_csv_extractor(pdf_content, mock_urls, expected_extraction_csv):
     """Test the PDFExtractor to verify extraction matches truth."""
 
-    # Patch the requests.get call to return the mocked PDF content
-    with patch('requests.get') as mock_get:
+    # Patch the pooled session's get call to return the mocked PDF content
+    with patch('requests.Session.get') as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.content = pdf_content
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
         mock_get.return_value = mock_response
         
         # Initiating the PDFExtractor for the test
@@ -56,11 +69,13 @@ def test_pdf_csv_extractor(pdf_content, mock_urls, expected_extraction_csv):
 def test_pdf_csv_extractor_incorrect_truth(pdf_content, mock_urls, expected_extraction_csv):
     """Negative test to verify the PDFExtractor assert fails with incorrect truth."""
     
-    # Patch the requests.get call to return the mocked PDF content
-    with patch('requests.get') as mock_get:
+    # Patch the pooled session's get call to return the mocked PDF content
+    with patch('requests.Session.get') as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.content = pdf_content
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
         mock_get.return_value = mock_response
         
         # Initiating the PDFExtractor for the test
@@ -86,11 +101,13 @@ def test_pdf_csv_extractor_incorrect_truth(pdf_content, mock_urls, expected_extr
 def test_pdf_parquet_extractor(pdf_content, mock_urls, expected_extraction_parquet):
     """Test the PDFExtractor to verify extraction matches truth."""
 
-    # Patch the requests.get call to return the mocked PDF content
-    with patch('requests.get') as mock_get:
+    # Patch the pooled session's get call to return the mocked PDF content
+    with patch('requests.Session.get') as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.content = pdf_content
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
         mock_get.return_value = mock_response
         
         # Initiating the PDFExtractor for the test
@@ -110,11 +127,13 @@ def test_pdf_parquet_extractor(pdf_content, mock_urls, expected_extraction_parqu
 def test_pdf_parquet_extractor_incorrect_truth(pdf_content, mock_urls, expected_extraction_parquet):
     """Negative test to verify the PDFExtractor assert fails with incorrect truth."""
     
-    # Patch the requests.get call to return the mocked PDF content
-    with patch('requests.get') as mock_get:
+    # Patch the pooled session's get call to return the mocked PDF content
+    with patch('requests.Session.get') as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.content = pdf_content
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
         mock_get.return_value = mock_response
         
         # Initiating the PDFExtractor for the test
@@ -137,3 +156,335 @@ def test_pdf_parquet_extractor_incorrect_truth(pdf_content, mock_urls, expected_
         else:
             pytest.fail("No data was extracted from the PDF")
 
+@pytest.mark.parametrize("engine", [ExtractionEngine.THREADS, ExtractionEngine.PROCESSES, ExtractionEngine.AUTO])
+def test_pdf_extractor_engines_match_truth(pdf_content, mock_urls, expected_extraction_csv, engine):
+    """Every extraction engine must produce the same output as the truth file."""
+
+    # Patch the pooled session's get call to return the mocked PDF content
+    with patch('requests.Session.get') as mock_get:
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = pdf_content
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
+        mock_get.return_value = mock_response
+
+        extractor = PDFExtractor(engine=engine)
+
+        buffer, _, _ = extractor.extract(mock_urls, OutputFormat.CSV.value)
+
+        extracted_df = pd.read_csv(io.StringIO(buffer.getvalue().decode("utf-8")))
+        pd.testing.assert_frame_equal(extracted_df, expected_extraction_csv)
+
+def test_split_pages_covers_every_page_in_order():
+    """Page ranges must be contiguous, ordered and cover the whole document."""
+    assert split_pages(10, 4) == [(0, 3), (3, 6), (6, 8), (8, 10)]
+    assert split_pages(2, 8) == [(0, 1), (1, 2)]
+    assert split_pages(0, 4) == [(0, 0)]
+
+def test_pdf_extractor_async_matches_truth(pdf_content, mock_urls, expected_extraction_csv):
+    """The non-blocking extraction path must produce the same output as extract()."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=pdf_content))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+
+    extractor = PDFExtractor()
+    buffer, _, _ = asyncio.run(extractor.extract_async(mock_urls, OutputFormat.CSV.value, fetcher=fetcher))
+
+    extracted_df = pd.read_csv(io.StringIO(buffer.getvalue().decode("utf-8")))
+    pd.testing.assert_frame_equal(extracted_df, expected_extraction_csv)
+
+def test_pdf_extractor_async_spills_documents(tmp_path, pdf_content, expected_extraction_csv):
+    """extract_async() merges spilled documents, as extract() does, and removes its run directory."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=pdf_content))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+    urls = [f"http://example.com/{i}.pdf" for i in range(3)]
+
+    extractor = PDFExtractor()
+    with patch("app.services.pdfextractor.BASE_TMP_DIR", str(tmp_path)), \
+            patch.object(extractor, "combine_results", side_effect=AssertionError("merged in memory")), \
+            patch.object(extractor, "combine_spilled", wraps=extractor.combine_spilled) as combine_spilled:
+        buffer, _, _ = asyncio.run(extractor.extract_async(urls, OutputFormat.CSV.value, fetcher=fetcher))
+
+    paths = combine_spilled.call_args.args[0]
+    assert len(paths) == 3
+    assert os.listdir(tmp_path) == []
+    extracted_df = pd.read_csv(io.StringIO(buffer.getvalue().decode("utf-8")))
+    expected = pd.concat([expected_extraction_csv] * 3, ignore_index=True)
+    pd.testing.assert_frame_equal(extracted_df, expected)
+
+async def _collect_stream(extractor, urls, output_format, fetcher):
+    body, _, _ = await extractor.stream_async(urls, output_format, fetcher=fetcher)
+    return b"".join([chunk async for chunk in body])
+
+@pytest.mark.parametrize("output_format", [OutputFormat.CSV, OutputFormat.PARQUET])
+def test_pdf_extractor_stream_matches_truth(pdf_content, mock_urls, expected_extraction_csv, expected_extraction_parquet, output_format):
+    """Streamed CSV and Parquet output must match the buffered truth files."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=pdf_content))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+
+    extractor = PDFExtractor()
+    data = asyncio.run(_collect_stream(extractor, mock_urls, output_format.value, fetcher))
+
+    if output_format == OutputFormat.CSV:
+        extracted_df = pd.read_csv(io.StringIO(data.decode("utf-8")))
+        pd.testing.assert_frame_equal(extracted_df, expected_extraction_csv)
+    else:
+        extracted_df = pd.read_parquet(io.BytesIO(data))
+        pd.testing.assert_frame_equal(extracted_df, expected_extraction_parquet)
+
+def test_header_masks_handle_missing_and_multiline_cells():
+    """The column-wise header filters must treat None/NA/newlines like the per-cell string logic."""
+    extractor = PDFExtractor()
+    df = pd.DataFrame(
+        [
+            ["ID", "Column\n1"],
+            [" id\r", "column  1"],
+            [None, "Column 1"],
+            [pd.NA, "co"],
+            ["77135", "Column 1"],
+        ],
+        columns=["ID", "Column 1"],
+    )
+
+    assert extractor.header_row_mask(df, ("ID", "Column 1")).tolist() == [True, False, False, False, False]
+    assert extractor.header_like_mask(df).tolist() == [True, True, False, False, False]
+
+def _baseline_cleaned_names(results):
+    """The "Name" column left by the original pandas merge: concat, blank rows dropped, row-wise header-like filter."""
+    final_df = pd.concat([pd.DataFrame(rows, columns=header, dtype=object) for rows, header in results], ignore_index=True)
+    final_df.replace('', pd.NA, inplace=True)
+    final_df.dropna(how='all', inplace=True)
+
+    def row_starts_like_header(row, col_headers):
+        for cell_value, col_name in zip(row, col_headers):
+            cell_str = str(cell_value).strip().lower()
+            col_start = str(col_name).strip().lower()[:2]
+            if not cell_str.startswith(col_start):
+                return False
+        return True
+
+    header_mask = final_df.apply(lambda r: row_starts_like_header(r, final_df.columns), axis=1)
+    return final_df[~header_mask]["Name"].tolist()
+
+@pytest.mark.parametrize("spilled", [False, True])
+def test_header_like_rows_match_the_baseline_for_empty_none_and_missing_cells(tmp_path, spilled):
+    """
+    Empty cells read "<NA>", None cells "None" and cells of a column the PDF lacks
+    "nan" to the header-like filter, as they did in the original row-wise check.
+    """
+    results = [
+        ([["", "Nancy"], [None, "Nadia"], ["No 5", "Nash"], ["", ""]], ["No.", "Name"]),
+        ([["", "Natalie", "nah"], [None, "Nat", "na"], [None, "Nala", ""], [None, "Nate", None]], ["No.", "Name", "Nan count"]),
+    ]
+    expected = _baseline_cleaned_names(results)
+    assert expected == ["Nancy", "Natalie", "Nala", "Nate"]
+
+    extractor = PDFExtractor()
+    tables = [(pa.table({name: pa.array(column, pa.string()) for name, column in zip(header, zip(*rows))}), header)
+              for rows, header in results]
+    if spilled:
+        paths = []
+        for i, result in enumerate(tables):
+            paths.append(str(tmp_path / f"{i}.arrow"))
+            with open(paths[-1], "wb") as f:
+                f.write(serialize_table(*result))
+        buffer, _, _ = extractor.combine_spilled(paths, OutputFormat.CSV.value)
+    else:
+        buffer, _, _ = extractor.combine_results(tables, OutputFormat.CSV.value)
+    assert pd.read_csv(buffer)["Name"].tolist() == expected
+
+def test_extract_document_returns_arrow_batches_per_table(pdf_content):
+    """Each PDF table becomes one record batch of a single all-string schema named after the chosen header."""
+    extractor = PDFExtractor()
+    table, header = extractor.extract_document(io.BytesIO(pdf_content), "test_tables.pdf")
+
+    assert table.schema.names == extractor.unique_names(header)
+    assert all(field.type == pa.string() for field in table.schema)
+    assert table.num_rows > 0 and len(table.to_batches()) > 1
+    assert not extractor.header_row_mask(table, tuple(header)).any()
+
+def test_combine_results_matches_columns_by_name():
+    """Documents with different headers are merged by column name, missing cells left empty."""
+    extractor = PDFExtractor()
+    first = pa.table({"ID": ["1", "2"], "Name": ["a", ""]})
+    second = pa.table({"ID": ["3"], "Total": ["9"], "Name": ["c"]})
+    buffer, _, _ = extractor.combine_results([(first, ["ID", "Name"]), (second, ["ID", "Total", "Name"])], OutputFormat.CSV.value)
+
+    assert buffer.getvalue().decode("utf-8").splitlines() == ["ID,Name,Total", "1,a,", "2,,", "3,c,9"]
+
+@pytest.mark.parametrize("output_format", [OutputFormat.CSV, OutputFormat.PARQUET])
+def test_combine_spilled_matches_combine_results(tmp_path, output_format):
+    """Merging spilled results one at a time gives the output of merging them in memory."""
+    extractor = PDFExtractor()
+    results = [
+        (pa.table({"ID": ["1", "2"], "Name": ["a", ""]}), ["ID", "Name"]),
+        (pa.table({"ID": ["3"], "Total": ["9"], "Name": ["c"]}), ["ID", "Total", "Name"]),
+        (pa.table({"Column_0": ["4", "Id"], "Column_1": ["d", "Na"]}), ["Column_0", "Column_1"]),
+        (pa.table({"ID": ["5"], "Name": ["e"]}), ["ID", "Name"]),
+    ]
+    paths = []
+    for i, result in enumerate(results):
+        paths.append(str(tmp_path / f"{i}.arrow"))
+        with open(paths[-1], "wb") as f:
+            f.write(serialize_table(*result))
+
+    with patch("app.services.pdfextractor.SPILL_CHUNK_ROWS", 2):
+        spilled, _, _ = extractor.combine_spilled(paths, output_format.value)
+    merged, _, _ = extractor.combine_results(results, output_format.value)
+    if output_format == OutputFormat.CSV:
+        assert spilled.getvalue() == merged.getvalue()
+    else:
+        assert pq.read_table(spilled).equals(pq.read_table(merged))
+    assert extractor.combine_spilled([], output_format.value) is None
+
+def test_page_ranges_select_pages_in_order():
+    """Page selections are 1-based and inclusive, with open ends; malformed ones are refused."""
+    assert parse_page_ranges("1-3, 8,10-") == [(1, 3), (8, 8), (10, None)]
+    assert select_pages(12, "10-,2,1-3") == [0, 1, 2, 9, 10, 11]
+    assert select_pages(3, "-2") == [0, 1]
+    assert select_pages(3, None) == [0, 1, 2]
+    for spec in ("0", "3-1", "a", "1-2-3"):
+        with pytest.raises(ValueError):
+            parse_page_ranges(spec)
+
+def _text_only_pdf(text: str) -> bytes:
+    """A one-page PDF with a line of text and no drawing."""
+    content = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 6\n0000000000 65535 f \n" + b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size 6 /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % xref
+    return bytes(pdf)
+
+def test_prefilter_skips_pages_without_ruling_before_layout_analysis(pdf_content):
+    """Text-only pages are ruled out from their content stream; pages with tables never are."""
+    with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
+        assert all(content_may_draw_ruling(page.page_obj) for page in pdf.pages)
+    # Operators spelled out inside a string aren't drawing
+    with pdfplumber.open(io.BytesIO(_text_only_pdf("1 2 3 4 re l c"))) as pdf:
+        assert not content_may_draw_ruling(pdf.pages[0].page_obj)
+
+    extractor = PDFExtractor()
+    assert extractor.extract_document(io.BytesIO(_text_only_pdf("Annual report")), "report.pdf") == (None, None)
+    assert extractor.page_counts.totals()["no_ruling"] == 1
+
+def test_prefilter_needs_text_and_ruling_in_both_directions():
+    """Pages without text, or without ruling in both directions, are not searched with the default strategy."""
+    def page(chars=1, lines=(), rects=0):
+        return MagicMock(chars=[{}] * chars, lines=list(lines), rects=[{}] * rects, curves=[])
+    horizontal = {"top": 10, "bottom": 10, "x0": 0, "x1": 100}
+    vertical = {"top": 0, "bottom": 100, "x0": 10, "x1": 10}
+
+    with patch("app.services.tableengine.content_may_draw_ruling", return_value=True):
+        assert not page_may_have_tables(page(chars=0, rects=1))
+        assert not page_may_have_tables(page())
+        assert not page_may_have_tables(page(lines=[horizontal]))
+        assert page_may_have_tables(page(lines=[horizontal, vertical]))
+        assert page_may_have_tables(page(rects=1))
+    with patch("app.services.tableengine.content_may_draw_ruling", return_value=False):
+        assert not page_may_have_tables(page(rects=1))
+        assert page_may_have_tables(page(), {"vertical_strategy": "text", "horizontal_strategy": "text"})
+
+def test_prefilter_counts_slanted_lines_as_columns():
+    """pdfplumber takes every line that isn't horizontal for a vertical edge, so the pre-filter does too."""
+    horizontal = {"top": 10, "bottom": 10, "x0": 0, "x1": 100}
+    slanted = {"top": 0, "bottom": 100, "x0": 10, "x1": 10.5}
+    page = MagicMock(chars=[{}], lines=[horizontal, slanted], rects=[], curves=[])
+    with patch("app.services.tableengine.content_may_draw_ruling", return_value=True):
+        assert page_may_have_tables(page)
+
+def test_prefilter_searches_every_page_given_explicit_lines():
+    """Explicit lines add ruling the page doesn't draw, so neither the content stream nor the page's lines can rule tables out."""
+    page = MagicMock(chars=[{}], lines=[], rects=[], curves=[])
+    with patch("app.services.tableengine.content_may_draw_ruling", return_value=False) as content_check:
+        assert page_may_have_tables(page, {"explicit_vertical_lines": [10, 50, 90]})
+        assert page_may_have_tables(page, {"explicit_horizontal_lines": [10, 50]})
+        assert not page_may_have_tables(page, {"explicit_vertical_lines": []})
+    assert content_check.call_count == 1
+
+@pytest.mark.parametrize("engine", [ExtractionEngine.THREADS, ExtractionEngine.PROCESSES])
+def test_page_selection_and_limits(pdf_content, engine):
+    """Only the requested pages are searched, and searching stops once the limits are met."""
+    full, _ = PDFExtractor(engine=engine).extract_document(io.BytesIO(pdf_content), "test_tables.pdf")
+
+    second_page = PDFExtractor(engine=engine, pages="2")
+    table, _ = second_page.extract_document(io.BytesIO(pdf_content), "test_tables.pdf")
+    assert second_page.page_counts.totals() == {"searched": 1, "range": 2, "no_ruling": 0, "limit": 0}
+    assert 0 < table.num_rows < full.num_rows
+
+    first_table = PDFExtractor(engine=engine, max_tables=1)
+    table, _ = first_table.extract_document(io.BytesIO(pdf_content), "test_tables.pdf")
+    assert first_table.page_counts.totals()["limit"] == 2
+    assert table.equals(full.slice(0, table.num_rows)) and len(table.to_batches()) == 1
+
+    five_rows = PDFExtractor(engine=engine, max_rows=5)
+    table, _ = five_rows.extract_document(io.BytesIO(pdf_content), "test_tables.pdf")
+    assert table.equals(full.slice(0, 5))
+
+def test_concurrent_extractions_of_a_document_share_one_download(pdf_content, mock_urls, expected_extraction_csv):
+    """Overlapping requests download each document once; repeats within a request are dropped."""
+    flights = SingleFlight()
+    downloading = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_get(url, **kwargs):
+        calls.append(url)
+        downloading.set()
+        release.wait(5)
+        response = MagicMock()
+        response.status_code = 200
+        response.iter_content.return_value = [pdf_content]
+        response.headers = {}
+        return response
+
+    coalesced_before = DEDUPLICATED.value(kind="coalesced")
+    duplicates_before = DEDUPLICATED.value(kind="duplicate")
+    duplicated = mock_urls + [mock_urls[0].replace("http://example.com", "HTTP://EXAMPLE.com:80") + "#page=1"]
+    outputs = []
+    with patch("requests.Session.get", side_effect=slow_get):
+        leader = threading.Thread(target=lambda: outputs.append(PDFExtractor(flights=flights).extract(duplicated, OutputFormat.CSV.value)))
+        leader.start()
+        assert downloading.wait(5)
+        follower = threading.Thread(target=lambda: outputs.append(PDFExtractor(flights=flights).extract(mock_urls, OutputFormat.CSV.value)))
+        follower.start()
+        deadline = time.monotonic() + 5
+        while DEDUPLICATED.value(kind="coalesced") == coalesced_before and time.monotonic() < deadline:
+            time.sleep(0.01)  # until the follower waits on the leader's download
+        release.set()
+        leader.join()
+        follower.join()
+
+    assert len(calls) == 1
+    assert flights.in_flight() == 0
+    assert DEDUPLICATED.value(kind="coalesced") == coalesced_before + 1
+    assert DEDUPLICATED.value(kind="duplicate") == duplicates_before + 1
+    for buffer, _, _ in outputs:
+        pd.testing.assert_frame_equal(pd.read_csv(io.StringIO(buffer.getvalue().decode("utf-8"))), expected_extraction_csv)
+
+def test_concurrent_async_extractions_share_one_download(pdf_content, mock_urls, expected_extraction_csv):
+    """The API path coalesces too: requests running on one event loop wait for the first download."""
+    requests_seen = []
+    transport = httpx.MockTransport(lambda request: requests_seen.append(request.url) or httpx.Response(200, content=pdf_content))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+    flights = SingleFlight()
+
+    async def both():
+        return await asyncio.gather(*[
+            PDFExtractor(flights=flights).extract_async(mock_urls, OutputFormat.CSV.value, fetcher=fetcher) for _ in range(2)
+        ])
+
+    for buffer, _, _ in asyncio.run(both()):
+        pd.testing.assert_frame_equal(pd.read_csv(io.StringIO(buffer.getvalue().decode("utf-8"))), expected_extraction_csv)
+    assert len(requests_seen) == 1
@@ -0,0 +1,185 @@
+import time
+import mmap
+import asyncio
+import threading
+import httpx
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from app.services.fetcher import AsyncFetcher, Fetcher, HostLimits, RetryPolicy, parse_retry_after
+from app.services.downloads import ByteBudget, DocumentTooLargeError
+
+@pytest.fixture
+def fast_retry():
+    """Retry policy with tiny backoff so tests stay quick."""
+    return RetryPolicy(max_retries=2, backoff_base=0.001, backoff_max=0.01)
+
+def test_retries_throttled_requests_honoring_retry_after(fast_retry):
+    """429/5xx responses are retried, waiting as long as Retry-After asks."""
+    responses = [httpx.Response(429, headers={"Retry-After": "0.05"}), httpx.Response(503), httpx.Response(200, text="ok")]
+    transport = httpx.MockTransport(lambda request: responses.pop(0))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport), retry=fast_retry)
+
+    start = time.monotonic()
+    assert asyncio.run(fetcher.get_text("http://testserver/page.html")) == "ok"
+    assert time.monotonic() - start >= 0.05
+    assert responses == []
+
+def test_gives_up_after_max_retries(fast_retry):
+    """Once retries are exhausted the last error response is raised."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=httpx.MockTransport(handler)), retry=fast_retry)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(fetcher.get("http://testserver/file.pdf"))
+    assert len(calls) == fast_retry.max_retries + 1
+
+def test_client_errors_are_not_retried(fast_retry):
+    """A 404 will not get better by asking again."""
+    session = MagicMock()
+    session.get.return_value.status_code = 404
+    session.get.return_value.raise_for_status.side_effect = RuntimeError("404 Not Found")
+    fetcher = Fetcher(session=session, retry=fast_retry)
+
+    with pytest.raises(RuntimeError):
+        fetcher.get("http://testserver/missing.pdf")
+    assert session.get.call_count == 1
+
+def test_per_host_concurrency_cap():
+    """No more than max_concurrency requests reach one host at the same time."""
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def slow_get(url, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        response = MagicMock()
+        response.status_code = 200
+        return response
+
+    session = MagicMock()
+    session.get.side_effect = slow_get
+    fetcher = Fetcher(session=session, host_limits={"slow.example.com": HostLimits(max_concurrency=2)})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(fetcher.get, [f"http://slow.example.com/{i}.pdf" for i in range(8)]))
+    assert peak == 2
+
+def test_host_slot_is_held_until_the_body_is_read():
+    """A download counts against its host's concurrency cap until its body is read, not just until headers arrive."""
+    open_bodies = 0
+    peak = 0
+
+    class SlowBody(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            nonlocal open_bodies, peak
+            open_bodies += 1
+            peak = max(peak, open_bodies)
+            try:
+                for _ in range(3):
+                    await asyncio.sleep(0.01)
+                    yield b"%PDF"
+            finally:
+                open_bodies -= 1
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=SlowBody()))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport), host_limits={"slow.example.com": HostLimits(max_concurrency=2)})
+
+    async def download_all():
+        downloads = [fetcher.download(f"http://slow.example.com/{i}.pdf") for i in range(6)]
+        for download in await asyncio.gather(*downloads):
+            download.close()
+    asyncio.run(download_all())
+    assert peak == 2
+
+def test_blocking_host_slot_is_held_until_the_response_is_closed():
+    """Same for Fetcher: a streamed response holds its slot until download() closes it."""
+    open_bodies = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def streamed_get(url, **kwargs):
+        nonlocal open_bodies, peak
+        with lock:
+            open_bodies += 1
+            peak = max(peak, open_bodies)
+
+        def close():
+            nonlocal open_bodies
+            with lock:
+                open_bodies -= 1
+        response = MagicMock(status_code=200, ok=True, headers={})
+        response.iter_content.side_effect = lambda size: (time.sleep(0.01) or b"%PDF" for _ in range(3))
+        response.close.side_effect = close
+        return response
+
+    session = MagicMock()
+    session.get.side_effect = streamed_get
+    fetcher = Fetcher(session=session, host_limits={"slow.example.com": HostLimits(max_concurrency=2)})
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        for download in executor.map(fetcher.download, [f"http://slow.example.com/{i}.pdf" for i in range(6)]):
+            download.close()
+    assert peak == 2
+    assert open_bodies == 0
+
+def test_parse_retry_after():
+    """Retry-After may be a number of seconds or an HTTP date."""
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+def test_download_refuses_documents_over_the_size_limit():
+    """Both an announced Content-Length and the streamed body are checked against the limit."""
+    def handler(request):
+        if request.url.path == "/announced.pdf":
+            return httpx.Response(200, content=b"x" * 100)
+        return httpx.Response(200, stream=httpx.ByteStream(b"x" * 100))  # no Content-Length
+
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    for url in ["http://testserver/announced.pdf", "http://testserver/chunked.pdf"]:
+        with pytest.raises(DocumentTooLargeError):
+            asyncio.run(fetcher.download(url, max_bytes=50))
+
+def test_download_spools_large_documents_to_disk_and_maps_them():
+    """Bodies over the spool threshold leave memory and are handed to the parser as a memory map."""
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=b"%PDF" * 64))))
+
+    with patch("app.services.downloads.DOWNLOAD_SPOOL_BYTES", 100):
+        with asyncio.run(fetcher.download("http://testserver/big.pdf")) as download:
+            pdf_file = download.open_pdf()
+            assert isinstance(pdf_file, mmap.mmap)
+            assert pdf_file.read() == b"%PDF" * 64
+
+def test_byte_budget_holds_reservations_until_released():
+    """A reservation that doesn't fit waits for earlier documents to be released."""
+    budget = ByteBudget(limit=100)
+    assert budget.acquire(60) == 60
+
+    acquired = threading.Event()
+
+    def reserve_more():
+        budget.acquire(500)  # reduced to the whole budget
+        acquired.set()
+
+    waiter = threading.Thread(target=reserve_more)
+    waiter.start()
+    assert not acquired.wait(0.05)
+
+    budget.release(60)
+    assert acquired.wait(1)
+    waiter.join()
+    assert budget.in_use == 100
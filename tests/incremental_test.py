@@ -0,0 +1,102 @@
+import io
+import pytest
+import pandas as pd
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.datatypes import OutputFormat
+from app.services.incremental import IncrementalState
+from app.services.pdfextractor import PDFExtractor, SOURCE_COLUMNS
+
+@pytest.fixture
+def pdf_content():
+    with open("tests/mock_data/pdfs/test_tables.pdf", "rb") as f:
+        return f.read()
+
+@pytest.fixture
+def state(tmp_path):
+    return IncrementalState(root=str(tmp_path / "incremental"))
+
+def _serve(mock_get, documents):
+    """Answers every GET with the bytes 'documents' holds for the URL."""
+    def get(url, **kwargs):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [documents[url]]
+        mock_response.headers = {}
+        return mock_response
+    mock_get.side_effect = get
+
+def _run(state, documents, merged=False):
+    with patch('requests.Session.get') as mock_get:
+        _serve(mock_get, documents)
+        buffer, _, headers = PDFExtractor().extract_incremental(
+            list(documents), OutputFormat.CSV.value, state, "source", merged=merged
+        )
+    return pd.read_csv(io.BytesIO(buffer.getvalue())), headers
+
+def test_only_new_and_changed_documents_are_extracted(pdf_content, state):
+    """A second run parses nothing unless a document appeared or its content changed."""
+    truth = pd.read_csv("tests/truth/test_tables.csv")
+    documents = {
+        "http://example.com/a.pdf": pdf_content,
+        "http://example.com/b.pdf": pdf_content,
+    }
+
+    first, headers = _run(state, documents)
+    assert headers["X-Documents-New"] == "2"
+    assert list(first.columns) == list(truth.columns) + SOURCE_COLUMNS
+    assert len(first) == 2 * len(truth)
+    delta = first[first["source_document"] == "http://example.com/a.pdf"].drop(columns=SOURCE_COLUMNS)
+    pd.testing.assert_frame_equal(delta.reset_index(drop=True), truth)
+
+    with patch.object(PDFExtractor, "extract_document") as mock_extract:
+        second, headers = _run(state, documents)
+        mock_extract.assert_not_called()
+    assert second.empty
+    assert headers["X-Documents-Unchanged"] == "2"
+
+    # b.pdf changes, a.pdf disappears from the index and c.pdf is added
+    documents = {
+        "http://example.com/b.pdf": pdf_content + b"\n% revised\n",
+        "http://example.com/c.pdf": pdf_content,
+    }
+    third, headers = _run(state, documents)
+    assert (headers["X-Documents-New"], headers["X-Documents-Changed"], headers["X-Documents-Removed"]) == ("1", "1", "1")
+    assert set(third["source_document"]) == set(documents)
+    assert third["source_hash"].nunique() == 2
+    assert state.documents("source").keys() == documents.keys()
+
+def test_merged_output_includes_unchanged_documents(pdf_content, state):
+    """Merged output reads unchanged documents back from the state instead of re-parsing them."""
+    documents = {"http://example.com/a.pdf": pdf_content}
+    _run(state, documents)
+
+    documents["http://example.com/b.pdf"] = pdf_content
+    with patch.object(PDFExtractor, "extract_document", wraps=PDFExtractor().extract_document) as mock_extract:
+        merged, headers = _run(state, documents, merged=True)
+        assert mock_extract.call_count == 1
+    assert (headers["X-Documents-New"], headers["X-Documents-Unchanged"]) == ("1", "1")
+    assert set(merged["source_document"]) == set(documents)
+
+def test_collect_incremental_route(pdf_content, state):
+    """The collect endpoint keys the state by its discover request."""
+    html = '<a href="/a.pdf">A</a>'
+    documents = {"http://example.com/a.pdf": pdf_content}
+
+    with patch('requests.Session.get') as mock_get, \
+         patch("app.routes.files.get_incremental_state", return_value=state), \
+         patch("app.services.webscraper.WebScraper.scrape_async", return_value=["http://example.com/a.pdf"]):
+        _serve(mock_get, documents)
+        client = TestClient(app)
+        request = {
+            "discover": {"url": "http://example.com/index.html"},
+            "extract": {"output_format": "csv", "use_cache": False},
+            "incremental": "delta",
+        }
+        first = client.post("/files/collect", json=request)
+        second = client.post("/files/collect", json=request)
+
+    assert first.headers["X-Documents-New"] == "1"
+    assert second.headers["X-Documents-Unchanged"] == "1"
+    assert pd.read_csv(io.BytesIO(second.content)).empty
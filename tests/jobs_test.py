@@ -0,0 +1,110 @@
+import io
+import time
+import threading
+import pytest
+import pandas as pd
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import JobStatus
+from app.services.jobs import JobManager, InMemoryJobStore, SQLiteJobStore, JobQueueFullError
+
+@pytest.fixture
+def pdf_content():
+    with open("tests/mock_data/pdfs/test_tables.pdf", "rb") as f:
+        return f.read()
+
+@pytest.fixture
+def manager(tmp_path):
+    return JobManager(store=InMemoryJobStore(), workers=1, results_dir=str(tmp_path / "results"))
+
+def _wait_until_finished(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f"/jobs/{job_id}").json()
+        if status["status"] in (JobStatus.SUCCEEDED.value, JobStatus.FAILED.value):
+            return status
+        time.sleep(0.05)
+    pytest.fail(f"Job {job_id} did not finish")
+
+def test_extract_job_reports_progress_and_serves_result(pdf_content, manager):
+    """Submit, poll and download an extract job."""
+    truth = pd.read_csv("tests/truth/test_tables.csv")
+    url = "http://example.com/test_tables.pdf"
+
+    with patch("requests.Session.get") as mock_get, patch("app.routes.jobs.get_job_manager", return_value=manager):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
+        mock_get.return_value = mock_response
+
+        client = TestClient(app)
+        submitted = client.post("/jobs/extract", json={"document_urls": [url], "output_format": "csv", "use_cache": False})
+        assert submitted.status_code == 202
+
+        status = _wait_until_finished(client, submitted.json()["id"])
+        assert status["status"] == JobStatus.SUCCEEDED.value
+        assert status["documents"] == {url: "extracted"}
+        assert status["completed_documents"] == status["total_documents"] == 1
+
+        result = client.get(status["result_url"])
+        assert result.status_code == 200
+        pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(result.content)), truth)
+
+def test_duplicate_urls_are_tracked_once(pdf_content, manager):
+    """Repeats of a document URL are extracted and reported once, so the job's progress completes."""
+    url = "http://example.com/test_tables.pdf"
+
+    with patch("requests.Session.get") as mock_get, patch("app.routes.jobs.get_job_manager", return_value=manager):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
+        mock_get.return_value = mock_response
+
+        client = TestClient(app)
+        urls = [url, url, "HTTP://EXAMPLE.COM/test_tables.pdf#page=2"]
+        submitted = client.post("/jobs/extract", json={"document_urls": urls, "output_format": "csv", "use_cache": False})
+        status = _wait_until_finished(client, submitted.json()["id"])
+
+        assert status["status"] == JobStatus.SUCCEEDED.value
+        assert status["documents"] == {url: "extracted"}
+        assert status["completed_documents"] == status["total_documents"] == 1
+
+def test_full_queue_refuses_new_jobs(tmp_path):
+    """Admission control: once the queue is full, submissions are refused."""
+    manager = JobManager(store=InMemoryJobStore(), workers=1, queue_size=1, results_dir=str(tmp_path / "results"))
+    release = threading.Event()
+    blocker = lambda context: release.wait() and None
+
+    running = manager.submit("extract", {}, blocker)
+    while manager.get(running["id"])["status"] != JobStatus.RUNNING.value:
+        time.sleep(0.01)
+    manager.submit("extract", {}, blocker)  # waits in the queue
+
+    with pytest.raises(JobQueueFullError):
+        manager.submit("extract", {}, blocker)
+    release.set()
+
+def test_finished_jobs_expire(tmp_path):
+    """Results are removed once their time to live is over."""
+    manager = JobManager(store=InMemoryJobStore(), workers=1, result_ttl=0, results_dir=str(tmp_path / "results"))
+    job = manager.submit("extract", {}, lambda context: (io.BytesIO(b"a,b\n"), "text/csv", {}))
+    deadline = time.monotonic() + 5
+    while manager.store.get(job["id"])["status"] != JobStatus.SUCCEEDED.value and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert manager.get(job["id"]) is None
+    assert manager.store.get(job["id"]) is None
+
+def test_sqlite_store_fails_jobs_abandoned_by_a_stopped_process(tmp_path):
+    """Queued jobs whose process is gone are marked failed when a new manager opens the store."""
+    store = SQLiteJobStore(path=str(tmp_path / "jobs.sqlite"))
+    store.save({"id": "abc", "owner": "nohost-but-this-one:999999999", "status": JobStatus.QUEUED.value, "expires_at": None})
+    store.save({"id": "def", "owner": "unknown", "status": JobStatus.RUNNING.value, "expires_at": None})
+
+    JobManager(store=store, results_dir=str(tmp_path / "results"))
+
+    assert store.get("abc")["status"] == JobStatus.QUEUED.value  # other host: left alone
+    assert store.get("def")["status"] == JobStatus.FAILED.value
@@ -0,0 +1,118 @@
+import io
+import asyncio
+import httpx
+import pytest
+import pandas as pd
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.datatypes import OutputFormat
+from app.services.fetcher import AsyncFetcher
+from app.services.pdfextractor import PDFExtractor
+from app.services.metrics import Registry, Counter, Histogram, STAGE_SECONDS, DOCUMENTS, ROWS
+
+@pytest.fixture
+def pdf_content():
+    with open("tests/mock_data/pdfs/test_tables.pdf", "rb") as f:
+        return f.read()
+
+def test_registry_renders_prometheus_text():
+    """Counters and cumulative histogram buckets in the text exposition format."""
+    registry = Registry()
+    requests_total = registry.register(Counter("requests_total", "Requests.", ["path"]))
+    latency = registry.register(Histogram("latency_seconds", "Latency.", buckets=(0.1, 1)))
+
+    requests_total.inc(path='/a"b')
+    requests_total.inc(2, path='/a"b')
+    latency.observe(0.05)
+    latency.observe(0.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a\\"b"} 3',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 2',
+        "latency_seconds_count 2",
+        "latency_seconds_sum 0.55",
+    ]
+    with pytest.raises(ValueError):
+        requests_total.inc(path="/", method="GET")
+
+def test_extraction_records_stages_documents_and_rows(pdf_content):
+    """Each stage of an extraction is timed, per extractor and process-wide, and rows are counted."""
+    truth = pd.read_csv("tests/truth/test_tables.csv")
+    extracted_before = DOCUMENTS.value(outcome="extracted")
+    rows_before = ROWS.value()
+    parses_before, _ = STAGE_SECONDS.value(stage="extract_tables")
+
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.iter_content.return_value = [pdf_content]
+    mock_response.headers = {}
+    extractor = PDFExtractor()
+    with patch("requests.Session.get", return_value=mock_response):
+        extractor.extract(["http://example.com/a.pdf"], OutputFormat.CSV.value)
+
+    assert {"download", "extract_tables", "header_vote", "build_tables", "merge", "serialize"} <= extractor.timings.totals().keys()
+    assert STAGE_SECONDS.value(stage="extract_tables")[0] == parses_before + 1
+    assert DOCUMENTS.value(outcome="extracted") == extracted_before + 1
+    assert ROWS.value() >= rows_before + len(truth)
+
+def test_timings_header_and_metrics_endpoint(pdf_content):
+    """?timings=true adds a Server-Timing header to buffered responses; /metrics exposes the process-wide totals."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=pdf_content))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+    client = TestClient(app)
+    request = {"document_urls": ["http://example.com/a.pdf"], "output_format": "csv", "use_cache": False}
+
+    with patch("app.services.pdfextractor.get_async_fetcher", return_value=fetcher):
+        timed_response = client.post("/files/extract?timings=true", json=request)
+        plain_response = client.post("/files/extract", json=request)
+
+        streamed_response = client.post("/files/extract?timings=true", json=dict(request, stream=True))
+
+    stages = [entry.split(";")[0] for entry in timed_response.headers["Server-Timing"].split(", ")]
+    assert {"download", "extract_tables", "serialize", "total"} <= set(stages)
+    assert "Server-Timing" not in plain_response.headers
+    # Sent before the PDFs are processed, so it would be incomplete
+    assert "Server-Timing" not in streamed_response.headers
+    assert "X-Pages-Searched" not in streamed_response.headers
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(streamed_response.content)), pd.read_csv(io.BytesIO(plain_response.content)))
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(timed_response.content)), pd.read_csv(io.BytesIO(plain_response.content)))
+
+    metrics = client.get("/metrics")
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'webscraper_stage_seconds_bucket{stage="extract_tables",le="+Inf"}' in metrics.text
+    assert 'webscraper_downloaded_bytes_total{kind="document"}' in metrics.text
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_async_paths_count_failed_documents(pdf_content, stream):
+    """A PDF that fails to parse is counted as failed and doesn't fail the other PDFs of the request."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=pdf_content))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+    failed_before = DOCUMENTS.value(outcome="failed")
+    real = PDFExtractor.extract_downloaded
+
+    def extract_downloaded(self, url, download, content_hash=None):
+        if url.endswith("broken.pdf"):
+            raise RuntimeError("corrupt xref table")
+        return real(self, url, download, content_hash)
+
+    async def run():
+        extractor = PDFExtractor()
+        urls = ["http://example.com/broken.pdf", "http://example.com/a.pdf"]
+        if stream:
+            body, _, _ = await extractor.stream_async(urls, OutputFormat.CSV.value, fetcher=fetcher)
+            return b"".join([chunk async for chunk in body])
+        buffer, _, _ = await extractor.extract_async(urls, OutputFormat.CSV.value, fetcher=fetcher)
+        return buffer.getvalue()
+
+    with patch.object(PDFExtractor, "extract_downloaded", extract_downloaded):
+        data = asyncio.run(run())
+
+    assert len(pd.read_csv(io.BytesIO(data))) == len(pd.read_csv("tests/truth/test_tables.csv"))
+    assert DOCUMENTS.value(outcome="failed") == failed_before + 1
@@ -0,0 +1,68 @@
+import time
+import threading
+from app.services.pipeline import run_pipeline
+
+def test_downloads_wait_for_parsers_when_the_queue_is_full():
+    """Fetched items waiting for a parser never exceed the queue plus the download workers."""
+    lock = threading.Lock()
+    held = 0
+    peak = 0
+
+    def fetch(item):
+        nonlocal held, peak
+        with lock:
+            held += 1
+            peak = max(peak, held)
+        return item * 10
+
+    def parse(item, value):
+        nonlocal held
+        time.sleep(0.01)
+        with lock:
+            held -= 1
+        return value + 1
+
+    results = list(run_pipeline(list(range(40)), fetch, parse, download_workers=4, parse_workers=2, queue_size=3))
+
+    assert sorted(result for _, result, _ in results) == [i * 10 + 1 for i in range(40)]
+    assert peak <= 3 + 4 + 2  # queued + blocked in a download worker + being parsed
+
+def test_errors_of_either_stage_are_reported_per_item():
+    """A failing item doesn't stop the others."""
+    def fetch(item):
+        if item == 1:
+            raise IOError("download failed")
+        return item
+
+    def parse(item, value):
+        if item == 2:
+            raise ValueError("parse failed")
+        return value
+
+    results = {item: (result, error) for item, result, error in run_pipeline([0, 1, 2, 3], fetch, parse, 2, 2, 1)}
+
+    assert results[0] == (0, None) and results[3] == (3, None)
+    assert isinstance(results[1][1], IOError)
+    assert isinstance(results[2][1], ValueError)
+
+def test_closing_early_discards_fetched_items():
+    """Items fetched but not parsed when the consumer stops are handed to discard."""
+    parsed, discarded = [], []
+    lock = threading.Lock()
+
+    def parse(item, value):
+        time.sleep(0.02)
+        with lock:
+            parsed.append(item)
+        return value
+
+    def discard(value):
+        with lock:
+            discarded.append(value)
+
+    pipeline = run_pipeline(list(range(20)), lambda item: item, parse, 4, 1, 2, discard=discard)
+    next(pipeline)
+    pipeline.close()
+
+    assert len(parsed) < 20
+    assert sorted(parsed + discarded) == sorted(set(parsed + discarded))  # each item either parsed or discarded
@@ -0,0 +1,163 @@
+import io
+import time
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from pydantic import ValidationError
+import app.services.profiles as profiles
+from app.models import ExtractionEngine
+from app.routes.files import ExtractRequest
+from app.services.pdfextractor import PDFExtractor
+from app.services.profiles import PROFILES, ProfileStore, source_key, tune_profile
+
+PDF_PATH = "tests/mock_data/pdfs/test_tables.pdf"
+
+@pytest.fixture
+def pdf_bytes():
+    with open(PDF_PATH, "rb") as f:
+        return f.read()
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path))
+
+def test_tune_picks_a_profile_finding_valid_headers(pdf_bytes):
+    """The sample PDF has ruled tables: only the ruling-based profiles find their header row."""
+    extractor = PDFExtractor()
+    name, settings, seconds = tune_profile(io.BytesIO(pdf_bytes), extractor._has_valid_header)
+    assert name in ("lines", "lines_loose")
+    assert settings == PROFILES[name]
+    assert seconds > 0
+
+def test_tune_without_valid_header_finds_nothing(pdf_bytes):
+    assert tune_profile(io.BytesIO(pdf_bytes), lambda table: False) is None
+
+def test_tune_prefers_the_fastest_profile(monkeypatch, pdf_bytes):
+    """Of the profiles finding a valid header, the fastest wins; an equally fast later one doesn't."""
+    delays = {"slow": 0.05, "fast": 0.01, "as_fast": 0.01, "headerless": 0}
+
+    def search_page(page, settings):
+        time.sleep(delays[settings["name"]])
+        header = ["1", "2"] if settings["name"] == "headerless" else ["Name", "Value"]
+        return [[header, ["a", "1"]]]
+    monkeypatch.setattr(profiles, "search_page", search_page)
+    candidates = {name: {"name": name} for name in delays}
+
+    name, settings, _ = tune_profile(io.BytesIO(pdf_bytes), lambda table: table[0][0] == "Name", profiles=candidates)
+    assert name == "fast"
+    assert settings == {"name": "fast"}
+
+def test_store_tunes_each_source_once(tmp_path):
+    tune = MagicMock(return_value=("text", PROFILES["text"], 0.1))
+    store = ProfileStore(str(tmp_path))
+    threads = [threading.Thread(target=store.resolve, args=("example.com", tune)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tune.call_count == 1
+    assert store._tuning == {}  # per-source locks are dropped once nobody waits on them
+
+    # Remembered on disk for other processes
+    assert ProfileStore(str(tmp_path)).resolve("example.com", tune) == ("text", PROFILES["text"])
+    assert tune.call_count == 1
+
+    store.forget("example.com")
+    store.resolve("example.com", tune)
+    assert tune.call_count == 2
+
+def test_untuned_source_is_remembered_as_default(tmp_path):
+    """A source where tuning found no profile isn't tuned on every document, only once the finding expires."""
+    tune = MagicMock(return_value=None)
+    store = ProfileStore(str(tmp_path), ttl=60)
+    assert store.resolve("example.com", tune) == ("default", None)
+    assert store.resolve("example.com", tune) == ("default", None)
+    assert ProfileStore(str(tmp_path), ttl=60).get("example.com") == ("default", None)
+    assert tune.call_count == 1
+
+    with patch("app.services.profiles.time.time", return_value=time.time() + 60):
+        assert store.get("example.com") is None
+        store.resolve("example.com", tune)
+    assert tune.call_count == 2
+
+def test_tuned_profile_expires(tmp_path):
+    store = ProfileStore(str(tmp_path), ttl=60)
+    store.put("example.com", "text", PROFILES["text"])
+    assert store.get("example.com") == ("text", PROFILES["text"])
+    with patch("app.services.profiles.time.time", return_value=time.time() + 60):
+        assert store.get("example.com") is None
+
+def test_source_key():
+    assert source_key("https://Data.Example.com/reports/a.pdf", []) == "data.example.com"
+    assert source_key("https://example.com/reports/a.pdf", [r"example\.com/stats/", r"example\.com/reports/"]) == r"example\.com/reports/"
+    assert source_key("/data/batch/a.pdf", []) == "/data/batch"
+
+def test_auto_profile_extracts_like_defaults_and_reuses_the_profile(monkeypatch, pdf_bytes, store):
+    expected, expected_header = PDFExtractor(engine=ExtractionEngine.THREADS).extract_document(io.BytesIO(pdf_bytes), "a.pdf")
+
+    extractor = PDFExtractor(engine=ExtractionEngine.THREADS, profile="auto", profiles=store)
+    table, header = extractor.extract_document(io.BytesIO(pdf_bytes), "https://example.com/a.pdf")
+    assert table.equals(expected)
+    assert header == expected_header
+    assert store.get("example.com")[0] in ("lines", "lines_loose")
+
+    # Later documents from the same source skip tuning
+    tune = MagicMock()
+    monkeypatch.setattr("app.services.pdfextractor.tune_profile", tune)
+    table, _ = extractor.extract_document(io.BytesIO(pdf_bytes), "https://example.com/b.pdf")
+    assert table.equals(expected)
+    tune.assert_not_called()
+
+def test_profile_finding_no_header_is_forgotten(pdf_bytes, store):
+    """A remembered profile that no longer yields a valid header is dropped, so the source is tuned again."""
+    store.put("example.com", "text", PROFILES["text"])
+    extractor = PDFExtractor(engine=ExtractionEngine.THREADS, profile="auto", profiles=store)
+    extractor.extract_document(io.BytesIO(pdf_bytes), "https://example.com/a.pdf")
+    assert store.get("example.com") is None
+
+def test_named_profile_and_settings_change_the_cache_variant():
+    variants = {
+        PDFExtractor().cache_variant(),
+        PDFExtractor(profile="text").cache_variant(),
+        PDFExtractor(profile="auto").cache_variant(),
+        PDFExtractor(table_settings={"vertical_strategy": "text"}).cache_variant(),
+    }
+    assert len(variants) == 4
+
+def test_auto_profile_cache_variant_follows_the_resolved_profile(monkeypatch, pdf_bytes, store):
+    """Results parsed with different auto-tuned profiles (or none) are cached apart."""
+    extractor = PDFExtractor(engine=ExtractionEngine.THREADS, profile="auto", profiles=store)
+    untuned = extractor.cache_variant("https://example.com/a.pdf")
+    store.put("example.com", "text", PROFILES["text"])
+    assert extractor.cache_variant("https://example.com/a.pdf") not in (untuned, extractor.cache_variant())
+
+    # A PDF keeps the variant of the profile it was parsed with, even once the source's profile changes
+    monkeypatch.setattr("app.services.pdfextractor.tune_profile", lambda *args, **kwargs: None)
+    store.forget("example.com")
+    extractor.extract_document(io.BytesIO(pdf_bytes), "https://example.com/b.pdf")
+    parsed = extractor.cache_variant("https://example.com/b.pdf")
+    store.put("example.com", "text", PROFILES["text"])
+    assert extractor.cache_variant("https://example.com/b.pdf") == parsed
+    assert extractor.cache_variant("https://example.com/c.pdf") != parsed
+
+def test_untuned_source_uses_defaults_without_tuning_again(monkeypatch, pdf_bytes, store):
+    tune = MagicMock(return_value=None)
+    monkeypatch.setattr("app.services.pdfextractor.tune_profile", tune)
+    expected, _ = PDFExtractor(engine=ExtractionEngine.THREADS).extract_document(io.BytesIO(pdf_bytes), "a.pdf")
+
+    extractor = PDFExtractor(engine=ExtractionEngine.THREADS, profile="auto", profiles=store)
+    for name in ("a", "b"):
+        table, _ = extractor.extract_document(io.BytesIO(pdf_bytes), f"https://example.com/{name}.pdf")
+        assert table.equals(expected)
+    assert tune.call_count == 1
+    assert store.get("example.com") == ("default", None)
+
+@pytest.mark.parametrize("options", [
+    {"profile": "fastest"},
+    {"table_settings": {"vertical_strategy": "rulers"}},
+    {"table_settings": {"no_such_setting": 1}},
+    {"profile": "text", "table_settings": {"vertical_strategy": "text"}},
+])
+def test_request_rejects_invalid_profiles(options):
+    with pytest.raises(ValidationError):
+        ExtractRequest(document_urls=["https://example.com/a.pdf"], **options)
@@ -0,0 +1,144 @@
+import io
+import os
+import time
+import pytest
+import app.services.profiles as profiles
+import app.services.sandbox as sandbox
+from app.models import ExtractionEngine
+from app.services.pdfextractor import PDFExtractor
+from app.services.profiles import ProfileStore, tune_profile
+from app.services.sandbox import ParseAborted, ParseLimits, shutdown_sandbox_pool
+from app.services.tableengine import extract_page_tables
+
+PDF_PATH = "tests/mock_data/pdfs/test_tables.pdf"
+
+# Sandbox entry points misbehaving on page 2; they run in spawned processes, so they
+# patch the child's own search_page instead of the test's
+def _page_two(behave):
+    real = sandbox.search_page
+
+    def search_page(page, table_settings=None):
+        if page.page_number == 2:
+            behave()
+        return real(page, table_settings)
+    sandbox.search_page = search_page
+
+def _hanging_sandbox(conn, memory_bytes):
+    _page_two(lambda: time.sleep(60))
+    sandbox._sandbox_main(conn, memory_bytes)
+
+def _spinning_sandbox(conn, memory_bytes):
+    def spin():
+        while True:
+            pass
+    _page_two(spin)
+    sandbox._sandbox_main(conn, memory_bytes)
+
+def _crashing_sandbox(conn, memory_bytes):
+    _page_two(lambda: os._exit(1))
+    sandbox._sandbox_main(conn, memory_bytes)
+
+def _hanging_tuning_sandbox(conn, memory_bytes):
+    def search_page(page, table_settings=None):
+        time.sleep(60)
+    profiles.search_page = search_page
+    sandbox._sandbox_main(conn, memory_bytes)
+
+def _slow_starting_sandbox(conn, memory_bytes):
+    time.sleep(3)
+    sandbox._sandbox_main(conn, memory_bytes)
+
+@pytest.fixture
+def pdf_bytes():
+    with open(PDF_PATH, "rb") as f:
+        return f.read()
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    shutdown_sandbox_pool()
+    yield
+    shutdown_sandbox_pool()
+
+@pytest.mark.parametrize("engine", [ExtractionEngine.THREADS, ExtractionEngine.PROCESSES])
+def test_limited_parse_matches_unlimited(pdf_bytes, engine):
+    """Within its limits, a sandboxed parse finds the same tables as an unsandboxed one."""
+    expected = extract_page_tables(io.BytesIO(pdf_bytes), ExtractionEngine.THREADS)
+    scan = extract_page_tables(io.BytesIO(pdf_bytes), engine, limits=ParseLimits(page_timeout=60, document_cpu=120))
+    assert scan.tables == expected.tables
+    assert scan.aborted == []
+
+@pytest.mark.parametrize("main, limits, reason", [
+    (_hanging_sandbox, ParseLimits(page_timeout=2), "timeout"),
+    (_spinning_sandbox, ParseLimits(page_cpu=1), "cpu_limit"),
+    (_crashing_sandbox, ParseLimits(page_timeout=60), "crashed"),
+])
+def test_aborted_page_is_reported_and_the_rest_parsed(monkeypatch, pdf_bytes, main, limits, reason):
+    """A page over a limit is aborted and reported; the pages after it are parsed in a fresh sandbox."""
+    expected = extract_page_tables(io.BytesIO(pdf_bytes), ExtractionEngine.THREADS)
+    monkeypatch.setattr(sandbox, "_sandbox_main", main)
+
+    started = time.monotonic()
+    scan = extract_page_tables(io.BytesIO(pdf_bytes), ExtractionEngine.THREADS, limits=limits)
+
+    assert time.monotonic() - started < 30
+    assert scan.aborted == [(2, reason)]
+    assert scan.skipped[reason] == 1
+    assert scan.tables == [expected.tables[0], expected.tables[2]]
+
+def test_cold_sandbox_startup_does_not_count_against_page_timeout(monkeypatch, pdf_bytes):
+    """A page is timed from when its sandbox starts on it, not from spawning the sandbox."""
+    expected = extract_page_tables(io.BytesIO(pdf_bytes), ExtractionEngine.THREADS)
+    monkeypatch.setattr(sandbox, "_sandbox_main", _slow_starting_sandbox)
+    scan = extract_page_tables(io.BytesIO(pdf_bytes), ExtractionEngine.PROCESSES, limits=ParseLimits(page_timeout=1))
+    assert scan.aborted == []
+    assert scan.tables == expected.tables
+
+def test_document_timeout_aborts_unfinished_pages(monkeypatch, pdf_bytes):
+    """Pages not parsed when the document's time is up are aborted as timed out."""
+    monkeypatch.setattr(sandbox, "_sandbox_main", _hanging_sandbox)
+    scan = extract_page_tables(io.BytesIO(pdf_bytes), ExtractionEngine.THREADS, limits=ParseLimits(document_timeout=3))
+    assert scan.aborted == [(2, "timeout"), (3, "timeout")]
+    assert scan.searched == 1
+
+def test_extractor_reports_aborted_pages(monkeypatch, pdf_bytes):
+    """The extractor keeps the aborted pages per document and lists them in the output headers."""
+    monkeypatch.setattr(sandbox, "_sandbox_main", _hanging_sandbox)
+    extractor = PDFExtractor(engine=ExtractionEngine.THREADS, limits=ParseLimits(page_timeout=2))
+    table, _ = extractor.extract_document(io.BytesIO(pdf_bytes), "https://example.com/doc.pdf")
+
+    assert table is not None
+    assert extractor.aborted_pages == {"https://example.com/doc.pdf": [(2, "timeout")]}
+    _, _, headers = extractor.with_aborted_headers((io.BytesIO(), "text/csv", {}))
+    assert headers["X-Pages-Aborted"] == "1"
+    assert headers["X-Pages-Aborted-Detail"] == "https://example.com/doc.pdf#page=2 (timeout)"
+
+def test_tuning_under_limits_runs_in_the_sandbox(pdf_bytes):
+    """With limits set, tuning picks the same profile, searching in a sandbox process."""
+    pdf_file = io.BytesIO(pdf_bytes)
+    name, settings, seconds = tune_profile(pdf_file, PDFExtractor()._has_valid_header, limits=ParseLimits(document_timeout=60))
+    assert name in ("lines", "lines_loose")
+    assert settings == profiles.PROFILES[name]
+    assert seconds > 0
+    assert pdf_file.tell() == 0
+
+def test_aborted_tuning_falls_back_to_defaults(monkeypatch, pdf_bytes, tmp_path):
+    """A PDF hanging the tuning is parsed with pdfplumber's defaults, and nothing is remembered for its source."""
+    expected, _ = PDFExtractor(engine=ExtractionEngine.THREADS).extract_document(io.BytesIO(pdf_bytes), "a.pdf")
+    accept = PDFExtractor()._has_valid_header
+    monkeypatch.setattr(sandbox, "_sandbox_main", _hanging_tuning_sandbox)
+    with pytest.raises(ParseAborted):
+        tune_profile(io.BytesIO(pdf_bytes), accept, limits=ParseLimits(document_timeout=2))
+
+    store = ProfileStore(str(tmp_path))
+    extractor = PDFExtractor(engine=ExtractionEngine.THREADS, profile="auto", profiles=store,
+                             limits=ParseLimits(document_timeout=2))
+    table, _ = extractor.extract_document(io.BytesIO(pdf_bytes), "https://example.com/a.pdf")
+    assert table.equals(expected)
+    assert store.get("example.com") is None
+    assert extractor.resolved_profiles == {"https://example.com/a.pdf": "default"}
+
+def test_request_can_only_tighten_limits():
+    limits = ParseLimits(document_timeout=30).tightened(document_timeout=60, page_timeout=5)
+    assert limits.document_timeout == 30
+    assert limits.page_timeout == 5
+    assert not ParseLimits(0, 0, 0, 0, 0).enabled
@@ -1,9 +1,13 @@
+import asyncio
+import httpx
 import pytest
 import requests
 from unittest.mock import patch, MagicMock
 from app.models.datatypes import FileType
 from app.routes.files import DiscoverRequest
 from app.services.webscraper import WebScraper
+from app.services.fetcher import AsyncFetcher
+from app.services.linkparsers import LINK_PARSERS, SoupLinkParser, get_link_parser
 
 @pytest.fixture
 def mock_pdf_file():
@@ -40,7 +44,7 @@ def test_scrape_with_valid_html(mock_scraper, mock_pdf_file):
     mock_response.status_code = 200
     mock_response.text = mock_pdf_file
 
-    with patch("requests.get", return_value=mock_response):
+    with patch("requests.Session.get", return_value=mock_response):
         result = mock_scraper.scrape()
     
     expected = ["http://testserver/file1.pdf", "http://testserver/file2.pdf"]
@@ -52,7 +56,7 @@ def test_scrape_with_no_links(mock_scraper, mock_no_pdf_file):
     mock_response.status_code = 200
     mock_response.text = mock_no_pdf_file
 
-    with patch("requests.get", return_value=mock_response):
+    with patch("requests.Session.get", return_value=mock_response):
         result = mock_scraper.scrape()
 
     assert result == []
@@ -62,6 +66,130 @@ def test_scrape_with_http_error(mock_scraper):
     mock_response = MagicMock()
     mock_response.raise_for_status.side_effect = requests.HTTPError("404 Not Found")
 
-    with patch("requests.get", return_value=mock_response):
+    with patch("requests.Session.get", return_value=mock_response):
         with pytest.raises(requests.HTTPError):
             mock_scraper.scrape()
+
+def test_scrape_async_with_valid_html(mock_scraper, mock_pdf_file):
+    """The async path must find the same links without blocking the event loop."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=mock_pdf_file))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+
+    result = asyncio.run(mock_scraper.scrape_async(fetcher))
+
+    expected = ["http://testserver/file1.pdf", "http://testserver/file2.pdf"]
+    assert result == expected
+
+def test_scrape_async_with_http_error(mock_scraper):
+    """HTTP errors surface from the async path as well."""
+    transport = httpx.MockTransport(lambda request: httpx.Response(404))
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=transport))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(mock_scraper.scrape_async(fetcher))
+
+def _archive_page(request):
+    """A paginated archive: the index links to 50 pages with one PDF each, plus links that must not be followed."""
+    path = request.url.path
+    if path == "/archive/index.html":
+        pages = "".join(f'<a href="/archive/page{i}.html#top">Page {i}</a>' for i in range(50))
+        html = pages + '<a href="http://elsewhere.example.com/other.html">Other</a><a href="/logo.png">Logo</a>'
+    elif path.startswith("/archive/page"):
+        number = path[len("/archive/page"):-len(".html")]
+        # Every page links back to the index and on to a sub-page one level deeper
+        html = f'<a href="/archive/index.html">Index</a><a href="/archive/report{number}.pdf">Report</a><a href="/archive/deeper{number}.html">More</a>'
+    else:
+        return httpx.Response(404)
+    return httpx.Response(200, text=html)
+
+def test_crawl_collects_files_across_pages_concurrently():
+    """A crawl visits each page once, within depth, domain and page-type filters, several at a time."""
+    in_flight = 0
+    peak = 0
+    requested = []
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        requested.append(str(request.url))
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return _archive_page(request)
+
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    request = DiscoverRequest(url="http://testserver/archive/index.html", crawl_depth=1, max_pages=100)
+    result = asyncio.run(WebScraper(request).scrape_async(fetcher))
+
+    assert result == [f"http://testserver/archive/report{i}.pdf" for i in range(50)]
+    assert len(requested) == len(set(requested)) == 51  # no deeper pages, off-domain pages or images
+    assert peak > 1
+
+def test_crawl_respects_page_budget_and_follow_pattern():
+    """max_pages caps the crawl and follow_pattern filters the pages that are followed."""
+    def get(url, **kwargs):
+        response = MagicMock()
+        response.status_code = 200
+        response.text = _archive_page(httpx.Request("GET", url)).text
+        return response
+
+    request = DiscoverRequest(url="http://testserver/archive/index.html", crawl_depth=2, max_pages=5)
+    with patch("requests.Session.get", side_effect=get) as mock_get:
+        result = WebScraper(request).scrape()
+    assert mock_get.call_count == 5
+    assert len(result) == 4
+
+    request = DiscoverRequest(url="http://testserver/archive/index.html", crawl_depth=2, follow_pattern=r"page1\d\.html")
+    with patch("requests.Session.get", side_effect=get):
+        result = WebScraper(request).scrape()
+    assert result == [f"http://testserver/archive/report{i}.pdf" for i in range(10, 20)]
+
+def test_crawl_skips_broken_sub_pages():
+    """Only an error on the start page fails the discovery."""
+    def handler(request):
+        if request.url.path == "/archive/page3.html":
+            return httpx.Response(404)
+        return _archive_page(request)
+
+    fetcher = AsyncFetcher(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    request = DiscoverRequest(url="http://testserver/archive/index.html", crawl_depth=1, max_pages=100)
+    result = asyncio.run(WebScraper(request).scrape_async(fetcher))
+    assert len(result) == 49
+    assert "http://testserver/archive/report3.pdf" not in result
+
+TRICKY_PAGE = """
+<html><body>
+    <div class="docs">
+        <a href="/a.pdf">A</a>
+        <a href="/b.pdf?x=1&amp;y=2">B</a>
+        <a href>empty</a>
+        <a name="anchor">no href</a>
+        <div class="docs"><a HREF="/nested.pdf">nested in two selected elements</a></div>
+    </div>
+    <!-- <a href="/commented.pdf">hidden</a> -->
+    <script>document.write('<a href="/scripted.pdf">x</a>');</script>
+    <p><a href="/outside.pdf">outside</a><a href="/page.html">page</a></p>
+</body></html>
+"""
+
+@pytest.mark.parametrize("name", list(LINK_PARSERS))
+@pytest.mark.parametrize("css_selector", [None, "div.docs"])
+def test_link_parsers_agree_with_beautifulsoup(name, css_selector):
+    """Every backend returns the same hrefs as BeautifulSoup, or hands over to one that does."""
+    if not LINK_PARSERS[name].available():
+        pytest.skip(f"{name} is not installed")
+    reference = SoupLinkParser()
+    expected = reference.hrefs(reference.parse(TRICKY_PAGE), css_selector)
+
+    link_parser = get_link_parser(name, css_selector)
+    assert link_parser.hrefs(link_parser.parse(TRICKY_PAGE), css_selector) == expected
+
+def test_tokenizer_hands_selectors_to_beautifulsoup():
+    """The tokenizer can't evaluate CSS selectors, so BeautifulSoup is used instead."""
+    assert get_link_parser("tokenizer").name == "tokenizer"
+    assert get_link_parser("tokenizer", "div.docs").name == "soup"
+
+def test_beautifulsoup_is_the_default_link_parser():
+    """The faster backends are only used when asked for by name."""
+    assert get_link_parser().name == "soup"
+    assert get_link_parser(None, "div.docs").name == "soup"
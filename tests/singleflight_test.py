@@ -0,0 +1,52 @@
+import threading
+import pytest
+from app.services.singleflight import SingleFlight, AbandonedError, normalize_url, dedupe_urls
+
+def test_normalize_url_recognizes_the_same_document():
+    """Case of scheme and host, default ports, fragments and needless escapes don't make a different document."""
+    assert normalize_url("HTTP://Example.COM:80/a%2db.pdf#page=2") == "http://example.com/a-b.pdf"
+    assert normalize_url("https://example.com") == "https://example.com/"
+    assert normalize_url("https://example.com:8443/a b.pdf?x=%7e") == "https://example.com:8443/a%20b.pdf?x=~"
+    # Escaped slashes and query values still name different documents
+    assert normalize_url("http://example.com/a%2fb.pdf") != normalize_url("http://example.com/a/b.pdf")
+    assert normalize_url("http://example.com/a.pdf?v=1") != normalize_url("http://example.com/a.pdf?v=2")
+
+def test_dedupe_urls_keeps_first_seen_order():
+    urls = ["http://b.com/1.pdf", "http://a.com/2.pdf", "HTTP://B.com/1.pdf#x", "http://a.com:80/2.pdf", "http://c.com/3.pdf"]
+    assert dedupe_urls(urls) == ["http://b.com/1.pdf", "http://a.com/2.pdf", "http://c.com/3.pdf"]
+
+def test_followers_share_the_leaders_result():
+    """Only the first claim leads; everyone claiming before it resolves gets its outcome."""
+    flights = SingleFlight()
+    future, leader = flights.claim("doc")
+    assert leader and flights.in_flight() == 1
+
+    claims = [flights.claim("doc") for _ in range(4)]
+    assert not any(follower_leader for _, follower_leader in claims)
+    results = []
+    threads = [threading.Thread(target=lambda f=f: results.append(f.result(timeout=5))) for f, _ in claims]
+    for thread in threads:
+        thread.start()
+    flights.resolve("doc", future, "table")
+    for thread in threads:
+        thread.join()
+
+    assert results == ["table"] * 4
+    assert flights.in_flight() == 0
+    _, leader = flights.claim("doc")
+    assert leader  # resolved results aren't kept
+
+def test_abandoned_and_failed_work_reach_followers():
+    flights = SingleFlight()
+    future, _ = flights.claim("doc")
+    follower, _ = flights.claim("doc")
+    flights.abandon("doc", future)
+    with pytest.raises(AbandonedError):
+        follower.result()
+
+    future, _ = flights.claim("doc")
+    follower, _ = flights.claim("doc")
+    flights.resolve("doc", future, error=ValueError("broken"))
+    flights.abandon("doc", future)  # no effect once resolved
+    with pytest.raises(ValueError):
+        follower.result()
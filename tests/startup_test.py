@@ -0,0 +1,14 @@
+import sys
+import json
+import subprocess
+import pytest
+
+# Heavy dependencies loaded on the code paths that need them, never at startup
+DEFERRED = ["pandas", "pdfplumber", "pdfminer", "bs4", "pyarrow.parquet"]
+
+@pytest.mark.parametrize("module", ["app.main", "app.worker", "app.services.tableengine"])
+def test_entry_points_defer_heavy_imports(module):
+    """A fresh interpreter importing an entry point doesn't load the deferred dependencies."""
+    code = f"import sys, json, {module}; print(json.dumps([name for name in {DEFERRED!r} if name in sys.modules]))"
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert json.loads(completed.stdout) == []
@@ -0,0 +1,96 @@
+import io
+import os
+import datetime
+import pytest
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.datatypes import OutputFormat
+from app.services.pdfextractor import PDFExtractor
+from app.services.typeinference import infer_column, infer_types
+
+def _column(values):
+    return infer_column(pa.array(values, pa.string()))
+
+def test_integers_use_the_smallest_type_and_missing_tokens_become_null():
+    column = _column(["1", " 2 ", "-", "", None, "n/a", "1,234"])
+    assert column.type == pa.int32()
+    assert column.to_pylist() == [1, 2, None, None, None, None, 1234]
+
+    column = _column(["1", "3000000000"])
+    assert column.type == pa.int64()
+    assert column.to_pylist() == [1, 3000000000]
+
+def test_currency_percent_and_accounting_negatives():
+    column = _column(["$1,234.50", "(12.00)", "3%", "€ 7"])
+    assert column.type == pa.float32()
+    assert column.to_pylist() == pytest.approx([1234.5, -12.0, 3.0, 7.0])
+
+    column = _column(["123456.789", "1.5"])
+    assert column.type == pa.float64()
+    assert column.to_pylist() == [123456.789, 1.5]
+
+def test_decimal_separator_convention():
+    values = pa.array(["1.234,5", "0,25", "12"])
+    assert infer_column(values, ",").to_pylist() == pytest.approx([1234.5, 0.25, 12.0])
+    # "auto" only falls back to "," when "." can't read the column
+    assert infer_column(values, "auto").to_pylist() == pytest.approx([1234.5, 0.25, 12.0])
+    assert infer_column(values, ".").type == pa.string()
+    with pytest.raises(ValueError):
+        infer_types(pa.table({"a": values}), decimal_separator=";")
+
+def test_dates_and_codes():
+    column = _column(["2024-01-31", "2024-02-01", None])
+    assert column.type == pa.date32()
+    assert column.to_pylist() == [datetime.date(2024, 1, 31), datetime.date(2024, 2, 1), None]
+
+    day_first = infer_column(pa.array(["03/04/2024", "25/12/2024"]), ",")
+    assert day_first.to_pylist() == [datetime.date(2024, 4, 3), datetime.date(2024, 12, 25)]
+
+    # Leading zeros and digit groups with spaces that aren't thousands are identifiers
+    assert _column(["001", "120"]).type == pa.string()
+    assert _column(["77135 003", "77120 001"]).type == pa.string()
+
+def test_repeated_text_becomes_categorical_and_skipped_columns_stay_text():
+    table = pa.table({"Kind": ["X", "Y"] * 8, "URL": ["http://a"] * 16, "Free": [str(i) + "x" for i in range(16)]})
+    typed = infer_types(table, skip=("URL",))
+    assert typed.schema.field("Kind").type == pa.dictionary(pa.int32(), pa.string())
+    assert typed.schema.field("URL").type == pa.string()
+    assert typed.schema.field("Free").type == pa.string()
+    assert typed.column("Kind").to_pylist() == table.column("Kind").to_pylist()
+
+@pytest.fixture
+def pdf_content():
+    with open("tests/mock_data/pdfs/test_tables.pdf", "rb") as f:
+        return f.read()
+
+def test_typed_extraction_keeps_values_and_shrinks_output(pdf_content):
+    """Typed output reads back to the same values as the truth, with numeric columns typed."""
+    truth = pd.read_csv(os.path.join(os.path.dirname(__file__), "truth", "test_tables.csv"))
+    with patch("requests.Session.get") as mock_get:
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = pdf_content
+        mock_response.iter_content.return_value = [pdf_content]
+        mock_response.headers = {}
+        mock_get.return_value = mock_response
+
+        urls = ["http://example.com/test_tables.pdf"]
+        text, _, _ = PDFExtractor().extract(urls, OutputFormat.PARQUET.value)
+        typed, _, _ = PDFExtractor(typed=True).extract(urls, OutputFormat.PARQUET.value)
+        typed_csv, _, _ = PDFExtractor(typed=True).extract(urls, OutputFormat.CSV.value)
+
+    schema = pq.read_schema(io.BytesIO(typed.getvalue()))
+    assert pa.types.is_floating(schema.field("Column 5").type)
+    assert schema.field("ID").type == pa.string()
+    assert len(typed.getvalue()) < len(text.getvalue())
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(typed_csv.getvalue())), truth)
+
+def test_typed_output_cant_be_streamed_or_use_unknown_separators():
+    client = TestClient(app)
+    request = {"urls": ["http://example.com/a.pdf"], "output_format": "csv", "typed": True}
+    assert client.post("/files/extract", json={**request, "stream": True}).status_code == 422
+    assert client.post("/files/extract", json={**request, "decimal_separator": ";"}).status_code == 422